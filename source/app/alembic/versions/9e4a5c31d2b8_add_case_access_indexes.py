@@ -0,0 +1,58 @@
+"""Add case access indexes
+
+Revision ID: 9e4a5c31d2b8
+Revises: b664ca1203a4
+Create Date: 2022-03-14 10:12:31.542107
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+from sqlalchemy import engine_from_config
+from sqlalchemy.engine import reflection
+
+revision = '9e4a5c31d2b8'
+down_revision = 'b664ca1203a4'
+branch_labels = None
+depends_on = None
+
+_indexes = [
+    ('idx_cases_events_case_date', 'cases_events', ['case_id', 'event_date', 'event_id']),
+    ('idx_case_events_assets_case_event', 'case_events_assets', ['case_id', 'event_id']),
+    ('idx_case_events_assets_event_id', 'case_events_assets', ['event_id']),
+    ('idx_case_events_assets_asset_id', 'case_events_assets', ['asset_id']),
+    ('idx_ioc_link_case_ioc', 'ioc_link', ['case_id', 'ioc_id']),
+    ('idx_ioc_link_ioc_id', 'ioc_link', ['ioc_id']),
+    ('idx_case_assets_case_id', 'case_assets', ['case_id']),
+    ('idx_notes_case_id', 'notes', ['note_case_id']),
+    ('idx_notes_group_link_case_id', 'notes_group_link', ['case_id']),
+    ('idx_user_activity_case_date', 'user_activity', ['case_id', 'activity_date']),
+    ('idx_object_state_name_case', 'object_state', ['object_name', 'object_case_id'])
+]
+
+
+def upgrade():
+    for index_name, table, columns in _indexes:
+        # New installations already have the indexes, created with the tables
+        if not _table_has_index(table, index_name):
+            op.create_index(index_name, table, columns)
+
+    pass
+
+
+def downgrade():
+    pass
+
+
+def _table_has_index(table, index):
+    config = op.get_context().config
+    engine = engine_from_config(
+        config.get_section(config.config_ini_section), prefix='sqlalchemy.')
+    insp = reflection.Inspector.from_engine(engine)
+
+    for idx in insp.get_indexes(table):
+        if index == idx['name']:
+            return True
+
+    return False
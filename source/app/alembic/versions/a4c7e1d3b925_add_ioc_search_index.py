@@ -0,0 +1,40 @@
+"""Add IOC search index
+
+Revision ID: a4c7e1d3b925
+Revises: f3b8a2d95c61
+Create Date: 2022-03-18 09:27:13.640291
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+from sqlalchemy import text
+
+revision = 'a4c7e1d3b925'
+down_revision = 'f3b8a2d95c61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    if not _table_has_index('ioc', 'idx_ioc_value_trgm'):
+        op.execute("CREATE INDEX idx_ioc_value_trgm ON ioc USING gin (ioc_value gin_trgm_ops)")
+
+    pass
+
+
+def downgrade():
+    pass
+
+
+def _table_has_index(table, index):
+    conn = op.get_bind()
+    index_def = conn.execute(
+        text("SELECT indexdef FROM pg_indexes WHERE tablename = :table AND indexname = :index"),
+        {'table': table, 'index': index}
+    ).scalar()
+
+    return index_def is not None
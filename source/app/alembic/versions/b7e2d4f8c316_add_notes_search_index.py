@@ -0,0 +1,67 @@
+"""Add notes full-text search index
+
+Revision ID: b7e2d4f8c316
+Revises: a4c7e1d3b925
+Create Date: 2022-03-21 14:05:42.118307
+
+"""
+from alembic import op
+from sqlalchemy import engine_from_config
+from sqlalchemy.engine import reflection
+
+
+# revision identifiers, used by Alembic.
+from sqlalchemy import text
+
+revision = 'b7e2d4f8c316'
+down_revision = 'a4c7e1d3b925'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Stored search vector of the notes, must be the same expression as NOTES_SEARCH_VECTOR_SQL.
+    # The contents are capped as Postgres refuses tsvectors of 1 MB or more
+    if not _table_has_column('notes', 'note_search_vector'):
+        op.execute(
+            "ALTER TABLE notes ADD COLUMN note_search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(note_title, '')), 'A') || "
+            "setweight(to_tsvector('english', left(coalesce(note_content, ''), 131072)), 'B')) STORED"
+        )
+
+    index_def = _get_index_def('notes', 'idx_notes_search')
+    if index_def is not None and 'note_search_vector' not in index_def:
+        # Expression index of the previous versions, the ranking had to compute the vectors again
+        op.execute("DROP INDEX idx_notes_search")
+        index_def = None
+
+    if index_def is None:
+        op.execute("CREATE INDEX idx_notes_search ON notes USING gin (note_search_vector)")
+
+    pass
+
+
+def downgrade():
+    pass
+
+
+def _get_index_def(table, index):
+    conn = op.get_bind()
+    return conn.execute(
+        text("SELECT indexdef FROM pg_indexes WHERE tablename = :table AND indexname = :index"),
+        {'table': table, 'index': index}
+    ).scalar()
+
+
+def _table_has_column(table, column):
+    config = op.get_context().config
+    engine = engine_from_config(
+        config.get_section(config.config_ini_section), prefix='sqlalchemy.')
+    insp = reflection.Inspector.from_engine(engine)
+    has_column = False
+
+    for col in insp.get_columns(table):
+        if column != col['name']:
+            continue
+        has_column = True
+    return has_column
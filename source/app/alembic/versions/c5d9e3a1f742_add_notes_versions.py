@@ -0,0 +1,45 @@
+"""Add notes versions
+
+Revision ID: c5d9e3a1f742
+Revises: b7e2d4f8c316
+Create Date: 2022-03-24 10:41:03.556812
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import engine_from_config
+from sqlalchemy.engine import reflection
+
+# revision identifiers, used by Alembic.
+revision = 'c5d9e3a1f742'
+down_revision = 'b7e2d4f8c316'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing notes start at version 1. The revisions table is created with the models
+    if not _table_has_column('notes', 'note_version'):
+        op.add_column('notes',
+                      sa.Column('note_version', sa.Integer, nullable=False, server_default=sa.text('1'))
+                      )
+
+    pass
+
+
+def downgrade():
+    pass
+
+
+def _table_has_column(table, column):
+    config = op.get_context().config
+    engine = engine_from_config(
+        config.get_section(config.config_ini_section), prefix='sqlalchemy.')
+    insp = reflection.Inspector.from_engine(engine)
+    has_column = False
+
+    for col in insp.get_columns(table):
+        if column != col['name']:
+            continue
+        has_column = True
+    return has_column
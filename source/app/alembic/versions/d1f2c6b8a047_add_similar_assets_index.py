@@ -0,0 +1,42 @@
+"""Add similar assets index
+
+Revision ID: d1f2c6b8a047
+Revises: 9e4a5c31d2b8
+Create Date: 2022-03-15 16:41:08.203518
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+from sqlalchemy import engine_from_config
+from sqlalchemy.engine import reflection
+
+revision = 'd1f2c6b8a047'
+down_revision = '9e4a5c31d2b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not _table_has_index('case_assets', 'idx_case_assets_name_type'):
+        op.create_index('idx_case_assets_name_type', 'case_assets', ['asset_name', 'asset_type_id'])
+
+    pass
+
+
+def downgrade():
+    pass
+
+
+def _table_has_index(table, index):
+    config = op.get_context().config
+    engine = engine_from_config(
+        config.get_section(config.config_ini_section), prefix='sqlalchemy.')
+    insp = reflection.Inspector.from_engine(engine)
+
+    for idx in insp.get_indexes(table):
+        if index == idx['name']:
+            return True
+
+    return False
@@ -0,0 +1,56 @@
+"""Add evidences hashes
+
+Revision ID: e2a6f9c4b718
+Revises: c5d9e3a1f742
+Create Date: 2022-03-29 15:12:47.203118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import engine_from_config
+from sqlalchemy.engine import reflection
+
+# revision identifiers, used by Alembic.
+revision = 'e2a6f9c4b718'
+down_revision = 'c5d9e3a1f742'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # file_hash keeps the SHA256, the other digests are computed along when the server hashes the files
+    if not _table_has_column('case_received_file', 'file_md5'):
+        op.add_column('case_received_file',
+                      sa.Column('file_md5', sa.String(32))
+                      )
+
+    if not _table_has_column('case_received_file', 'file_sha1'):
+        op.add_column('case_received_file',
+                      sa.Column('file_sha1', sa.String(40))
+                      )
+
+    # Disk images are commonly larger than 2 GiB, out of range of a 32 bits integer
+    op.alter_column('case_received_file', 'file_size',
+                    existing_type=sa.Integer(),
+                    type_=sa.BigInteger(),
+                    existing_nullable=True)
+
+    pass
+
+
+def downgrade():
+    pass
+
+
+def _table_has_column(table, column):
+    config = op.get_context().config
+    engine = engine_from_config(
+        config.get_section(config.config_ini_section), prefix='sqlalchemy.')
+    insp = reflection.Inspector.from_engine(engine)
+    has_column = False
+
+    for col in insp.get_columns(table):
+        if column != col['name']:
+            continue
+        has_column = True
+    return has_column
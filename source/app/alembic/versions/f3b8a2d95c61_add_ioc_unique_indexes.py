@@ -0,0 +1,129 @@
+"""Add IOC unique indexes
+
+Revision ID: f3b8a2d95c61
+Revises: d1f2c6b8a047
+Create Date: 2022-03-17 11:02:47.118734
+
+"""
+import logging
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+from sqlalchemy import text
+
+log = logging.getLogger('alembic.runtime.migration')
+
+revision = 'f3b8a2d95c61'
+down_revision = 'd1f2c6b8a047'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not _table_has_index('ioc', 'idx_ioc_value_type'):
+        # Merge the duplicated IOCs into the oldest one before enforcing the unicity
+        op.execute("""
+            CREATE TEMPORARY TABLE ioc_duplicates AS
+            SELECT ioc_id, min(ioc_id) OVER (PARTITION BY ioc_value, ioc_type_id) AS kept_id
+            FROM ioc
+        """)
+        _merge_duplicates_fields()
+        op.execute("DELETE FROM ioc_duplicates WHERE ioc_id = kept_id")
+        op.execute("UPDATE ioc_link SET ioc_id = d.kept_id FROM ioc_duplicates d WHERE ioc_link.ioc_id = d.ioc_id")
+        op.execute("UPDATE ioc_asset_link SET ioc_id = d.kept_id FROM ioc_duplicates d "
+                   "WHERE ioc_asset_link.ioc_id = d.ioc_id")
+        op.execute("DELETE FROM ioc USING ioc_duplicates d WHERE ioc.ioc_id = d.ioc_id")
+        op.execute("DROP TABLE ioc_duplicates")
+
+        op.execute("CREATE UNIQUE INDEX idx_ioc_value_type ON ioc (md5(ioc_value), ioc_type_id)")
+
+    if not _table_has_index('ioc_link', 'idx_ioc_link_case_ioc', unique=True):
+        # Drop the links duplicated by the merge or by concurrent imports
+        op.execute("""
+            DELETE FROM ioc_link l USING ioc_link o
+            WHERE l.case_id = o.case_id AND l.ioc_id = o.ioc_id AND l.ioc_link_id > o.ioc_link_id
+        """)
+
+        if _table_has_index('ioc_link', 'idx_ioc_link_case_ioc'):
+            op.drop_index('idx_ioc_link_case_ioc', 'ioc_link')
+
+        op.create_index('idx_ioc_link_case_ioc', 'ioc_link', ['case_id', 'ioc_id'], unique=True)
+
+    pass
+
+
+def downgrade():
+    pass
+
+
+# Most restrictive first
+_TLP_PRIORITY = ['red', 'amber', 'green']
+_TAGS_MAX_LENGTH = 512
+
+
+def _merge_duplicates_fields():
+    """
+    Merge the fields of the duplicated IOCs into the kept one, so nothing set in a case is lost: descriptions are
+    concatenated, tags are united and the most restrictive TLP is kept. The custom attributes of the kept IOC are
+    left as is. The merged IOCs are logged.
+    """
+    conn = op.get_bind()
+    rows = conn.execute(text("""
+        SELECT d.kept_id, i.ioc_id, i.ioc_description, i.ioc_tags, i.ioc_tlp_id, t.tlp_name
+        FROM ioc_duplicates d
+        JOIN ioc i ON i.ioc_id = d.ioc_id
+        LEFT JOIN tlp t ON t.tlp_id = i.ioc_tlp_id
+        WHERE d.kept_id IN (SELECT kept_id FROM ioc_duplicates WHERE ioc_id <> kept_id)
+        ORDER BY d.kept_id, i.ioc_id
+    """)).fetchall()
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(row.kept_id, []).append(row)
+
+    for kept_id, group in groups.items():
+        descriptions = []
+        for row in group:
+            description = (row.ioc_description or '').strip()
+            if description and description not in descriptions:
+                descriptions.append(description)
+
+        tags = []
+        for row in group:
+            for tag in (row.ioc_tags or '').split(','):
+                tag = tag.strip()
+                if tag and tag.lower() not in [t.lower() for t in tags] \
+                        and len(','.join(tags + [tag])) <= _TAGS_MAX_LENGTH:
+                    tags.append(tag)
+
+        tlp_id = min(group, key=lambda r: _TLP_PRIORITY.index(r.tlp_name) if r.tlp_name in _TLP_PRIORITY
+                     else len(_TLP_PRIORITY)).ioc_tlp_id
+
+        conn.execute(text("""
+            UPDATE ioc SET ioc_description = :description, ioc_tags = :tags, ioc_tlp_id = :tlp_id
+            WHERE ioc_id = :ioc_id
+        """), {
+            'description': '\n\n'.join(descriptions) or None,
+            'tags': ','.join(tags) or None,
+            'tlp_id': tlp_id,
+            'ioc_id': kept_id
+        })
+
+        log.warning(f"IOC {kept_id} merged with its duplicates "
+                    f"{', '.join(str(row.ioc_id) for row in group if row.ioc_id != kept_id)}")
+
+
+def _table_has_index(table, index, unique=False):
+    # The inspector skips the expression indexes, so pg_indexes is read directly
+    conn = op.get_bind()
+    index_def = conn.execute(
+        text("SELECT indexdef FROM pg_indexes WHERE tablename = :table AND indexname = :index"),
+        {'table': table, 'index': index}
+    ).scalar()
+
+    if index_def is None:
+        return False
+
+    return not unique or index_def.startswith('CREATE UNIQUE')
@@ -19,8 +19,6 @@
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 # IMPORTS ------------------------------------------------
-import csv
-
 import marshmallow
 from flask import Blueprint
 from flask import render_template, url_for, redirect, request
@@ -28,24 +26,30 @@ from flask_login import current_user
 
 from app import db
 from app.datamgmt.case.case_assets_db import get_assets_types, delete_asset, get_assets, get_asset, \
-    get_similar_assets, get_linked_iocs_from_asset, set_ioc_links, get_linked_iocs_id_from_asset, \
-    create_asset, get_analysis_status_list, get_linked_iocs_finfo_from_asset, get_asset_type_id
+    get_similar_assets_by_asset, get_linked_iocs_from_asset, set_ioc_links, get_linked_iocs_id_from_asset, \
+    create_asset, get_analysis_status_list, get_linked_iocs_finfo_from_asset, get_similar_assets_key
+from app.datamgmt.datatables import parse_datatables_args
 from app.datamgmt.case.case_db import get_case, get_case_client_id
-from app.datamgmt.case.case_iocs_db import get_iocs
+from app.datamgmt.case.case_iocs_db import get_iocs, get_iocs_links_key
+from app.datamgmt.dim.dim_tasks_db import get_indexed_task
 from app.datamgmt.manage.manage_attribute_db import get_default_custom_attributes
 from app.datamgmt.states import get_assets_state, update_assets_state
 from app.forms import ModalAddCaseAssetForm, AssetBasicForm
 from app.iris_engine.module_handler.module_handler import call_modules_hook
+from app.iris_engine.utils.assets_importer import import_assets_csv, task_import_assets_csv
 
 from app.iris_engine.utils.tracker import track_activity
-from app.models import AnalysisStatus, IocAssetLink, Ioc, IocLink
+from app.models import IocAssetLink, Ioc, IocLink
 from app.schema.marshables import CaseAssetsSchema
-from app.util import response_success, response_error, login_required, api_login_required
+from app.util import response_success, response_error, login_required, api_login_required, state_etag
 
 case_assets_blueprint = Blueprint('case_assets',
                                   __name__,
                                   template_folder='templates')
 
+# CSV imports above this number of lines are run by a background task
+ASSETS_IMPORT_SYNC_MAX_ROWS = 1000
+
 
 @case_assets_blueprint.route('/case/assets', methods=['GET', 'POST'])
 @login_required
@@ -69,17 +73,29 @@ def case_assets(caseid, url_redir):
 
 @case_assets_blueprint.route('/case/assets/list', methods=['GET'])
 @api_login_required
+@state_etag('assets', 'ioc', extra_keys=(get_similar_assets_key, get_iocs_links_key))
 def case_list_assets(caseid):
     """
     Returns the list of assets from the case.
     :return: A JSON object containing the assets of the case, enhanced with assets seen on other cases.
     """
 
-    # Get all assets objects from the case and the customer id
-    assets = get_assets(caseid)
+    ret = {}
+    asset_ids = None
+
+    # Get the assets objects from the case, or only the requested page, and the customer id
+    dt_query = parse_datatables_args(request.args)
+    if dt_query:
+        page = get_assets(caseid, dt_query=dt_query)
+        assets = page.rows
+        asset_ids = [asset.asset_id for asset in assets]
+        ret.update(page.meta())
+
+    else:
+        assets = get_assets(caseid)
+
     customer_id = get_case_client_id(caseid)
 
-    ret = {}
     ret['assets'] = []
 
     ioc_links_req = IocAssetLink.query.with_entities(
@@ -90,7 +106,12 @@ def case_list_assets(caseid):
         Ioc.ioc_id == IocAssetLink.ioc_id,
         IocLink.case_id == caseid,
         IocLink.ioc_id == Ioc.ioc_id
-    ).all()
+    )
+
+    if asset_ids is not None:
+        ioc_links_req = ioc_links_req.filter(IocAssetLink.asset_id.in_(asset_ids))
+
+    ioc_links_req = ioc_links_req.all()
 
     cache_ioc_link = {}
     for ioc in ioc_links_req:
@@ -100,16 +121,13 @@ def case_list_assets(caseid):
         else:
             cache_ioc_link[ioc.asset_id].append(ioc._asdict())
 
+    # Find similar assets from other cases with the same customer
+    similar_assets = get_similar_assets_by_asset(caseid, customer_id, asset_ids=asset_ids)
+
     for asset in assets:
         asset = asset._asdict()
 
-        # Find linked IoC
-        if len(assets) < 300:
-            # Find similar assets from other cases with the same customer
-            asset['link'] = [lasset._asdict() for lasset in get_similar_assets(
-                            asset['asset_name'], asset['asset_type_id'], caseid, customer_id)]
-        else:
-            asset['link'] = []
+        asset['link'] = similar_assets.get(asset['asset_id'], [])
 
         asset['ioc_links'] = cache_ioc_link.get(asset['asset_id'])
 
@@ -177,7 +195,7 @@ def add_asset(caseid):
                              )
 
         if request_data.get('ioc_links'):
-            set_ioc_links(request_data.get('ioc_links'), asset.asset_id)
+            set_ioc_links(request_data.get('ioc_links'), asset.asset_id, caseid)
 
         asset = call_modules_hook('on_postload_asset_create', data=asset, caseid=caseid)
 
@@ -194,98 +212,65 @@ def add_asset(caseid):
 @case_assets_blueprint.route('/case/assets/upload', methods=['POST'])
 @api_login_required
 def case_upload_ioc(caseid):
+    """
+    Import assets from a CSV. Small files are imported right away, larger ones are imported by a
+    background task whose progress can be followed with /case/assets/upload/status/<task_id>.
+    :return: The imported rows, or the ID of the import task
+    """
+    jsdata = request.get_json()
+    if not jsdata or not isinstance(jsdata.get('CSVData'), str):
+        return response_error(msg="Data error", data="CSVData is required", status=400)
 
-    try:
-        # validate before saving
-        add_asset_schema = CaseAssetsSchema()
-        jsdata = request.get_json()
-
-        # get IOC list from request
-        csv_lines = jsdata["CSVData"].splitlines() # unavoidable since the file is passed as a string
-
-        headers = "asset_name,asset_type_name,asset_description,asset_ip,asset_domain,asset_tags"
-
-        if csv_lines[0].lower() != headers:
-            csv_lines.insert(0, headers)
-
-        # convert list of strings into CSV
-        csv_data = csv.DictReader(csv_lines, delimiter=',')
-
-        ret = []
-        errors = []
-
-        analysis_status = AnalysisStatus.query.filter(AnalysisStatus.name == 'Unspecified').first()
-        analysis_status_id = analysis_status.id
-
-        index = 0
-        for row in csv_data:
-            missing_field = False
-            for e in headers.split(','):
-                if row.get(e) is None:
-                    errors.append(f"{e} is missing for row {index}")
-                    missing_field = True
-                    continue
-
-            if missing_field:
-                continue
-
-            # Asset name must not be empty
-            if not row.get("asset_name"):
-                errors.append(f"Empty asset name for row {index}")
-                track_activity(f"Attempted to upload an empty asset name")
-                index += 1
-                continue
-
-            if row.get("asset_tags"):
-                row["asset_tags"] = row.get("asset_tags").replace("|", ",")  # Reformat Tags
+    csv_data = jsdata["CSVData"]
 
-            if not row.get('asset_type_name'):
-                errors.append(f"Empty asset type for row {index}")
-                track_activity(f"Attempted to upload an empty asset type")
-                index += 1
-                continue
+    if csv_data.count('\n') > ASSETS_IMPORT_SYNC_MAX_ROWS:
+        task = task_import_assets_csv.delay(csv_data=csv_data, caseid=caseid, user_id=current_user.id,
+                                            init_user=current_user.name)
+        track_activity(f"started the import of assets (task {task.id})", caseid=caseid)
 
-            type_id = get_asset_type_id(row['asset_type_name'].lower())
-            if not type_id:
-                errors.append(f"{row.get('asset_name')} (invalid asset type: {row.get('asset_type_name')}) for row {index}")
-                track_activity(f"Attempted to upload unrecognized asset type {row.get('asset_type_name')}")
-                index += 1
-                continue
+        return response_success(msg="Import started. The assets will appear once it is completed.",
+                                data={'task_id': task.id})
 
-            row['asset_type_id'] = type_id.asset_id
-            row.pop('asset_type_name', None)
+    ret, errors = import_assets_csv(csv_data=csv_data, caseid=caseid, user_id=current_user.id)
 
-            row['analysis_status_id'] = analysis_status_id
+    if len(errors) == 0:
+        msg = "Successfully imported data."
+    else:
+        msg = "Data is imported but we got errors with the following rows:\n- " + "\n- ".join(errors)
 
-            request_data = call_modules_hook('on_preload_asset_create', data=row, caseid=caseid)
-            asset_sc = add_asset_schema.load(request_data)
+    return response_success(msg=msg, data=ret)
 
-            asset = create_asset(asset=asset_sc,
-                                 caseid=caseid,
-                                 user_id=current_user.id
-                                 )
 
-            asset = call_modules_hook('on_postload_asset_create', data=asset, caseid=caseid)
+@case_assets_blueprint.route('/case/assets/upload/status/<string:task_id>', methods=['GET'])
+@api_login_required
+def case_upload_assets_status(task_id, caseid):
+    """
+    Returns the state of a background import of assets
+    :return: state of the task, with its progress or its result
+    """
+    # Only the imports started in this case can be followed from it
+    indexed_task = get_indexed_task(task_id)
+    if not indexed_task or indexed_task.task_case_id != int(caseid) \
+            or indexed_task.task_name != task_import_assets_csv.name:
+        return response_error("Invalid task ID for this case", status=404)
 
-            if not asset:
-                errors.append(f"Unable to add asset for internal reason")
-                index += 1
-                continue
+    task = task_import_assets_csv.AsyncResult(task_id)
 
-            ret.append(request_data)
-            track_activity(f"added asset {asset.asset_name}", caseid=caseid)
+    data = {
+        'task_id': task_id,
+        'state': task.state
+    }
 
-            index += 1
+    if task.state == 'PROGRESS':
+        data['progress'] = task.info
 
-        if len(errors) == 0:
-            msg = "Successfully imported data."
-        else:
-            msg = "Data is imported but we got errors with the following rows:\n- " + "\n- ".join(errors)
+    elif task.state == 'SUCCESS':
+        data['result'] = task.result
 
-        return response_success(msg=msg, data=ret)
+    elif task.state == 'FAILURE':
+        data['result'] = str(task.result)
 
-    except marshmallow.exceptions.ValidationError as e:
-        return response_error(msg="Data error", data=e.messages, status=400)
+    return response_success(data=data)
 
 
 @case_assets_blueprint.route('/case/assets/<int:cur_id>', methods=['GET'])
@@ -361,7 +346,7 @@ def asset_update(cur_id, caseid):
         db.session.commit()
 
         if hasattr(asset_schema, 'ioc_links'):
-            set_ioc_links(asset_schema.ioc_links, asset.asset_id)
+            set_ioc_links(asset_schema.ioc_links, asset.asset_id, caseid)
 
         asset_schema = call_modules_hook('on_postload_asset_update', data=asset_schema, caseid=caseid)
 
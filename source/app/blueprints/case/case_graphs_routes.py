@@ -18,16 +18,19 @@
 #  along with this program; if not, write to the Free Software Foundation,
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-import itertools
-from datetime import datetime
-
 from flask import Blueprint
-from flask import render_template, url_for, redirect
+from flask import render_template, url_for, redirect, request
 from flask_wtf import FlaskForm
 
 from app.datamgmt.case.case_db import get_case
-from app.datamgmt.case.case_events_db import get_case_events_graph
-from app.util import response_success, login_required, api_login_required
+from app.iris_engine.graph.case_graph import get_case_graph_index, apply_level_of_detail
+from app.util import response_success, response_error, login_required, api_login_required
+
+GRAPH_MAX_HOPS = 5
+GRAPH_DEFAULT_MAX_NODES = 200
+GRAPH_LIMIT_MAX_NODES = 2000
+GRAPH_DEFAULT_MAX_EDGES = 1000
+GRAPH_LIMIT_MAX_EDGES = 10000
 
 case_graph_blueprint = Blueprint('case_graph',
                                  __name__,
@@ -50,151 +53,44 @@ def case_graph(caseid, url_redir):
 @case_graph_blueprint.route('/case/graph/getdata', methods=['GET'])
 @api_login_required
 def case_graph_get_data(caseid):
-    events = get_case_events_graph(caseid)
-
-    nodes = []
-    edges = []
-    dates = {
-        "human": [],
-        "machine": []
-    }
-
-    tmp = {}
-
-    for event in events:
-        ioc = "ioc_" if event.asset_compromised else ""
-        atype = event.asset_type.lower()
-        img = ""
-        is_master_atype = False
-
-        if 'windows - server' in atype:
-            img = 'windows_server.png'
-            is_master_atype = True
-
-        elif 'windows - computer' in atype:
-            img = 'windows_desktop.png'
-            is_master_atype = True
-
-        elif 'windows - dc' in atype:
-            img = 'windows_server.png'
-            is_master_atype = True
-
-        elif 'computer' in atype:
-            img = 'desktop.png'
-            is_master_atype = True
-
-        elif 'server' in atype:
-            img = 'server.png'
-            is_master_atype = True
-
-        elif 'domain controller' in atype:
-            img = 'windows_server.png'
-            is_master_atype = True
-
-        elif 'account' in atype:
-            img = 'user.png'
-
-        elif 'vpn' in atype:
-            img = 'vpn.png'
-            is_master_atype = True
-
-        elif 'firewall' in atype:
-            img = 'firewall.png'
-            is_master_atype = True
-
-        elif 'router' in atype:
-            img = 'router.png'
-            is_master_atype = True
-
-        elif 'WAF' in atype:
-            img = 'firewall.png'
-            is_master_atype = True
-
-        elif 'switch' in atype:
-            img = 'switch.png'
-            is_master_atype = True
-
-        elif 'phone' in atype:
-            img = 'phone.png'
-            is_master_atype = True
-
-        else:
-            img = 'question-mark.png'
-
-        try:
-            date = "{}-{}-{}".format(event.event_date.day, event.event_date.month, event.event_date.year)
-        except:
-            date = '15-05-2021'
-
-        if date not in dates:
-            dates['human'].append(date)
-            dates['machine'].append(datetime.timestamp(event.event_date))
-
-        if event.asset_ip:
-            title = "{} -{}".format(event.asset_ip, event.asset_description)
-        else:
-            title = "{}".format(event.asset_description)
-
-        new_node = {
-            'id': event.asset_id,
-            'label': event.asset_name,
-            'image': '/static/assets/img/graph/' + ioc + img,
-            'shape': 'image',
-            'title': title,
-            'value': 1
-        }
-        if not any(node['id'] == event.asset_id for node in nodes):
-            nodes.append(new_node)
-
-        ak = {
-            'node_id': event.asset_id,
-            'node_title': "{} -{}".format(event.event_date, event.event_title),
-            'node_name': event.asset_name,
-            'node_type': atype
-        }
-        if tmp.get(event.event_id):
-            tmp[event.event_id]['list'].append(ak)
-            if is_master_atype:
-                tmp[event.event_id]['master_node'].append(event.asset_id)
-        else:
-            tmp[event.event_id] = {
-                'master_node': [event.asset_id] if is_master_atype else [],
-                'list': [ak],
-                'color': event.event_color
-            }
-
-    node_dedup = {}
-    for event_id in tmp:
-        if tmp[event_id]['master_node']:
-            for master_node in tmp[event_id]['master_node']:
-                node_dedup[master_node] = []
-                for subset in tmp[event_id]['list']:
-                    if subset['node_id'] != master_node:
-                        if subset['node_id'] in node_dedup and master_node in node_dedup.get(subset['node_id']):
-                            continue
-
-                        edge = {
-                            'from': master_node,
-                            'to': subset['node_id'],
-                            'title': subset['node_title'],
-                            'color': tmp[event_id]['color']
-                        }
-                        edges.append(edge)
-                        node_dedup[master_node].append(subset['node_id'])
-        else:
-            for subset in itertools.combinations(tmp[event_id]['list'], 2):
-                edge = {
-                    'from': subset[0]['node_id'],
-                    'to': subset[1]['node_id'],
-                    'title': subset[0]['node_title'],
-                    'color': tmp[event_id]['color']
-                }
-                edges.append(edge)
-
-    resp = {
-        'nodes': nodes,
-        'edges': edges,
-        'dates': dates
-    }
+    max_edges = request.args.get('max_edges_per_node', type=int)
+    if max_edges is not None and max_edges < 1:
+        return response_error("Invalid max_edges_per_node")
+
+    index = get_case_graph_index(caseid)
+
+    resp = apply_level_of_detail(index.graph, max_edges_per_node=max_edges)
+
+    resp['layout'] = False
+    if request.args.get('layout', type=int):
+        positions = index.get_layout()
+        if positions is not None:
+            resp['nodes'] = [dict(node, x=positions[node['id']][0], y=positions[node['id']][1])
+                             for node in resp['nodes']]
+            resp['layout'] = True
+
+    return response_success("", data=resp)
+
+
+@case_graph_blueprint.route('/case/graph/neighborhood/<int:asset_id>', methods=['GET'])
+@api_login_required
+def case_graph_get_neighborhood(asset_id, caseid):
+    hops = request.args.get('hops', default=1, type=int)
+    max_nodes = request.args.get('max_nodes', default=GRAPH_DEFAULT_MAX_NODES, type=int)
+    max_edges = request.args.get('max_edges', default=GRAPH_DEFAULT_MAX_EDGES, type=int)
+
+    if not hops or not 0 < hops <= GRAPH_MAX_HOPS:
+        return response_error(f"Invalid hops. Expecting a value between 1 and {GRAPH_MAX_HOPS}")
+
+    if not max_nodes or max_nodes < 1 or not max_edges or max_edges < 1:
+        return response_error("Invalid limits")
+
+    max_nodes = min(max_nodes, GRAPH_LIMIT_MAX_NODES)
+    max_edges = min(max_edges, GRAPH_LIMIT_MAX_EDGES)
+
+    resp = get_case_graph_index(caseid).get_neighborhood(asset_id, hops=hops, max_nodes=max_nodes,
+                                                         max_edges=max_edges)
+    if resp is None:
+        return response_error("This asset is not part of the case graph", status=404)
 
     return response_success("", data=resp)
@@ -21,27 +21,31 @@
 # IMPORTS ------------------------------------------------
 import json
 
-import csv
 import marshmallow
-import logging as log
 from flask import Blueprint, request
 from flask import render_template, url_for, redirect
 from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
 
 from app import db
 from app.configuration import misp_url
 from app.datamgmt.case.case_assets_db import get_assets_types
+from app.datamgmt.datatables import parse_datatables_args
 from app.datamgmt.case.case_db import get_case
-from app.datamgmt.case.case_iocs_db import get_detailed_iocs, get_ioc_links, add_ioc, add_ioc_link, \
-    get_tlps, get_ioc, delete_ioc, get_ioc_types_list, check_ioc_type_id, get_tlps_dict, get_ioc_type_id
+from app.datamgmt.case.case_mentions_db import get_ioc_mentions
+from app.datamgmt.case.case_iocs_db import get_detailed_iocs, get_case_iocs_links, add_ioc, add_ioc_link, \
+    get_tlps, get_ioc, delete_ioc, get_ioc_types_list, check_ioc_type_id, get_ioc_links, find_ioc, \
+    get_iocs_links_key
 from app.datamgmt.manage.manage_attribute_db import get_default_custom_attributes
 from app.datamgmt.states import get_ioc_state, update_ioc_state
 from app.forms import ModalAddCaseAssetForm, ModalAddCaseIOCForm
 from app.iris_engine.module_handler.module_handler import call_modules_hook
+from app.iris_engine.utils.ioc_mentions import schedule_ioc_mentions_scan
+from app.iris_engine.utils.iocs_importer import import_iocs_csv
 from app.iris_engine.utils.tracker import track_activity
 from app.models.models import Ioc, CustomAttribute
 from app.schema.marshables import IocSchema
-from app.util import response_success, response_error, login_required, api_login_required
+from app.util import response_success, response_error, login_required, api_login_required, state_etag
 
 case_ioc_blueprint = Blueprint('case_ioc',
                                __name__,
@@ -66,19 +70,30 @@ def case_ioc(caseid, url_redir):
 
 @case_ioc_blueprint.route('/case/ioc/list', methods=['GET'])
 @api_login_required
+@state_etag('ioc', 'assets', extra_keys=(get_iocs_links_key,))
 def case_list_ioc(caseid):
-    iocs = get_detailed_iocs(caseid)
-
     ret = {}
+    ioc_ids = None
+
+    dt_query = parse_datatables_args(request.args)
+    if dt_query:
+        page = get_detailed_iocs(caseid, dt_query=dt_query)
+        iocs = page.rows
+        ioc_ids = [ioc.ioc_id for ioc in iocs]
+        ret.update(page.meta())
+
+    else:
+        iocs = get_detailed_iocs(caseid)
+
+    # Get links of the IoCs seen in other cases
+    iocs_links = get_case_iocs_links(caseid, ioc_ids=ioc_ids)
+
     ret['ioc'] = []
 
     for ioc in iocs:
         out = ioc._asdict()
 
-        # Get links of the IoCs seen in other cases
-        ial = get_ioc_links(ioc.ioc_id, caseid)
-
-        out['link'] = [row._asdict() for row in ial]
+        out['link'] = iocs_links.get(ioc.ioc_id, [])
         out['misp_link'] = misp_url
 
         ret['ioc'].append(out)
@@ -123,6 +138,7 @@ def case_add_ioc(caseid):
             return response_error("IOC already exists and linked to this case", data=add_ioc_schema.dump(ioc))
 
         if not link_existed:
+            schedule_ioc_mentions_scan(caseid)
             ioc = call_modules_hook('on_postload_ioc_create', data=ioc, caseid=caseid)
 
         if ioc:
@@ -141,97 +157,27 @@ def case_add_ioc(caseid):
 @case_ioc_blueprint.route('/case/ioc/upload', methods=['POST'])
 @api_login_required
 def case_upload_ioc(caseid):
+    """
+    Import IOCs from a CSV. IOCs already known are linked to the case, the others are created.
+    If detect_types is set, the type of the rows with an empty or unknown type is guessed from their value.
+    :return: The imported rows
+    """
+    jsdata = request.get_json()
+    if not jsdata or not isinstance(jsdata.get('CSVData'), str):
+        return response_error(msg="Data error", data="CSVData is required", status=400)
+
+    ret, errors = import_iocs_csv(csv_data=jsdata["CSVData"], caseid=caseid, user_id=current_user.id,
+                                  detect_types=bool(jsdata.get('detect_types')))
+
+    if ret:
+        schedule_ioc_mentions_scan(caseid)
+
+    if len(errors) == 0:
+        msg = "Successfully imported data."
+    else:
+        msg = "Data is imported but we got errors with the following rows:\n- " + "\n- ".join(errors)
 
-    try:
-        # validate before saving
-        add_ioc_schema = IocSchema()
-        jsdata = request.get_json()
-
-        # get IOC list from request
-        headers = "ioc_value,ioc_type,ioc_description,ioc_tags,ioc_tlp"
-        csv_lines=jsdata["CSVData"].splitlines() # unavoidable since the file is passed as a string
-        if csv_lines[0].lower() != headers:
-            csv_lines.insert(0, headers)
-
-        # convert list of strings into CSV
-        csv_data = csv.DictReader(csv_lines, quotechar='"', delimiter=',')
-
-        # build a Dict of possible TLP
-        tlp_dict = get_tlps_dict()
-        ret = []
-        errors = []
-
-        index = 0
-        for row in csv_data:
-
-            for e in headers.split(','):
-                if row.get(e) is None:
-                    errors.append(f"{e} is missing for row {index}")
-                    index += 1
-                    continue
-
-            # IOC value must not be empty
-            if not row.get("ioc_value"):
-                errors.append(f"Empty IOC value for row {index}")
-                track_activity(f"Attempted to upload an empty IOC value")
-                index += 1
-                continue
-
-            row["ioc_tags"] = row["ioc_tags"].replace("|", ",")  # Reformat Tags
-
-            # Convert TLP into TLP id
-            if row["ioc_tlp"] in tlp_dict:
-                row["ioc_tlp_id"] = tlp_dict[row["ioc_tlp"]]
-            else:
-                row["ioc_tlp_id"] = ""
-            row.pop("ioc_tlp", None)
-
-            type_id = get_ioc_type_id(row['ioc_type'].lower())
-            if not type_id:
-                errors.append(f"{row['ioc_value']} (invalid ioc type: {row['ioc_type']}) for row {index}")
-                log.error(f'Unrecognised IOC type {row["ioc_type"]}')
-                index += 1
-                continue
-
-            row['ioc_type_id'] = type_id.type_id
-            row.pop('ioc_type', None)
-
-            request_data = call_modules_hook('on_preload_ioc_create', data=row, caseid=caseid)
-
-            ioc = add_ioc_schema.load(request_data)
-            ioc.custom_attributes = get_default_custom_attributes('ioc')
-            ioc, existed = add_ioc(ioc=ioc,
-                                   user_id=current_user.id,
-                                   caseid=caseid
-                                )
-            link_existed = add_ioc_link(ioc.ioc_id, caseid)
-
-            if link_existed:
-                errors.append(f"{ioc.ioc_value} (already exists and linked to this case)")
-                log.error(f"IOC {ioc.ioc_value} already exists and linked to this case")
-                index += 1
-                continue
-
-            if ioc:
-                ioc = call_modules_hook('on_postload_ioc_create', data=ioc, caseid=caseid)
-                ret.append(request_data)
-                track_activity(f"added ioc {ioc.ioc_value}", caseid=caseid)
-
-            else:
-                errors.append(f"{ioc.ioc_value} (internal reasons)")
-                log.error(f"Unable to create IOC {ioc.ioc_value} for internal reasons")
-
-            index += 1
-
-        if len(errors) == 0:
-            msg = "Successfully imported data."
-        else:
-            msg = "Data is imported but we got errors with the following rows:\n- " + "\n- ".join(errors)
-
-        return response_success(msg=msg, data=ret)
-
-    except marshmallow.exceptions.ValidationError as e:
-        return response_error(msg="Data error", data=e.messages, status=400)
+    return response_success(msg=msg, data=ret)
 
 
 @case_ioc_blueprint.route('/case/ioc/add/modal', methods=['GET'])
@@ -304,6 +250,21 @@ def case_view_ioc(cur_id, caseid):
     return response_success(data=ioc_schema.dump(ioc))
 
 
+@case_ioc_blueprint.route('/case/ioc/<int:cur_id>/mentions', methods=['GET'])
+@api_login_required
+def case_view_ioc_mentions(cur_id, caseid):
+    """
+    Return the events and notes of the case mentioning an IOC, as found by the mentions scanner
+    """
+    ioc = get_ioc(cur_id, caseid)
+    if not ioc:
+        return response_error("Invalid IOC ID for this case")
+
+    mentions = get_ioc_mentions(cur_id, caseid)
+
+    return response_success(data=[mention._asdict() for mention in mentions])
+
+
 @case_ioc_blueprint.route('/case/ioc/update/<int:cur_id>', methods=['POST'])
 @api_login_required
 def case_update_ioc(cur_id, caseid):
@@ -315,6 +276,11 @@ def case_update_ioc(cur_id, caseid):
 
         request_data = call_modules_hook('on_preload_ioc_update', data=request.get_json(), caseid=caseid)
 
+        # IOCs are unique on their value and type, the update cannot turn this IOC into another existing one
+        existing_ioc = find_ioc(request_data.get('ioc_value'), request_data.get('ioc_type_id'))
+        if existing_ioc and existing_ioc.ioc_id != cur_id:
+            return response_error("An IOC with this value and type already exists", status=400)
+
         # validate before saving
         ioc_schema = IocSchema()
         request_data['ioc_id'] = cur_id
@@ -327,6 +293,11 @@ def case_update_ioc(cur_id, caseid):
         update_ioc_state(caseid=caseid)
         db.session.commit()
 
+        schedule_ioc_mentions_scan(caseid)
+        # The IOC can be shared, the mentions found in the other cases linked to it are stale as well
+        for link in get_ioc_links(cur_id, caseid):
+            schedule_ioc_mentions_scan(link.case_id)
+
         ioc_sc = call_modules_hook('on_postload_ioc_update', data=ioc_sc, caseid=caseid)
 
         if ioc_sc:
@@ -338,3 +309,8 @@ def case_update_ioc(cur_id, caseid):
     except marshmallow.exceptions.ValidationError as e:
         return response_error(msg="Data error", data=e.messages, status=400)
 
+    except IntegrityError:
+        # Another IOC with the same value and type was saved meanwhile
+        db.session.rollback()
+        return response_error("An IOC with this value and type already exists", status=400)
+
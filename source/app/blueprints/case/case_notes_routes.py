@@ -30,18 +30,24 @@ from flask_wtf import FlaskForm
 from app.datamgmt.case.case_db import get_case, case_get_desc_crc
 from app.datamgmt.case.case_notes_db import get_note, delete_note, add_note, update_note, get_groups_detail, \
     get_groups_short, find_pattern_in_notes, add_note_group, delete_note_group, update_note_group, get_notes_from_group, \
-    get_group_details
+    get_group_details, patch_note, get_note_revisions, get_note_content_at_version, get_note_raw
+from app.datamgmt.exceptions.ElementExceptions import ElementConflictException
 from app.datamgmt.states import get_notes_state
 from app.forms import CaseNoteForm
 from app.iris_engine.module_handler.module_handler import call_modules_hook
+from app.iris_engine.utils.ioc_mentions import schedule_ioc_mentions_scan
+from app.iris_engine.utils.note_patch import NotePatchError
 from app.iris_engine.utils.tracker import track_activity
 from app.schema.marshables import CaseNoteSchema, CaseAddNoteSchema, CaseGroupNoteSchema
-from app.util import response_success, response_error, login_required, api_login_required
+from app.util import response_success, response_error, login_required, api_login_required, state_etag
 
 case_notes_blueprint = Blueprint('case_notes',
                                  __name__,
                                  template_folder='templates')
 
+NOTES_SEARCH_DEFAULT_PAGE_SIZE = 50
+NOTES_SEARCH_MAX_PAGE_SIZE = 500
+
 
 # CONTENT ------------------------------------------------
 @case_notes_blueprint.route('/case/notes', methods=['GET'])
@@ -92,7 +98,8 @@ def case_note_detail_modal(cur_id, caseid, url_redir):
         form.title = note.note_title
         form.note_title.render_kw = {"value": note.note_title}
 
-    return render_template("modal_note_edit.html", note=form, id=cur_id, attributes=note.custom_attributes)
+    return render_template("modal_note_edit.html", note=form, id=cur_id, attributes=note.custom_attributes,
+                           note_version=note.note_version)
 
 
 @case_notes_blueprint.route('/case/notes/delete/<int:cur_id>', methods=['GET'])
@@ -136,21 +143,104 @@ def case_note_save(cur_id, caseid):
                            update_date=datetime.utcnow(),
                            user_id=current_user.id,
                            note_id=cur_id,
-                           caseid=caseid
+                           caseid=caseid,
+                           base_version=request_data.get('note_version')
                            )
         if not note:
 
             return response_error("Invalid note ID for this case")
 
+        schedule_ioc_mentions_scan(caseid, 'note', [cur_id])
+
         note = call_modules_hook('on_postload_note_update', data=note, caseid=caseid)
 
     except marshmallow.exceptions.ValidationError as e:
         return response_error(msg="Data error", data=e.messages, status=400)
 
+    except ElementConflictException:
+        return note_conflict_error(cur_id, caseid)
+
     track_activity("updated note {}".format(request_data.get('note_title')), caseid=caseid)
     return response_success("Note ID {} saved".format(cur_id), data=addnote_schema.dump(note))
 
 
+def note_conflict_error(note_id, caseid):
+    note = get_note(note_id, caseid)
+    return response_error("The note was modified since it was loaded",
+                          data={'note_version': note.note_version if note else None},
+                          status=409)
+
+
+@case_notes_blueprint.route('/case/notes/patch/<int:cur_id>', methods=['POST'])
+@api_login_required
+def case_note_patch(cur_id, caseid):
+    """
+    Save a note by sending only the changes made since the version it was loaded at.
+    Expects {note_version: base version, note_length: length of the base content, patch: [{offset, delete, insert}],
+    note_title: optional new title}. Offsets and length are counted in characters of the base version.
+    A 409 is returned if the note changed since then, or if the stored content is not the base of the client.
+    :return: The new version of the note
+    """
+    request_data = call_modules_hook('on_preload_note_update', data=request.get_json(), caseid=caseid)
+    if not request_data or not isinstance(request_data.get('note_version'), int) \
+            or not isinstance(request_data.get('note_length'), int):
+        return response_error("The version and length of the content the patch applies to are required")
+
+    note_title = request_data.get('note_title')
+    if note_title is not None and (not isinstance(note_title, str) or not note_title or len(note_title) > 155):
+        return response_error(msg="Data error", data={'note_title': ['Invalid note title']}, status=400)
+
+    try:
+        version = patch_note(note_id=cur_id,
+                             caseid=caseid,
+                             base_version=request_data.get('note_version'),
+                             base_length=request_data.get('note_length'),
+                             patch=request_data.get('patch'),
+                             update_date=datetime.utcnow(),
+                             user_id=current_user.id,
+                             note_title=note_title)
+
+    except ElementConflictException:
+        return note_conflict_error(cur_id, caseid)
+
+    except NotePatchError as e:
+        return response_error(msg="Data error", data={'patch': [str(e)]}, status=400)
+
+    if version is None:
+        return response_error("Invalid note ID for this case")
+
+    schedule_ioc_mentions_scan(caseid, 'note', [cur_id])
+
+    call_modules_hook('on_postload_note_update', data=get_note_raw(cur_id, caseid), caseid=caseid)
+
+    track_activity("updated note ID {}".format(cur_id), caseid=caseid)
+    return response_success("Note ID {} saved".format(cur_id), data={'note_id': cur_id, 'note_version': version})
+
+
+@case_notes_blueprint.route('/case/notes/<int:cur_id>/revisions', methods=['GET'])
+@api_login_required
+def case_note_revisions(cur_id, caseid):
+    """
+    List the previous versions of a note kept in the history
+    """
+    revisions = get_note_revisions(cur_id, caseid)
+
+    return response_success(data=[revision._asdict() for revision in revisions])
+
+
+@case_notes_blueprint.route('/case/notes/<int:cur_id>/revisions/<int:version>', methods=['GET'])
+@api_login_required
+def case_note_revision(cur_id, version, caseid):
+    """
+    Return the content of a note at a previous version
+    """
+    content = get_note_content_at_version(cur_id, caseid, version)
+    if content is None:
+        return response_error("This version of the note is not available")
+
+    return response_success(data={'note_id': cur_id, 'note_version': version, 'note_content': content})
+
+
 @case_notes_blueprint.route('/case/notes/add', methods=['POST'])
 @api_login_required
 def case_note_add(caseid):
@@ -169,6 +259,9 @@ def case_note_add(caseid):
                         request_data.get('group_id'),
                         note_content=request_data.get('note_content'))
 
+        if note:
+            schedule_ioc_mentions_scan(caseid, 'note', [note.note_id])
+
         note = call_modules_hook('on_postload_note_create', data=note, caseid=caseid)
 
         if note:
@@ -184,6 +277,7 @@ def case_note_add(caseid):
 
 @case_notes_blueprint.route('/case/notes/groups/list', methods=['GET'])
 @api_login_required
+@state_etag('notes')
 def case_load_notes_groups(caseid):
 
     if not get_case(caseid=caseid):
@@ -226,14 +320,18 @@ def case_search_notes(caseid):
 
     if request.is_json:
         search = request.json.get('search_term')
-        ns = []
-        if search:
-            search = "%{}%".format(search)
-            ns = find_pattern_in_notes(search, caseid)
+        if not search:
+            return response_success("", data={'page': 1, 'per_page': 0, 'total': 0, 'results': []})
+
+        try:
+            page = max(int(request.json.get('page', 1)), 1)
+            per_page = min(max(int(request.json.get('per_page', NOTES_SEARCH_DEFAULT_PAGE_SIZE)), 1),
+                           NOTES_SEARCH_MAX_PAGE_SIZE)
 
-            ns = [row._asdict() for row in ns]
+        except (TypeError, ValueError):
+            return response_error("Invalid page")
 
-        return response_success("", data=ns)
+        return response_success("", data=find_pattern_in_notes(search, caseid, page=page, per_page=per_page))
 
     return response_error("Invalid request")
 
@@ -19,19 +19,24 @@
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 # IMPORTS ------------------------------------------------
+import os
+
 import marshmallow
 from flask import Blueprint, request
 from flask import render_template, url_for, redirect
 from flask_login import current_user
 from flask_wtf import FlaskForm
 
+from app.datamgmt.datatables import parse_datatables_args
 from app.datamgmt.case.case_db import get_case
 from app.datamgmt.case.case_rfiles_db import get_rfiles, add_rfile, get_rfile, update_rfile, delete_rfile
 from app.datamgmt.states import get_evidences_state
 from app.iris_engine.module_handler.module_handler import call_modules_hook
+from app.iris_engine.utils.evidence_registration import get_evidences_upload_path, list_evidences_files, \
+    task_register_evidences
 from app.iris_engine.utils.tracker import track_activity
 from app.schema.marshables import CaseEvidenceSchema
-from app.util import response_success, response_error, login_required, api_login_required
+from app.util import response_success, response_error, login_required, api_login_required, state_etag
 
 case_rfiles_blueprint = Blueprint(
     'case_rfiles',
@@ -55,7 +60,18 @@ def case_rfile(caseid, url_redir):
 
 @case_rfiles_blueprint.route('/case/evidences/list', methods=['GET'])
 @api_login_required
+@state_etag('evidences')
 def case_list_rfiles(caseid):
+    dt_query = parse_datatables_args(request.args)
+    if dt_query:
+        page = get_rfiles(caseid, dt_query=dt_query)
+
+        ret = page.meta()
+        ret['evidences'] = [row._asdict() for row in page.rows]
+        ret['state'] = get_evidences_state(caseid=caseid)
+
+        return response_success("", data=ret)
+
     crf = get_rfiles(caseid)
 
     ret = {
@@ -105,6 +121,39 @@ def case_add_rfile(caseid):
         return response_error(msg="Data error", data=e.messages, status=400)
 
 
+@case_rfiles_blueprint.route('/case/evidences/register', methods=['POST'])
+@api_login_required
+def case_register_rfiles(caseid):
+    """
+    Queue the hashing and registration of the files of the case evidences upload path.
+    The files can be restricted with a list of file names, all the files are registered otherwise.
+    """
+    request_data = request.get_json(silent=True) or {}
+
+    filenames = request_data.get('filenames')
+    if filenames is not None:
+        if not isinstance(filenames, list) or not all(isinstance(filename, str) for filename in filenames):
+            return response_error("Filenames must be a list of file names")
+
+    fpath = get_evidences_upload_path(caseid)
+    if not fpath or not os.path.isdir(fpath):
+        return response_error("The evidences upload path of the case doesn't exist")
+
+    files = list_evidences_files(fpath, filenames)
+    if not files:
+        return response_error("No evidence file to register in the upload path")
+
+    task = task_register_evidences.delay(caseid=caseid, user_id=current_user.id, filenames=files,
+                                         init_user=current_user.name)
+
+    track_activity("started the registration of {} evidences files".format(len(files)), caseid=caseid)
+
+    return response_success("Evidences registration queued", data={
+        'task_id': task.id,
+        'filenames': files
+    })
+
+
 @case_rfiles_blueprint.route('/case/evidences/<int:cur_id>', methods=['GET'])
 @api_login_required
 def case_get_evidence(cur_id, caseid):
@@ -28,15 +28,17 @@ from flask_login import current_user
 from flask_wtf import FlaskForm
 
 from app import db
+from app.datamgmt.datatables import parse_datatables_args
 from app.datamgmt.case.case_db import get_case
 from app.datamgmt.case.case_tasks_db import get_tasks, get_task, update_task_status, add_task, get_tasks_status
 from app.datamgmt.manage.manage_attribute_db import get_default_custom_attributes
+from app.datamgmt.search.search_index_db import delete_search_documents
 from app.datamgmt.states import get_tasks_state, update_tasks_state
 from app.forms import CaseTaskForm
 from app.iris_engine.module_handler.module_handler import call_modules_hook
 from app.models.models import User, CaseTasks
 from app.schema.marshables import CaseTaskSchema
-from app.util import response_success, response_error, login_required, api_login_required
+from app.util import response_success, response_error, login_required, api_login_required, state_etag
 from app.iris_engine.utils.tracker import track_activity
 
 case_tasks_blueprint = Blueprint('case_tasks',
@@ -59,7 +61,19 @@ def case_tasks(caseid, url_redir):
 
 @case_tasks_blueprint.route('/case/tasks/list', methods=['GET'])
 @api_login_required
+@state_etag('tasks')
 def case_get_tasks(caseid):
+    dt_query = parse_datatables_args(request.args)
+    if dt_query:
+        page = get_tasks(caseid, dt_query=dt_query)
+
+        ret = page.meta()
+        ret['tasks_status'] = get_tasks_status()
+        ret['tasks'] = [c._asdict() for c in page.rows]
+        ret['state'] = get_tasks_state(caseid=caseid)
+
+        return response_success("", data=ret)
+
     ct = get_tasks(caseid)
 
     if ct:
@@ -233,6 +247,7 @@ def case_edit_delete(cur_id, caseid):
         return response_error("Invalid task ID for this case")
 
     CaseTasks.query.filter(CaseTasks.id == cur_id, CaseTasks.task_case_id == caseid).delete()
+    delete_search_documents('task', [cur_id], caseid)
 
     update_tasks_state(caseid=caseid)
 
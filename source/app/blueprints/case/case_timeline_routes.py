@@ -19,31 +19,53 @@
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 # IMPORTS ------------------------------------------------
-from datetime import datetime
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
 
 import marshmallow
-from flask import Blueprint
+from flask import Blueprint, Response, stream_with_context
 from flask import render_template, url_for, redirect, request
 from flask_login import current_user
 from flask_wtf import FlaskForm
-from sqlalchemy import and_
 
 from app import db
+from app.datamgmt.case.case_mentions_db import get_mentioned_iocs, delete_object_mentions
 from app.datamgmt.manage.manage_attribute_db import get_default_custom_attributes
-from app.datamgmt.states import get_timeline_state, update_timeline_state
+from app.datamgmt.reporter.report_db import iter_case_tm_export
+from app.datamgmt.states import get_timeline_state, update_timeline_state, get_timeline_changes
 from app.forms import CaseEventForm
 from app.iris_engine.module_handler.module_handler import call_modules_hook
+from app.iris_engine.utils.ioc_mentions import schedule_ioc_mentions_scan
 from app.models.cases import Cases, CasesEvent
-from app.models.models import CaseAssets, AssetsType, User, CaseEventsAssets, IocLink, Ioc, EventCategory
+from app.models.models import User, CaseEventsAssets
 from app.schema.marshables import EventSchema
-from app.util import response_success, response_error, login_required, api_login_required
+from app.util import response_success, response_error, login_required, api_login_required, state_etag
 from app.datamgmt.case.case_events_db import get_case_assets, get_events_categories, save_event_category, \
-    get_default_cat, delete_event_category, get_case_event, update_event_assets
+    get_default_cat, delete_event_category, get_case_event, update_event_assets, get_case_events_page, \
+    decode_timeline_cursor, get_case_timeline_projection, add_case_events_batch, get_case_assets_ids, \
+    get_case_timeline_bounds, count_case_timeline_items, get_case_timeline_buckets
 
+from app.datamgmt.datatables import parse_datatables_args
+from app.iris_engine.utils.date_parser import convert_date
 from app.iris_engine.utils.tracker import track_activity
 
 event_tags = ["Network", "Server", "ActiveDirectory", "Computer", "Malware", "User Interaction"]
 
+TIMELINE_DEFAULT_PAGE_SIZE = 500
+TIMELINE_MAX_PAGE_SIZE = 5000
+TIMELINE_MAX_BATCH_SIZE = 10000
+
+TIMELINE_VISU_MAX_EVENTS = 2000
+TIMELINE_VISU_DEFAULT_BUCKETS = 200
+TIMELINE_VISU_MAX_BUCKETS = 2000
+TIMELINE_VISU_TRUNC_UNITS = ('minute', 'hour', 'day', 'week', 'month', 'year')
+
+TIMELINE_EXPORT_FIELDS = ["event_id", "event_date", "event_tz", "event_date_wtz", "event_title", "event_content",
+                          "event_tags", "event_source", "event_raw", "category", "assets", "last_edited_by",
+                          "custom_attributes"]
+
 case_timeline_blueprint = Blueprint('case_timeline',
                                     __name__,
                                     template_folder='templates')
@@ -81,65 +103,38 @@ def case_get_timeline_state(caseid):
         return response_error('No timeline state for this case. Add an event to begin')
 
 
-@case_timeline_blueprint.route('/case/timeline/visualize/data/by-asset', methods=['GET'])
-@api_login_required
-def case_getgraph_assets(caseid):
-
-    assets_cache = CaseAssets.query.with_entities(
-        CaseEventsAssets.event_id,
-        CaseAssets.asset_name
-    ).filter(
-        CaseEventsAssets.case_id == caseid,
-    ).join(CaseEventsAssets.asset).all()
-
-    timeline = CasesEvent.query.filter(and_(
-                CasesEvent.case_id == caseid,
-                CasesEvent.event_in_summary
-            )).order_by(
-            CasesEvent.event_date
-        ).all()
-
+def build_visu_asset_items(timeline):
+    """
+    Convert the timeline projection into vis.js items grouped by asset
+    """
     tim = []
     for row in timeline:
-        for asset in assets_cache:
-            if asset.event_id == row.event_id:
-                tmp = {}
-                tmp['date'] = row.event_date.timestamp()
-                tmp['group'] = asset.asset_name
-                tmp['content'] = row.event_title
-                tmp['title'] = f"{row.event_date.strftime('%Y-%m-%dT%H:%M:%S')} - {row.event_content}"
-
-                if row.event_color:
-                    tmp['style'] = f'background-color: {row.event_color};'
-
-                tmp['unique_id'] = row.event_id
-                tim.append(tmp)
-
-    res = {
-        "events": tim
-    }
+        for asset in row.assets or []:
+            tmp = {}
+            tmp['date'] = row.event_date.timestamp()
+            tmp['group'] = asset['asset_name']
+            tmp['content'] = row.event_title
+            tmp['title'] = f"{row.event_date.strftime('%Y-%m-%dT%H:%M:%S')} - {row.event_content}"
 
-    return response_success("", data=res)
+            if row.event_color:
+                tmp['style'] = f'background-color: {row.event_color};'
 
+            tmp['unique_id'] = row.event_id
+            tim.append(tmp)
 
-@case_timeline_blueprint.route('/case/timeline/visualize/data/by-category', methods=['GET'])
-@api_login_required
-def case_getgraph(caseid):
+    return tim
 
-    timeline = CasesEvent.query.filter(and_(
-                CasesEvent.case_id == caseid,
-                CasesEvent.event_in_summary
-            )).order_by(
-            CasesEvent.event_date
-        ).all()
 
+def build_visu_category_items(timeline):
+    """
+    Convert the timeline projection into vis.js items grouped by category
+    """
     tim = []
     for row in timeline:
         tmp = {}
-        ras = row
 
         tmp['date'] = row.event_date
-        tmp['group'] = row.category[0].name
+        tmp['group'] = row.category_name
         tmp['content'] = row.event_title
         content = row.event_content.replace('\n', '<br/>')
         tmp['title'] = f"<small>{row.event_date.strftime('%Y-%m-%dT%H:%M:%S')}</small><br/>{content}"
@@ -150,11 +145,140 @@ def case_getgraph(caseid):
         tmp['unique_id'] = row.event_id
         tim.append(tmp)
 
-    res = {
-        "events": tim
+    return tim
+
+
+def parse_visu_date(value):
+    """
+    Parse a window bound of the timeline visualization, either an epoch in seconds or an ISO 8601 date.
+    Aware dates are converted to naive UTC, as event dates are stored.
+    :return: datetime or None if the value is invalid
+    """
+    try:
+        if value.isdigit():
+            return datetime.utcfromtimestamp(int(value))
+
+        date = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if date.tzinfo:
+            date = date.astimezone(timezone.utc).replace(tzinfo=None)
+
+        return date
+
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def get_timeline_visu_data(caseid, group_by, build_items):
+    """
+    Return the timeline visualization data of a case.
+    Without any window parameter, all the summary events are returned. When start, end or resolution
+    are provided, the events of the window are counted per group and per time bucket by the database.
+    Individual events are only returned if the window holds no more than max_events items, capped to
+    TIMELINE_VISU_MAX_EVENTS.
+    """
+    if not any(arg in request.args for arg in ('start', 'end', 'resolution')):
+        timeline = get_case_timeline_projection(caseid=caseid, in_summary=True)
+        return response_success("", data={"events": build_items(timeline)})
+
+    resolution = request.args.get('resolution', default=str(TIMELINE_VISU_DEFAULT_BUCKETS))
+    if resolution.isdigit() and 0 < int(resolution) <= TIMELINE_VISU_MAX_BUCKETS:
+        resolution = int(resolution)
+
+    elif resolution not in TIMELINE_VISU_TRUNC_UNITS:
+        return response_error(f"Invalid resolution. Expecting a number of buckets up to {TIMELINE_VISU_MAX_BUCKETS} "
+                              f"or one of {', '.join(TIMELINE_VISU_TRUNC_UNITS)}")
+
+    max_events = request.args.get('max_events', default=TIMELINE_VISU_MAX_EVENTS, type=int)
+    max_events = max(0, min(max_events, TIMELINE_VISU_MAX_EVENTS))
+
+    start_date = end_date = None
+    if request.args.get('start'):
+        start_date = parse_visu_date(request.args.get('start'))
+        if not start_date:
+            return response_error("Invalid start date")
+
+    if request.args.get('end'):
+        end_date = parse_visu_date(request.args.get('end'))
+        if not end_date:
+            return response_error("Invalid end date")
+
+    if start_date is None or end_date is None:
+        first_date, last_date = get_case_timeline_bounds(caseid, group_by)
+        if first_date is None:
+            return response_success("", data={"mode": "events", "count": 0, "events": []})
+
+        start_date = start_date or first_date
+        # The end of the window is excluded
+        end_date = end_date or last_date + timedelta(seconds=1)
+
+    if end_date <= start_date:
+        return response_error("The end of the window must be after its start")
+
+    count = count_case_timeline_items(caseid, group_by, start_date, end_date)
+
+    resp = {
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "count": count
     }
 
-    return response_success("", data=res)
+    if count <= max_events:
+        timeline = get_case_timeline_projection(caseid=caseid, in_summary=True,
+                                                start_date=start_date, end_date=end_date)
+        resp["mode"] = "events"
+        resp["events"] = build_items(timeline)
+
+    else:
+        buckets = get_case_timeline_buckets(caseid, group_by, start_date, end_date, resolution)
+        resp["mode"] = "buckets"
+        resp["resolution"] = resolution
+        resp["buckets"] = [{
+            "group": bucket.group_name,
+            "start": bucket.bucket_start.isoformat(),
+            "first": bucket.first_date.isoformat(),
+            "last": bucket.last_date.isoformat(),
+            "count": bucket.count
+        } for bucket in buckets]
+
+    return response_success("", data=resp)
+
+
+@case_timeline_blueprint.route('/case/timeline/visualize/data/by-asset', methods=['GET'])
+@api_login_required
+def case_getgraph_assets(caseid):
+    return get_timeline_visu_data(caseid, 'asset', build_visu_asset_items)
+
+
+@case_timeline_blueprint.route('/case/timeline/visualize/data/by-category', methods=['GET'])
+@api_login_required
+def case_getgraph(caseid):
+    return get_timeline_visu_data(caseid, 'category', build_visu_category_items)
+
+
+def format_timeline_event(row):
+    """
+    Convert an event row of the timeline projection into a JSON friendly dict, without its assets
+    """
+    ras = row._asdict()
+    ras.pop('assets', None)
+    ras['event_date'] = ras['event_date'].strftime('%Y-%m-%dT%H:%M:%S.%f')
+    ras['event_date_wtz'] = ras['event_date_wtz'].strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+    return ras
+
+
+def format_timeline_api_event(row):
+    """
+    Convert an event row of the timeline projection into the format returned by the timeline API
+    """
+    ras = format_timeline_event(row)
+    ras['assets'] = [{
+        'asset_id': asset['asset_id'],
+        'asset_name': asset['asset_name'],
+        'event_id': row.event_id
+    } for asset in row.assets or []]
+
+    return ras
 
 
 @case_timeline_blueprint.route('/case/timeline/events/list', methods=['GET'])
@@ -165,134 +289,221 @@ def case_gettimeline_api_nofilter(caseid):
 
 @case_timeline_blueprint.route('/case/timeline/events/list/filter/<int:asset_id>', methods=['GET'])
 @api_login_required
+@state_etag('timeline', 'assets')
 def case_gettimeline_api(asset_id, caseid):
-    if asset_id:
-        condition = and_(
-                CasesEvent.case_id == caseid,
-                CaseEventsAssets.asset_id == asset_id,
-                CaseEventsAssets.event_id == CasesEvent.event_id
-        )
-    else:
-        condition = CasesEvent.case_id == caseid
-
-    timeline = CasesEvent.query.with_entities(
-            CasesEvent.event_id,
-            CasesEvent.event_date,
-            CasesEvent.event_date_wtz,
-            CasesEvent.event_tz,
-            CasesEvent.event_title,
-            CasesEvent.event_color,
-            CasesEvent.event_tags,
-            CasesEvent.event_content,
-            CasesEvent.event_in_summary,
-            CasesEvent.event_in_graph,
-            EventCategory.name.label("category_name"),
-            EventCategory.id.label("event_category_id")
-        ).filter(condition).order_by(
-            CasesEvent.event_date
-        ).outerjoin(
-            CasesEvent.category
-        ).all()
-
-    assets_cache = CaseAssets.query.with_entities(
-        CaseAssets.asset_id,
-        CaseAssets.asset_name,
-        CaseEventsAssets.event_id
-    ).filter(
-        CaseEventsAssets.case_id == caseid,
-    ).join(CaseEventsAssets.asset).all()
+    if request.args.get('page_size') or request.args.get('cursor'):
+        return case_gettimeline_api_paginated(asset_id, caseid)
+
+    dt_query = parse_datatables_args(request.args)
+    if dt_query:
+        page = get_case_timeline_projection(caseid=caseid, asset_id=asset_id, dt_query=dt_query)
+
+        resp = page.meta()
+        resp['timeline'] = [format_timeline_api_event(row) for row in page.rows]
+        resp['state'] = get_timeline_state(caseid=caseid)
+
+        return response_success("", data=resp)
+
+    timeline = get_case_timeline_projection(caseid=caseid, asset_id=asset_id)
 
     tim = []
     for row in timeline:
-        ras = row._asdict()
-        ras['event_date'] = ras['event_date'].strftime('%Y-%m-%dT%H:%M:%S.%f')
-        ras['event_date_wtz'] = ras['event_date_wtz'].strftime('%Y-%m-%dT%H:%M:%S.%f')
+        tim.append(format_timeline_api_event(row))
 
-        alki = []
-        cache = {}
-        for asset in assets_cache:
-            if asset.event_id == ras['event_id']:
-                if asset.asset_id not in cache:
-                    cache[asset.asset_id] = asset.asset_name
+    resp = {
+        "timeline": tim,
+        "state": get_timeline_state(caseid=caseid)
+    }
+
+    return response_success("", data=resp)
 
-                alki.append(asset._asdict())
 
-        ras['assets'] = alki
+def case_gettimeline_api_paginated(asset_id, caseid):
+    """
+    Keyset paginated version of the timeline listing. Events are ordered by (event_date, event_id)
+    and the client provides the next_cursor of the previous page to fetch the following one.
+    """
+    page_size = request.args.get('page_size', default=TIMELINE_DEFAULT_PAGE_SIZE, type=int)
+    if not page_size or page_size < 1:
+        return response_error("Invalid page size")
 
-        tim.append(ras)
+    page_size = min(page_size, TIMELINE_MAX_PAGE_SIZE)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor = decode_timeline_cursor(cursor)
+        if not cursor:
+            return response_error("Invalid cursor")
+
+    if not asset_id:
+        asset_id = request.args.get('asset_id', type=int)
+
+    timeline, next_cursor = get_case_events_page(caseid=caseid,
+                                                 page_size=page_size,
+                                                 cursor=cursor,
+                                                 asset_id=asset_id,
+                                                 category_id=request.args.get('category_id', type=int))
+
+    tim = []
+    for row in timeline:
+        tim.append(format_timeline_api_event(row))
 
     resp = {
         "timeline": tim,
+        "next_cursor": next_cursor,
         "state": get_timeline_state(caseid=caseid)
     }
 
     return response_success("", data=resp)
 
 
+@case_timeline_blueprint.route('/case/timeline/events/delta', methods=['GET'])
+@api_login_required
+def case_gettimeline_delta(caseid):
+    """
+    Returns the events changed since the timeline state provided by the client.
+    If the changes cannot be computed, full_reload is set and the client should fetch the whole timeline.
+    """
+    since_state = request.args.get('state', type=int)
+    if since_state is None:
+        return response_error("Missing state")
+
+    state = get_timeline_state(caseid=caseid)
+    if not state:
+        return response_error('No timeline state for this case. Add an event to begin')
+
+    resp = {
+        "state": state,
+        "full_reload": False,
+        "timeline": [],
+        "deleted": []
+    }
+
+    if since_state == state['object_state']:
+        return response_success("", data=resp)
+
+    changes = None
+    if since_state < state['object_state']:
+        changes = get_timeline_changes(caseid=caseid,
+                                       since_state=since_state,
+                                       current_state=state['object_state'])
+
+    if changes is None:
+        resp['full_reload'] = True
+        return response_success("", data=resp)
+
+    upserted, deleted = changes
+    if upserted:
+        timeline = get_case_timeline_projection(caseid=caseid, event_ids=upserted)
+        resp['timeline'] = [format_timeline_api_event(row) for row in timeline]
+
+        # Events upserted then removed from the case in between are reported as deleted
+        deleted.extend(set(upserted) - set(row.event_id for row in timeline))
+
+    resp['deleted'] = deleted
+
+    return response_success("", data=resp)
+
+
+def serialize_export_event(event):
+    """
+    Convert an exported event into JSON compatible values
+    """
+    for field in ('event_date', 'event_date_wtz'):
+        if event.get(field):
+            event[field] = event[field].strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+    return event
+
+
+def stream_timeline_csv(caseid, chunk_rows=500):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=TIMELINE_EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+
+    rows = 0
+    for event in iter_case_tm_export(caseid):
+        event = serialize_export_event(event)
+        event['assets'] = '|'.join(event['assets'])
+        event['custom_attributes'] = json.dumps(event['custom_attributes'])
+        writer.writerow(event)
+
+        rows += 1
+        if rows % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+
+def stream_timeline_ndjson(caseid, chunk_rows=500):
+    lines = []
+    for event in iter_case_tm_export(caseid):
+        lines.append(json.dumps(serialize_export_event(event)))
+
+        if len(lines) >= chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+@case_timeline_blueprint.route('/case/timeline/events/export', methods=['GET'])
+@api_login_required
+def case_export_timeline(caseid):
+    """
+    Stream the whole timeline of a case as CSV or NDJSON. Rows are read with a server side cursor
+    and sent by chunks, so the memory usage stays flat whatever the size of the timeline.
+    """
+    export_format = request.args.get('format', default='ndjson').lower()
+
+    if export_format == 'csv':
+        generator = stream_timeline_csv(caseid)
+        mimetype = 'text/csv'
+
+    elif export_format == 'ndjson':
+        generator = stream_timeline_ndjson(caseid)
+        mimetype = 'application/x-ndjson'
+
+    else:
+        return response_error("Invalid format. Expected csv or ndjson")
+
+    track_activity("exported timeline as {}".format(export_format), caseid=caseid)
+
+    return Response(stream_with_context(generator),
+                    mimetype=mimetype,
+                    headers={
+                        'Content-Disposition': f'attachment; filename=case_{caseid}_timeline.{export_format}'
+                    })
+
+
 @case_timeline_blueprint.route('/case/timeline/filter/<int:asset_id>', methods=['GET'])
 @api_login_required
 def case_gettimeline(asset_id, caseid):
 
-    if asset_id:
-        condition = and_(
-                CasesEvent.case_id == caseid,
-                CaseEventsAssets.asset_id == asset_id,
-                CaseEventsAssets.event_id == CasesEvent.event_id
-        )
-    else:
-        condition = CasesEvent.case_id == caseid
-
-    timeline = CasesEvent.query.with_entities(
-            CasesEvent.event_id,
-            CasesEvent.event_date,
-            CasesEvent.event_date_wtz,
-            CasesEvent.event_tz,
-            CasesEvent.event_title,
-            CasesEvent.event_color,
-            CasesEvent.event_tags,
-            CasesEvent.event_content,
-            CasesEvent.event_in_summary,
-            CasesEvent.event_in_graph,
-            EventCategory.name.label("category_name")
-        ).filter(condition).order_by(
-            CasesEvent.event_date
-        ).outerjoin(
-            CasesEvent.category
-        ).all()
-
-    assets_cache = CaseAssets.query.with_entities(
-        CaseEventsAssets.event_id,
-        CaseAssets.asset_id,
-        CaseAssets.asset_name,
-        AssetsType.asset_name.label('type'),
-        CaseAssets.asset_ip,
-        CaseAssets.asset_description,
-        CaseAssets.asset_compromised
-    ).filter(
-        CaseEventsAssets.case_id == caseid,
-    ).join(CaseEventsAssets.asset, CaseAssets.asset_type).all()
+    timeline = get_case_timeline_projection(caseid=caseid, asset_id=asset_id)
 
     tim = []
     cache = {}
     for row in timeline:
-        ras = row._asdict()
-        ras['event_date'] = ras['event_date'].strftime('%Y-%m-%dT%H:%M:%S.%f')
-        ras['event_date_wtz'] = ras['event_date_wtz'].strftime('%Y-%m-%dT%H:%M:%S.%f')
+        ras = format_timeline_event(row)
 
         alki = []
-        for asset in assets_cache:
-            if asset.event_id == ras['event_id']:
-                if asset.asset_id not in cache:
-                    cache[asset.asset_id] = "{} ({})".format(asset.asset_name, asset.type)
-
-                alki.append(
-                    {
-                        "name": "{} ({})".format(asset.asset_name, asset.type),
-                        "ip": asset.asset_ip,
-                        "description": asset.asset_description,
-                        "compromised": asset.asset_compromised
-                    }
-                )
+        for asset in row.assets or []:
+            asset_name = "{} ({})".format(asset['asset_name'], asset['asset_type'])
+            if asset['asset_id'] not in cache:
+                cache[asset['asset_id']] = asset_name
+
+            alki.append(
+                {
+                    "name": asset_name,
+                    "ip": asset['asset_ip'],
+                    "description": asset['asset_description'],
+                    "compromised": asset['asset_compromised']
+                }
+            )
 
         ras['assets'] = alki
 
@@ -300,14 +511,8 @@ def case_gettimeline(asset_id, caseid):
 
     if request.cookies.get('session'):
 
-        iocs = IocLink.query.with_entities(
-            Ioc.ioc_id,
-            Ioc.ioc_value,
-            Ioc.ioc_description,
-        ).filter(
-            IocLink.case_id == caseid,
-            Ioc.ioc_id == IocLink.ioc_id
-        ).all()
+        # Only the IOCs found in the events by the mentions scanner need to be highlighted
+        iocs = get_mentioned_iocs(caseid, 'event')
 
         resp = {
             "tim": tim,
@@ -345,7 +550,8 @@ def case_delete_event(cur_id, caseid):
     db.session.commit()
 
     db.session.delete(event)
-    update_timeline_state(caseid=caseid)
+    delete_object_mentions(caseid, 'event', [cur_id])
+    update_timeline_state(caseid=caseid, event_ids=[cur_id], op='delete')
 
     db.session.commit()
 
@@ -443,9 +649,10 @@ def case_edit_event(cur_id, caseid):
         event.event_added = datetime.utcnow()
         event.user_id = current_user.id
 
-        update_timeline_state(caseid=caseid)
         db.session.commit()
 
+        schedule_ioc_mentions_scan(caseid, 'event', [cur_id])
+
         save_event_category(event.event_id, request_data.get('event_category_id'))
 
         setattr(event, 'event_category_id', request_data.get('event_category_id'))
@@ -454,6 +661,10 @@ def case_edit_event(cur_id, caseid):
                             caseid=caseid,
                             assets_list=request_data.get('event_assets'))
 
+        # Bumped once the category and the assets are saved as well, the timeline lists are cached on the state
+        update_timeline_state(caseid=caseid, event_ids=[cur_id])
+        db.session.commit()
+
         event = call_modules_hook('on_postload_event_update', data=event, caseid=caseid)
 
         track_activity("updated event {}".format(cur_id), caseid=caseid)
@@ -502,9 +713,12 @@ def case_add_event(caseid):
         event.user_id = current_user.id
 
         db.session.add(event)
-        update_timeline_state(caseid=caseid)
+        db.session.flush()
+
         db.session.commit()
 
+        schedule_ioc_mentions_scan(caseid, 'event', [event.event_id])
+
         save_event_category(event.event_id, request_data.get('event_category_id'))
 
         setattr(event, 'event_category_id', request_data.get('event_category_id'))
@@ -513,6 +727,10 @@ def case_add_event(caseid):
                             caseid=caseid,
                             assets_list=request_data.get('event_assets'))
 
+        # Bumped once the category and the assets are saved as well, the timeline lists are cached on the state
+        update_timeline_state(caseid=caseid, event_ids=[event.event_id])
+        db.session.commit()
+
         event = call_modules_hook('on_postload_event_create', data=event, caseid=caseid)
 
         track_activity("added event {}".format(event.event_id), caseid=caseid)
@@ -522,85 +740,101 @@ def case_add_event(caseid):
         return response_error(msg="Data error", data=e.normalized_messages(), status=400)
 
 
-@case_timeline_blueprint.route('/case/timeline/events/convert-date', methods=['POST'])
+@case_timeline_blueprint.route('/case/timeline/events/add/batch', methods=['POST'])
 @api_login_required
-def case_event_date_convert(caseid):
-
+def case_add_events_batch(caseid):
+    """
+    Add a list of events in one request. The batch is validated as a whole, and nothing is inserted
+    if one of the events is invalid. Modules hooks are called once with the whole batch.
+    """
     jsdata = request.get_json()
+    if not jsdata or not isinstance(jsdata.get('events'), list):
+        return response_error("Expected a list of events")
 
-    date_value = jsdata.get('date_value')
-    if not date_value:
-        return response_error("Invalid request")
+    if len(jsdata.get('events')) > TIMELINE_MAX_BATCH_SIZE:
+        return response_error(f"Too many events. Maximum is {TIMELINE_MAX_BATCH_SIZE} per batch")
 
-    date_value = date_value.strip()
+    request_data = call_modules_hook('on_preload_event_create', data=jsdata.get('events'), caseid=caseid)
 
-    if len(date_value) == 10 and '-' not in date_value and '.' not in date_value and '/' not in date_value:
-        # Assume linux timestamp, from 1966 to 2286
-        date = datetime.fromtimestamp(int(date_value))
-        tz = date.strftime("%z")
-        data = {
-            "date": date.strftime("%Y-%m-%d"),
-            "time": date.strftime("%H:%M:%S.%f")[:-3],
-            "tz": tz if tz else "+00:00"
-        }
-        return response_success("Date parsed", data=data)
-
-    elif len(date_value) == 13 and '-' not in date_value and '.' not in date_value and '/' not in date_value:
-        # Assume microsecond timestamp
-        date = datetime.fromtimestamp(int(date_value) / 1000)
-        tz = date.strftime("%z")
-        data = {
-            "date": date.strftime("%Y-%m-%d"),
-            "time": date.strftime("%H:%M:%S.%f")[:-3],
-            "tz": tz if tz else "+00:00"
-        }
-        return response_success("Date parsed", data=data)
+    event_schema = EventSchema(context={
+        'categories': set(category.id for category in get_events_categories()),
+        'assets': get_case_assets_ids(caseid)
+    })
 
-    else:
+    events = []
+    errors = {}
+    for index, event_data in enumerate(request_data):
+        try:
+            event = event_schema.load(event_data)
 
-        # brute force formats
-        for fmt in ('%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f',
-                    '%Y-%m-%d %H:%M%z', '%Y-%m-%d %H:%M:%S%z', '%Y-%m-%d %H:%M:%S.%f%z',
-                    '%Y-%m-%d %H:%M %Z', '%Y-%m-%d %H:%M:%S %Z', '%Y-%m-%d %H:%M:%S.%f %Z',
+            event.event_date, event.event_date_wtz = event_schema.validate_date(event_data.get(u'event_date'),
+                                                                                event_data.get(u'event_tz'))
 
-                    '%b %d %H:%M:%S', '%Y %b %d %H:%M:%S', '%b %d %H:%M:%S %Y', '%b %d %Y %H:%M:%S',
-                    '%y %b %d %H:%M:%S', '%b %d %H:%M:%S %y', '%b %d %y %H:%M:%S',
+            events.append((event, event_data.get('event_category_id'), event_data.get('event_assets')))
 
-                    '%Y-%m-%d', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f',
-                    '%Y-%m-%dT%H:%M%z', '%Y-%m-%dT%H:%M:%S%z', '%Y-%m-%dT%H:%M:%S.%f%z',
-                    '%Y-%m-%dT%H:%M %Z', '%Y-%m-%dT%H:%M:%S %Z', '%Y-%m-%dT%H:%M:%S.%f %Z',
+        except marshmallow.exceptions.ValidationError as e:
+            errors[index] = e.normalized_messages()
 
-                    '%Y-%d-%m', '%Y-%d-%m %H:%M', '%Y-%d-%m %H:%M:%S', '%Y-%d-%m %H:%M:%S.%f',
-                    '%Y-%d-%m %H:%M%z', '%Y-%d-%m %H:%M:%S%z', '%Y-%d-%m %H:%M:%S.%f%z',
-                    '%Y-%d-%m %H:%M %Z', '%Y-%d-%m %H:%M:%S %Z', '%Y-%d-%m %H:%M:%S.%f %Z',
+    if errors:
+        db.session.rollback()
+        return response_error(msg="Data error", data=errors, status=400)
 
-                    '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S.%f',
-                    '%d.%m.%Y %H:%M', '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M:%S.%f',
-                    '%d-%m-%Y %H:%M', '%d-%m-%Y %H:%M:%S', '%d-%m-%Y %H:%M:%S.%f',
+    if not events:
+        return response_error("No events provided")
 
-                    '%b %d %Y %H:%M', '%b %d %Y %H:%M:%S', '%b %d %Y %H:%M:%S',
+    added_events = add_case_events_batch(events=events,
+                                         caseid=caseid,
+                                         user_id=current_user.id)
 
-                    '%a, %d %b %Y %H:%M:%S', '%a, %d %b %Y %H:%M:%S %Z', '%a, %d %b %Y %H:%M:%S.%f',
-                    '%a, %d %b %y %H:%M:%S', '%a, %d %b %y %H:%M:%S %Z', '%a, %d %b %y %H:%M:%S.%f',
+    schedule_ioc_mentions_scan(caseid, 'event', [event.event_id for event in added_events])
 
-                    '%d %b %Y %H:%M', '%d %b %Y %H:%M:%S', '%d %b %Y %H:%M:%S.%f',
-                    '%d %b %y %H:%M', '%d %b %y %H:%M:%S', '%d %b %y %H:%M:%S.%f',
+    call_modules_hook('on_postload_event_create', data=added_events, caseid=caseid)
 
-                    '%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', "%A, %B %d, %Y", "%A %B %d, %Y", "%A %B %d %Y",
-                    '%d %B %Y'):
+    track_activity("added {} events in batch".format(len(added_events)), caseid=caseid)
 
-            try:
-                date = datetime.strptime(date_value, fmt)
-                tz = date.strftime("%z")
-                data = {
-                    "date": date.strftime("%Y-%m-%d"),
-                    "time": date.strftime("%H:%M:%S.%f")[:-3],
-                    "tz": tz if tz else "+00:00"
-                }
-                return response_success("Event added", data=data)
-            except ValueError:
-                pass
+    return response_success("{} events added".format(len(added_events)),
+                            data=[event.event_id for event in added_events])
+
+
+@case_timeline_blueprint.route('/case/timeline/events/convert-date', methods=['POST'])
+@api_login_required
+def case_event_date_convert(caseid):
+
+    jsdata = request.get_json()
 
-    return response_error("Unable to find a matching date format")
+    date_value = jsdata.get('date_value')
+    if not date_value:
+        return response_error("Invalid request")
+
+    data = convert_date(date_value)
+    if data is None:
+        return response_error("Unable to find a matching date format")
+
+    return response_success("Date parsed", data=data)
 
 
+@case_timeline_blueprint.route('/case/timeline/events/convert-date/batch', methods=['POST'])
+@api_login_required
+def case_event_date_convert_batch(caseid):
+
+    jsdata = request.get_json()
+
+    date_values = jsdata.get('date_values') if jsdata else None
+    if not isinstance(date_values, list):
+        return response_error("Invalid request, expecting a list of dates in date_values")
+
+    if len(date_values) > TIMELINE_MAX_BATCH_SIZE:
+        return response_error(f"Too many dates. Maximum is {TIMELINE_MAX_BATCH_SIZE} per batch")
+
+    results = []
+    failed = 0
+    for date_value in date_values:
+        data = convert_date(date_value) if isinstance(date_value, str) else None
+        if data is None:
+            failed += 1
+            results.append({"value": date_value, "error": "Unable to find a matching date format"})
+        else:
+            data["value"] = date_value
+            results.append(data)
+
+    return response_success(f"{len(results) - failed} dates parsed, {failed} failed", data=results)
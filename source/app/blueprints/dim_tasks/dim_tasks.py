@@ -32,11 +32,12 @@ from flask_wtf import FlaskForm
 
 from app.iris_engine.module_handler.module_handler import call_modules_hook
 from iris_interface.IrisInterfaceStatus import IIStatus
-from sqlalchemy import desc
 
 import app
 from app.datamgmt.activities.activities_db import get_all_user_activities
-from app.models import CeleryTaskMeta, IrisModuleHook, IrisHook, IrisModule, Ioc, CaseAssets, Notes, CasesEvent, \
+from app.datamgmt.datatables import parse_datatables_args
+from app.datamgmt.dim.dim_tasks_db import get_dim_tasks
+from app.models import IrisModuleHook, IrisHook, IrisModule, Ioc, CaseAssets, Notes, CasesEvent, \
     CaseTasks, CaseReceivedFile, GlobalTasks, Cases
 from app.util import response_success, login_required, api_login_required, response_error
 
@@ -175,56 +176,16 @@ def dim_hooks_call(caseid):
 @dim_tasks_blueprint.route('/dim/tasks/list', methods=['GET'])
 @api_login_required
 def list_dim_tasks(caseid):
-    tasks = CeleryTaskMeta.query.order_by(desc(CeleryTaskMeta.date_done)).limit(200).all()
-
-    data = []
-
-    for row in tasks:
-        task = app.celery.AsyncResult(row.task_id)
-
-        tkp = {}
-        tkp['state'] = row.status
-        tkp['case'] = "Unknown"
-        tkp['module'] = row.name
-        tkp['task_id'] = row.task_id
-        tkp['date_done'] = row.date_done
-        tkp['user'] = "Unknown"
-
-        try:
-            tinfo = task.info
-        except AttributeError:
-            # Legacy task
-            data.append(tkp)
-            continue
-
-        if 'task_hook_wrapper' in row.name:
-            task_name = f"{task.kwargs.get('module_name')}::{task.kwargs.get('hook_name')}"
-        else:
-            task_name = task.name
-
-        if task.kwargs:
-            user = task.kwargs.get('init_user')
-            case_name = f"Case #{task.kwargs.get('caseid')}"
-        else:
-            user = "Shadow Iris"
-            case_name = "Unknown"
+    dt_query = parse_datatables_args(request.args)
+    if dt_query:
+        page = get_dim_tasks(dt_query=dt_query)
 
-        if isinstance(task.result, IIStatus):
+        ret = page.meta()
+        ret['tasks'] = [row._asdict() for row in page.rows]
 
-            try:
-                success = task.result.is_success()
-            except:
-                success = None
+        return response_success("", data=ret)
 
-        else:
-            success = None
-
-        tkp['state'] = "success" if success else str(task.result)
-        tkp['user'] = user
-        tkp['module'] = task_name
-        tkp['case'] = case_name if case_name else ""
-
-        data.append(tkp)
+    data = [row._asdict() for row in get_dim_tasks(limit=200)]
 
     return response_success("", data=data)
 
@@ -232,56 +193,7 @@ def list_dim_tasks(caseid):
 @dim_tasks_blueprint.route('/dim/tasks/limited-list', methods=['GET'])
 @api_login_required
 def list_limited_dim_tasks(caseid):
-    tasks = CeleryTaskMeta.query.order_by(desc(CeleryTaskMeta.date_done)).limit(40).all()
-
-    data = []
-
-    for row in tasks:
-        task = app.celery.AsyncResult(row.task_id)
-
-        tkp = {}
-        tkp['state'] = row.status
-        tkp['case'] = "Unknown"
-        tkp['module'] = row.name
-        tkp['task_id'] = row.task_id
-        tkp['date_done'] = row.date_done
-        tkp['user'] = "Unknown"
-
-        try:
-            tinfo = task.info
-        except AttributeError:
-            # Legacy task
-            data.append(tkp)
-            continue
-
-        if 'task_hook_wrapper' in row.name:
-            task_name = f"{task.kwargs.get('module_name')}::{task.kwargs.get('hook_name')}"
-        else:
-            task_name = task.name
-
-        if task.kwargs:
-            user = task.kwargs.get('init_user')
-            case_name = f"Case #{task.kwargs.get('caseid')}"
-        else:
-            user = "Shadow Iris"
-            case_name = "Unknown"
-
-        if isinstance(task.result, IIStatus):
-
-            try:
-                success = task.result.is_success()
-            except:
-                success = None
-
-        else:
-            success = None
-
-        tkp['state'] = "success" if success else str(task.result)
-        tkp['user'] = user
-        tkp['module'] = task_name
-        tkp['case'] = case_name if case_name else ""
-
-        data.append(tkp)
+    data = [row._asdict() for row in get_dim_tasks(limit=40)]
 
     return response_success("", data=data)
 
@@ -23,18 +23,21 @@ from werkzeug.utils import redirect
 
 from app import db
 from app.forms import AddIocTypeForm
+from app.iris_engine.utils.ioc_classifier import IocTypeClassifier
 from app.iris_engine.utils.tracker import track_activity
 from app.models import IocType, IocLink, Ioc
 from app.schema.marshables import IocTypeSchema
 from app.util import response_success, api_admin_required, response_error, admin_required
 
-from app.datamgmt.case.case_iocs_db import get_ioc_types_list, add_ioc_type
+from app.datamgmt.case.case_iocs_db import get_ioc_types_list, add_ioc_type, get_ioc_types_map
 from app.util import api_login_required
 
 manage_ioc_type_blueprint = Blueprint('manage_ioc_types',
                                       __name__,
                                       template_folder='templates')
 
+IOC_TYPES_DETECT_MAX_VALUES = 10000
+
 
 # CONTENT ------------------------------------------------
 @manage_ioc_type_blueprint.route('/manage/ioc-types/list', methods=['GET'])
@@ -45,6 +48,37 @@ def list_ioc_types(caseid):
     return response_success("", data=lstatus)
 
 
+@manage_ioc_type_blueprint.route('/manage/ioc-types/detect', methods=['POST'])
+@api_login_required
+def detect_ioc_types(caseid):
+    """
+    Guess the type of a list of IOC values from their format
+    :return: List of {ioc_value, ioc_type, ioc_type_id}, in the order of the values. Types are None if unknown
+    """
+    jsdata = request.get_json()
+    if not jsdata or not isinstance(jsdata.get('values'), list):
+        return response_error("Expected a list of values")
+
+    values = jsdata.get('values')
+    if len(values) > IOC_TYPES_DETECT_MAX_VALUES:
+        return response_error(f"Too many values. Maximum is {IOC_TYPES_DETECT_MAX_VALUES} per request")
+
+    if not all(isinstance(value, str) for value in values):
+        return response_error("Values must be strings")
+
+    classifier = IocTypeClassifier(get_ioc_types_map())
+
+    data = []
+    for value, detected in zip(values, classifier.classify(values)):
+        data.append({
+            'ioc_value': value,
+            'ioc_type': detected[0] if detected else None,
+            'ioc_type_id': detected[1] if detected else None
+        })
+
+    return response_success("", data=data)
+
+
 @manage_ioc_type_blueprint.route('/manage/ioc-types/<int:cur_id>', methods=['GET'])
 @api_login_required
 def get_ioc_type(cur_id, caseid):
@@ -21,16 +21,16 @@
 # IMPORTS ------------------------------------------------
 from flask import Blueprint
 from flask import render_template, request, url_for, redirect
-from sqlalchemy import and_, or_
+from sqlalchemy import or_
 import json
 
 from app import db
 from app.forms import SearchForm
 
-from app.models.models import HashLink, FileName, PathName, CasesDatum, FileContentHash, Ioc, IocLink, Client, Tlp, \
-    Notes, IocType
-from app.models.cases import Cases
+from app.models.models import HashLink, FileName, PathName, CasesDatum, FileContentHash
 
+from app.datamgmt.search.search_db import search_iocs, get_ioc_search_mode, get_ioc_search_pattern_length, \
+    IOC_SEARCH_MODES, IOC_SEARCH_MIN_PATTERN_LENGTH, search_notes, search_objects, SEARCH_OBJECT_TYPES
 from app.iris_engine.utils.tracker import track_activity
 
 from app.util import response_success, response_error, AlchemyFnCode, get_urlcase, login_required, api_login_required
@@ -39,8 +39,52 @@ search_blueprint = Blueprint('search',
                              __name__,
                              template_folder='templates')
 
+SEARCH_DEFAULT_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 500
+
 
 # CONTENT ------------------------------------------------
+def get_search_page_args(jsdata):
+    """
+    Read the page and page size of a search request
+    :return: Tuple (page, per_page)
+    :raise ValueError: If the page or the page size is not a number
+    """
+    try:
+        page = max(int(jsdata.get('page', 1)), 1)
+        per_page = min(max(int(jsdata.get('per_page', SEARCH_DEFAULT_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+
+    except (TypeError, ValueError):
+        raise ValueError("Invalid page")
+
+    return page, per_page
+
+
+def get_search_object_types(jsdata):
+    """
+    Read the types of objects and the per-type limit of a global search
+    :return: Tuple (list of types or None for all the types, per-type limit or None)
+    :raise ValueError: If a type is unknown or the limit is not a positive number
+    """
+    object_types = jsdata.get('object_types') or None
+    if object_types is not None:
+        if not isinstance(object_types, list) or any(t not in SEARCH_OBJECT_TYPES for t in object_types):
+            raise ValueError(f"Invalid object types. Expected some of {', '.join(SEARCH_OBJECT_TYPES)}")
+
+    per_type_limit = jsdata.get('per_type_limit')
+    if per_type_limit is not None:
+        try:
+            per_type_limit = int(per_type_limit)
+
+        except (TypeError, ValueError):
+            raise ValueError("Invalid per type limit")
+
+        if per_type_limit < 1:
+            raise ValueError("Invalid per type limit")
+
+    return object_types, per_type_limit
+
+
 @search_blueprint.route('/search', methods=['POST'])
 @api_login_required
 def search_file_post(caseid: int):
@@ -53,49 +97,50 @@ def search_file_post(caseid: int):
     track_activity("started a search for {} on {}".format(search_value, search_type))
 
     if search_type == "ioc":
-        res = Ioc.query.with_entities(
-                            Ioc.ioc_value.label('ioc_name'),
-                            Ioc.ioc_description.label('ioc_description'),
-                            Ioc.ioc_misp,
-                            IocType.type_name,
-                            Tlp.tlp_name,
-                            Tlp.tlp_bscolor,
-                            Cases.name.label('case_name'),
-                            Client.name.label('customer_name')
-                    ).filter(
-                        and_(
-                            Ioc.ioc_value.like(search_value),
-                            IocLink.ioc_id == Ioc.ioc_id,
-                            IocLink.case_id == Cases.case_id,
-                            Client.client_id == Cases.client_id,
-                            Ioc.ioc_tlp_id == Tlp.tlp_id
-                        )
-                    ).join(Ioc.ioc_type).all()
-
-        files = [row._asdict() for row in res]
+        if not search_value:
+            return response_error("A search value is required")
+
+        search_mode = jsdata.get('search_mode') or get_ioc_search_mode(search_value)
+        if search_mode not in IOC_SEARCH_MODES:
+            return response_error(f"Invalid search mode. Expected one of {', '.join(IOC_SEARCH_MODES)}")
+
+        if search_mode != 'exact' and get_ioc_search_pattern_length(search_value) < IOC_SEARCH_MIN_PATTERN_LENGTH:
+            return response_error(f"Prefix and wildcard searches need at least {IOC_SEARCH_MIN_PATTERN_LENGTH} "
+                                  f"characters besides the wildcards")
+
+        try:
+            page, per_page = get_search_page_args(jsdata)
+
+        except ValueError as e:
+            return response_error(str(e))
+
+        files = search_iocs(search_value, search_mode=search_mode, page=page, per_page=per_page)
 
     if search_type == "notes":
+        if not search_value:
+            return response_error("A search value is required")
+
+        try:
+            page, per_page = get_search_page_args(jsdata)
+
+        except ValueError as e:
+            return response_error(str(e))
+
+        files = search_notes(search_value, page=page, per_page=per_page)
+
+    if search_type == "all":
+        if not search_value:
+            return response_error("A search value is required")
+
+        try:
+            page, per_page = get_search_page_args(jsdata)
+            object_types, per_type_limit = get_search_object_types(jsdata)
+
+        except ValueError as e:
+            return response_error(str(e))
 
-        ns = []
-        if search_value:
-            search_value = "%{}%".format(search_value)
-            ns = Notes.query.filter(
-                Notes.note_content.like(search_value),
-                Cases.client_id == Client.client_id
-            ).with_entities(
-                Notes.note_id,
-                Notes.note_title,
-                Cases.name.label('case_name'),
-                Client.name.label('client_name')
-            ).join(
-                Notes.case
-            ).order_by(
-                Client.name
-            ).all()
-
-            ns = [row._asdict() for row in ns]
-
-        files = ns
+        files = search_objects(search_value, object_types=object_types, page=page, per_page=per_page,
+                               per_type_limit=per_type_limit)
 
     return response_success("Results fetched", files)
 
@@ -131,6 +131,16 @@ class Config():
 
     DROPZONE_TIMEOUT = 5 * 60 * 10000  # 5 Minutes of uploads per file
 
+    """ Notes configuration
+    Number of previous versions kept per note. 0 disables the revisions history
+    """
+    NOTES_MAX_REVISIONS = config.getint('IRIS', 'NOTES_MAX_REVISIONS', fallback=50)
+
+    """ Evidences configuration
+    Number of processes hashing the evidences files on the worker. 0 uses all the CPUs
+    """
+    EVIDENCE_HASH_PROCESSES = config.getint('IRIS', 'EVIDENCE_HASH_PROCESSES', fallback=0)
+
     """ Celery configuration
     Configure URL and backend
     """
@@ -21,9 +21,14 @@
 import datetime
 
 from app import db
+from app.datamgmt.datatables import paginate_datatables
+from app.datamgmt.search.search_index_db import delete_search_documents
 from app.datamgmt.states import update_assets_state
-from app.models import AssetsType, IocAssetLink, CaseAssets, Cases, Ioc, AnalysisStatus, CaseEventsAssets, IocType
-from sqlalchemy import and_, func
+from app.models import AssetsType, IocAssetLink, CaseAssets, Cases, Ioc, AnalysisStatus, CaseEventsAssets, IocType, \
+    ObjectState
+from sqlalchemy import and_, func, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import aliased
 
 
 def create_asset(asset, caseid, user_id):
@@ -41,8 +46,48 @@ def create_asset(asset, caseid, user_id):
     return asset
 
 
-def get_assets(caseid):
-    assets = CaseAssets.query.with_entities(
+def add_case_assets_batch(assets, caseid, user_id):
+    """
+    Add a batch of assets to a case, without committing. The assets are flushed so their IDs are available.
+    The caller is expected to bump the assets state and commit once all the batches are added.
+    :param assets: List of CaseAssets
+    :param caseid: Case ID
+    :param user_id: ID of the user adding the assets
+    :return: List of added CaseAssets
+    """
+    now = datetime.datetime.utcnow()
+    for asset in assets:
+        asset.date_added = now
+        asset.date_update = now
+        asset.case_id = caseid
+        asset.user_id = user_id
+
+    db.session.add_all(assets)
+    db.session.flush()
+
+    return assets
+
+
+def get_assets_types_map():
+    """
+    Return the asset types as a dict lowered name -> ID
+    """
+    types = AssetsType.query.with_entities(
+        AssetsType.asset_id,
+        AssetsType.asset_name
+    ).all()
+
+    return {asset_type.asset_name.lower(): asset_type.asset_id for asset_type in types}
+
+
+def get_assets(caseid, dt_query=None):
+    """
+    Return the assets of a case
+    :param caseid: Case ID
+    :param dt_query: Optional DataTablesQuery. If set, only the requested page is returned
+    :return: List of rows, or DataTablesPage if dt_query is set
+    """
+    query = CaseAssets.query.with_entities(
         CaseAssets.asset_id,
         CaseAssets.asset_name,
         AssetsType.asset_name.label('asset_type'),
@@ -58,9 +103,26 @@ def get_assets(caseid):
         CaseAssets.case_id == caseid,
     ).join(
         CaseAssets.asset_type, CaseAssets.analysis_status
-    ).all()
-
-    return assets
+    )
+
+    if dt_query:
+        return paginate_datatables(query, dt_query,
+                                   columns={
+                                       'asset_name': CaseAssets.asset_name,
+                                       'asset_type': AssetsType.asset_name,
+                                       'asset_description': CaseAssets.asset_description,
+                                       'asset_ip': CaseAssets.asset_ip,
+                                       'asset_domain': CaseAssets.asset_domain,
+                                       'asset_compromised': CaseAssets.asset_compromised,
+                                       'asset_tags': CaseAssets.asset_tags,
+                                       'analysis_status': AnalysisStatus.name
+                                   },
+                                   search_columns=[CaseAssets.asset_name, AssetsType.asset_name,
+                                                   CaseAssets.asset_description, CaseAssets.asset_ip,
+                                                   CaseAssets.asset_domain, CaseAssets.asset_tags],
+                                   default_order=[CaseAssets.asset_id])
+
+    return query.all()
 
 
 def get_assets_name(caseid):
@@ -116,6 +178,7 @@ def delete_asset(asset_id, caseid):
         CaseAssets.asset_id == asset_id,
         CaseAssets.case_id == caseid
     ).delete()
+    delete_search_documents('asset', [asset_id], caseid)
 
     update_assets_state(caseid=caseid)
 
@@ -150,23 +213,77 @@ def get_asset_type_id(asset_type_name):
     return assets_type_id
 
 
-def get_similar_assets(asset_name, asset_type_id, caseid, customer_id):
+def get_similar_assets_by_asset(caseid, customer_id, asset_ids=None):
+    """
+    Return the assets of the other cases of the same customer that share the name and type of the assets
+    of a case, in a single query
+    :param caseid: Case ID
+    :param customer_id: Customer of the case
+    :param asset_ids: Only look for the assets with these IDs
+    :return: Dict asset ID -> list of linked assets
+    """
+    case_asset = aliased(CaseAssets)
 
-    linked_assets = CaseAssets.query.with_entities(
+    conditions = [case_asset.case_id == caseid, Cases.client_id == customer_id]
+    if asset_ids is not None:
+        conditions.append(case_asset.asset_id.in_(asset_ids))
+
+    linked_assets = db.session.query(
+        case_asset.asset_id,
         Cases.name.label('case_name'),
         Cases.open_date.label('case_open_date'),
         CaseAssets.asset_description,
-        CaseAssets.asset_compromised,
-    ).filter(
-        and_(
-            CaseAssets.asset_name == asset_name,
-            CaseAssets.case_id != caseid,
-            CaseAssets.asset_type_id == asset_type_id,
-            Cases.client_id == customer_id
+        CaseAssets.asset_compromised
+    ).select_from(
+        case_asset
+    ).join(
+        CaseAssets, and_(
+            CaseAssets.asset_name == case_asset.asset_name,
+            CaseAssets.asset_type_id == case_asset.asset_type_id,
+            CaseAssets.case_id != caseid
         )
-    ).join(CaseAssets.case).all()
+    ).join(
+        Cases, Cases.case_id == CaseAssets.case_id
+    ).filter(
+        *conditions
+    ).all()
 
-    return linked_assets
+    links = {}
+    for link in linked_assets:
+        link = link._asdict()
+        links.setdefault(link.pop('asset_id'), []).append(link)
+
+    return links
+
+
+def get_similar_assets_key(caseid):
+    """
+    Return a digest of the other cases of the customer of a case, with their names and assets states. It changes
+    whenever an asset is added, edited or removed in one of them, so the assets list of the case and its similar
+    assets can be cached on it
+    :param caseid: Case ID
+    :return: Digest string, or None if the customer has no other case
+    """
+    case = aliased(Cases)
+    customer_id = db.session.query(case.client_id).filter(case.case_id == caseid).scalar_subquery()
+
+    return db.session.query(
+        func.md5(func.string_agg(
+            func.concat(Cases.case_id, ':', ObjectState.object_state, ':', func.md5(Cases.name), ':',
+                        Cases.open_date),
+            aggregate_order_by(literal_column("','"), Cases.case_id)
+        ))
+    ).select_from(
+        Cases
+    ).outerjoin(
+        ObjectState, and_(
+            ObjectState.object_case_id == Cases.case_id,
+            ObjectState.object_name == 'assets'
+        )
+    ).filter(
+        Cases.client_id == customer_id,
+        Cases.case_id != caseid
+    ).scalar()
 
 
 def delete_ioc_asset_link(asset_id):
@@ -187,7 +304,7 @@ def get_linked_iocs_from_asset(asset_id):
     return iocs
 
 
-def set_ioc_links(ioc_list, asset_id):
+def set_ioc_links(ioc_list, asset_id, caseid):
     if ioc_list is None:
         return
 
@@ -201,6 +318,7 @@ def set_ioc_links(ioc_list, asset_id):
 
         db.session.add(ial)
 
+    update_assets_state(caseid=caseid)
     db.session.commit()
 
 
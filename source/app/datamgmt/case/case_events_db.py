@@ -18,8 +18,13 @@
 #  along with this program; if not, write to the Free Software Foundation,
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-from sqlalchemy import and_
+import base64
+from datetime import datetime
 
+from sqlalchemy import and_, tuple_, func
+
+from app.datamgmt.datatables import paginate_datatables
+from app.datamgmt.states import update_timeline_state
 from app.models import CaseAssets, AssetsType, EventCategory, CaseEventCategory, CasesEvent, CaseEventsAssets
 from app import db
 
@@ -122,6 +127,57 @@ def update_event_assets(event_id, caseid, assets_list):
     return True
 
 
+def add_case_events_batch(events, caseid, user_id):
+    """
+    Insert a batch of events, with their category and assets links, in a single transaction.
+    The timeline state is only bumped once for the whole batch.
+    :param events: List of tuples (CasesEvent, category ID, list of assets IDs)
+    :param caseid: Case ID
+    :param user_id: ID of the user adding the events
+    :return: List of added CasesEvent
+    """
+    now = datetime.utcnow()
+    for event, _, _ in events:
+        event.case_id = caseid
+        event.event_added = now
+        event.user_id = user_id
+
+    db.session.add_all([event for event, _, _ in events])
+
+    # Retrieve the IDs of the new events without committing
+    db.session.flush()
+
+    db.session.bulk_insert_mappings(CaseEventCategory, [
+        {'event_id': event.event_id, 'category_id': category_id}
+        for event, category_id, _ in events
+    ])
+
+    db.session.bulk_insert_mappings(CaseEventsAssets, [
+        {'event_id': event.event_id, 'asset_id': int(asset_id), 'case_id': caseid}
+        for event, _, assets_list in events
+        for asset_id in set(assets_list or [])
+    ])
+
+    update_timeline_state(caseid=caseid, userid=user_id, event_ids=[event.event_id for event, _, _ in events])
+
+    db.session.commit()
+
+    return [event for event, _, _ in events]
+
+
+def get_case_assets_ids(caseid):
+    """
+    Return the set of IDs of the assets linked to a case
+    """
+    assets = CaseAssets.query.with_entities(
+        CaseAssets.asset_id
+    ).filter(
+        CaseAssets.case_id == caseid
+    ).all()
+
+    return set(asset.asset_id for asset in assets)
+
+
 def get_case_assets(caseid):
     """
     Return a list of all assets linked to the current case
@@ -143,4 +199,278 @@ def get_case_assets(caseid):
             'asset_id': asset.asset_id
         })
 
-    return assets
\ No newline at end of file
+    return assets
+
+
+def encode_timeline_cursor(event_date, event_id):
+    """
+    Build an opaque pagination cursor from the last event of a page
+    :param event_date: Date of the last event returned
+    :param event_id: ID of the last event returned
+    :return: URL safe string
+    """
+    raw = "{}|{}".format(event_date.strftime('%Y-%m-%dT%H:%M:%S.%f'), event_id)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('utf-8')
+
+
+def decode_timeline_cursor(cursor):
+    """
+    Decode a pagination cursor built with encode_timeline_cursor
+    :param cursor: Cursor provided by the client
+    :return: Tuple (event_date, event_id) or None if the cursor is invalid
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('utf-8')).decode('utf-8')
+        event_date, event_id = raw.split('|')
+        return datetime.strptime(event_date, '%Y-%m-%dT%H:%M:%S.%f'), int(event_id)
+
+    except Exception:
+        return None
+
+
+def get_case_timeline_projection(caseid, asset_id=None, category_id=None, in_summary=None, cursor=None,
+                                 limit=None, event_ids=None, start_date=None, end_date=None, dt_query=None):
+    """
+    Return the events of a case with their category and linked assets already aggregated by the database,
+    ordered by (event_date, event_id). Each row holds an `assets` JSON list of dicts with the keys asset_id,
+    asset_name, asset_type, asset_ip, asset_description and asset_compromised.
+    :param caseid: Case ID
+    :param asset_id: Only return events linked to this asset
+    :param category_id: Only return events of this category
+    :param in_summary: Only return events flagged (or not) to be shown in the summary
+    :param cursor: Tuple (event_date, event_id). Only return events located after it
+    :param limit: Max number of events to return
+    :param event_ids: Only return events with these IDs
+    :param start_date: Only return events dated from start_date
+    :param end_date: Only return events dated before end_date
+    :param dt_query: Optional DataTablesQuery. If set, only the requested page is returned
+    :return: List of rows, or DataTablesPage if dt_query is set
+    """
+    # Correlated to each selected event, so a page or a window only aggregates the links of its own events
+    assets_agg = db.session.query(
+        func.json_agg(func.json_build_object(
+            'asset_id', CaseAssets.asset_id,
+            'asset_name', CaseAssets.asset_name,
+            'asset_type', AssetsType.asset_name,
+            'asset_ip', CaseAssets.asset_ip,
+            'asset_description', CaseAssets.asset_description,
+            'asset_compromised', CaseAssets.asset_compromised
+        ))
+    ).select_from(
+        CaseEventsAssets
+    ).join(
+        CaseEventsAssets.asset,
+        CaseAssets.asset_type
+    ).filter(
+        CaseEventsAssets.event_id == CasesEvent.event_id,
+        CaseEventsAssets.case_id == caseid
+    ).correlate(
+        CasesEvent
+    ).scalar_subquery()
+
+    conditions = [CasesEvent.case_id == caseid]
+
+    if asset_id:
+        conditions.append(CasesEvent.event_id.in_(
+            db.session.query(CaseEventsAssets.event_id).filter(
+                CaseEventsAssets.case_id == caseid,
+                CaseEventsAssets.asset_id == asset_id
+            )
+        ))
+
+    if category_id:
+        conditions.append(EventCategory.id == category_id)
+
+    if in_summary is not None:
+        conditions.append(CasesEvent.event_in_summary == in_summary)
+
+    if event_ids is not None:
+        conditions.append(CasesEvent.event_id.in_(event_ids))
+
+    if start_date:
+        conditions.append(CasesEvent.event_date >= start_date)
+
+    if end_date:
+        conditions.append(CasesEvent.event_date < end_date)
+
+    if cursor:
+        conditions.append(tuple_(CasesEvent.event_date, CasesEvent.event_id) > tuple_(*cursor))
+
+    query = CasesEvent.query.with_entities(
+        CasesEvent.event_id,
+        CasesEvent.event_date,
+        CasesEvent.event_date_wtz,
+        CasesEvent.event_tz,
+        CasesEvent.event_title,
+        CasesEvent.event_color,
+        CasesEvent.event_tags,
+        CasesEvent.event_content,
+        CasesEvent.event_in_summary,
+        CasesEvent.event_in_graph,
+        EventCategory.name.label("category_name"),
+        EventCategory.id.label("event_category_id"),
+        assets_agg.label('assets')
+    ).filter(
+        and_(*conditions)
+    ).outerjoin(
+        CasesEvent.category
+    ).order_by(
+        CasesEvent.event_date,
+        CasesEvent.event_id
+    )
+
+    if dt_query:
+        return paginate_datatables(query, dt_query,
+                                   columns={
+                                       'event_date': CasesEvent.event_date,
+                                       'event_title': CasesEvent.event_title,
+                                       'event_content': CasesEvent.event_content,
+                                       'event_tags': CasesEvent.event_tags,
+                                       'category_name': EventCategory.name
+                                   },
+                                   search_columns=[CasesEvent.event_title, CasesEvent.event_content,
+                                                   CasesEvent.event_tags, EventCategory.name],
+                                   default_order=[CasesEvent.event_date, CasesEvent.event_id])
+
+    if limit:
+        query = query.limit(limit)
+
+    return query.all()
+
+
+def get_case_events_page(caseid, page_size, cursor=None, asset_id=None, category_id=None):
+    """
+    Return a page of the timeline of a case, ordered by (event_date, event_id).
+    The page starts right after the provided cursor position.
+    :param caseid: Case ID
+    :param page_size: Max number of events to return
+    :param cursor: Tuple (event_date, event_id) of the last event of the previous page
+    :param asset_id: Only return events linked to this asset
+    :param category_id: Only return events of this category
+    :return: Tuple (events, next cursor or None)
+    """
+    timeline = get_case_timeline_projection(caseid=caseid,
+                                            asset_id=asset_id,
+                                            category_id=category_id,
+                                            cursor=cursor,
+                                            limit=page_size + 1)
+
+    next_cursor = None
+    if len(timeline) > page_size:
+        timeline = timeline[:page_size]
+        next_cursor = encode_timeline_cursor(timeline[-1].event_date, timeline[-1].event_id)
+
+    return timeline, next_cursor
+
+
+def _timeline_group_query(caseid, group_by, *entities):
+    """
+    Build a query over the summary events of a case, joined with the column used to group them in the
+    timeline visualization. The group is labelled `group_name`.
+    :param caseid: Case ID
+    :param group_by: 'asset' or 'category'
+    :param entities: Additional columns to select
+    :return: Tuple (query, group column)
+    """
+    if group_by == 'asset':
+        group_column = CaseAssets.asset_name
+        query = db.session.query(group_column.label('group_name'), *entities).select_from(
+            CasesEvent
+        ).join(
+            CaseEventsAssets, CaseEventsAssets.event_id == CasesEvent.event_id
+        ).join(
+            CaseAssets, CaseAssets.asset_id == CaseEventsAssets.asset_id
+        )
+
+    else:
+        group_column = EventCategory.name
+        query = db.session.query(group_column.label('group_name'), *entities).select_from(
+            CasesEvent
+        ).outerjoin(
+            CasesEvent.category
+        )
+
+    query = query.filter(
+        CasesEvent.case_id == caseid,
+        CasesEvent.event_in_summary == True
+    )
+
+    return query, group_column
+
+
+def get_case_timeline_bounds(caseid, group_by):
+    """
+    Return the dates of the first and last summary events of a case
+    :param caseid: Case ID
+    :param group_by: 'asset' or 'category'
+    :return: Tuple (first date, last date), both None if the case has no summary events
+    """
+    query, _ = _timeline_group_query(caseid, group_by)
+    return query.with_entities(
+        func.min(CasesEvent.event_date),
+        func.max(CasesEvent.event_date)
+    ).one()
+
+
+def count_case_timeline_items(caseid, group_by, start_date, end_date):
+    """
+    Count the items the timeline visualization would display within a window. With the asset
+    grouping, an event linked to several assets counts once per asset.
+    :param caseid: Case ID
+    :param group_by: 'asset' or 'category'
+    :param start_date: Start of the window, included
+    :param end_date: End of the window, excluded
+    :return: int
+    """
+    query, _ = _timeline_group_query(caseid, group_by)
+    return query.with_entities(
+        func.count()
+    ).filter(
+        CasesEvent.event_date >= start_date,
+        CasesEvent.event_date < end_date
+    ).scalar()
+
+
+def get_case_timeline_buckets(caseid, group_by, start_date, end_date, resolution):
+    """
+    Count the summary events of a case per group and per time bucket, within a window.
+    :param caseid: Case ID
+    :param group_by: 'asset' or 'category'
+    :param start_date: Start of the window, included
+    :param end_date: End of the window, excluded
+    :param resolution: Either a number of buckets of equal width spanning the window (width_bucket), or a
+                       date_trunc unit such as 'hour' or 'day'
+    :return: List of rows with group_name, bucket_start, first_date, last_date and count
+    """
+    if isinstance(resolution, int):
+        # Epochs are computed the same way as Postgres does for timestamps without time zone
+        low = (start_date - datetime(1970, 1, 1)).total_seconds()
+        high = (end_date - datetime(1970, 1, 1)).total_seconds()
+        width = (high - low) / resolution
+
+        bucket = func.width_bucket(func.extract('epoch', CasesEvent.event_date), low, high, resolution)
+        bucket_start = func.to_timestamp(low + (bucket - 1) * width).op('AT TIME ZONE')('UTC')
+
+    else:
+        bucket_start = func.date_trunc(resolution, CasesEvent.event_date)
+
+    bucket_start = bucket_start.label('bucket_start')
+
+    query, group_column = _timeline_group_query(
+        caseid, group_by,
+        bucket_start,
+        func.min(CasesEvent.event_date).label('first_date'),
+        func.max(CasesEvent.event_date).label('last_date'),
+        func.count().label('count')
+    )
+
+    return query.filter(
+        CasesEvent.event_date >= start_date,
+        CasesEvent.event_date < end_date
+    ).group_by(
+        group_column,
+        bucket_start
+    ).order_by(
+        group_column,
+        bucket_start
+    ).all()
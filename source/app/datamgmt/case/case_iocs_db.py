@@ -19,11 +19,17 @@
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 import json
 
-from sqlalchemy import and_
+from sqlalchemy import and_, func, values, column, Integer, Text, literal_column
+from sqlalchemy.dialects.postgresql import insert, aggregate_order_by
+from sqlalchemy.orm import aliased
 from sqlalchemy.orm.attributes import flag_modified
 
+from app.datamgmt.case.case_mentions_db import delete_ioc_mentions
+from app.datamgmt.datatables import paginate_datatables
+from app.datamgmt.manage.manage_attribute_db import get_default_custom_attributes
+from app.datamgmt.search.search_index_db import refresh_search_documents, delete_search_documents
 from app.datamgmt.states import update_ioc_state
-from app.models import IocAssetLink, Ioc, IocLink, Tlp, Cases, Client, IocType, CustomAttribute
+from app.models import IocAssetLink, Ioc, IocLink, Tlp, Cases, Client, IocType, CustomAttribute, ObjectState
 from app import db
 
 
@@ -78,6 +84,11 @@ def delete_ioc(ioc, caseid):
             IocLink.case_id == caseid
         )
     ).delete()
+    delete_ioc_mentions(ioc.ioc_id, caseid)
+    delete_search_documents('ioc', [ioc.ioc_id], caseid)
+
+    # The IOC can stay linked to other cases, the lists of this case change anyway
+    update_ioc_state(caseid=caseid)
     db.session.commit()
 
     res = IocLink.query.filter(
@@ -99,8 +110,14 @@ def delete_ioc(ioc, caseid):
     return True
 
 
-def get_detailed_iocs(caseid):
-    detailed_iocs = IocLink.query.with_entities(
+def get_detailed_iocs(caseid, dt_query=None):
+    """
+    Return the IOCs of a case with their type and TLP
+    :param caseid: Case ID
+    :param dt_query: Optional DataTablesQuery. If set, only the requested page is returned
+    :return: List of rows, or DataTablesPage if dt_query is set
+    """
+    query = IocLink.query.with_entities(
         Ioc.ioc_id,
         Ioc.ioc_value,
         Ioc.ioc_type_id,
@@ -118,9 +135,22 @@ def get_detailed_iocs(caseid):
     ).join(IocLink.ioc,
            Ioc.tlp,
            Ioc.ioc_type
-    ).order_by(IocType.type_name).all()
+    )
+
+    if dt_query:
+        return paginate_datatables(query, dt_query,
+                                   columns={
+                                       'ioc_value': Ioc.ioc_value,
+                                       'ioc_type': IocType.type_name,
+                                       'ioc_description': Ioc.ioc_description,
+                                       'ioc_tags': Ioc.ioc_tags,
+                                       'tlp_name': Tlp.tlp_name
+                                   },
+                                   search_columns=[Ioc.ioc_value, IocType.type_name, Ioc.ioc_description,
+                                                   Ioc.ioc_tags],
+                                   default_order=[IocType.type_name, Ioc.ioc_id])
 
-    return detailed_iocs
+    return query.order_by(IocType.type_name).all()
 
 
 def get_ioc_links(ioc_id, caseid):
@@ -136,8 +166,92 @@ def get_ioc_links(ioc_id, caseid):
     return ioc_link
 
 
+def get_case_iocs_links(caseid, ioc_ids=None):
+    """
+    Return the other cases linked to the IOCs of a case, in a single query
+    :param caseid: Case ID
+    :param ioc_ids: Only look for the IOCs with these IDs
+    :return: Dict IOC ID -> list of links (case_id, case_name, client_name)
+    """
+    case_link = aliased(IocLink)
+
+    conditions = [case_link.case_id == caseid]
+    if ioc_ids is not None:
+        conditions.append(case_link.ioc_id.in_(ioc_ids))
+
+    iocs_links = db.session.query(
+        case_link.ioc_id,
+        Cases.case_id,
+        Cases.name.label('case_name'),
+        Client.name.label('client_name')
+    ).select_from(
+        case_link
+    ).join(
+        IocLink, and_(
+            IocLink.ioc_id == case_link.ioc_id,
+            IocLink.case_id != caseid
+        )
+    ).join(
+        Cases, Cases.case_id == IocLink.case_id
+    ).join(
+        Client, Client.client_id == Cases.client_id
+    ).filter(
+        *conditions
+    ).all()
+
+    links = {}
+    for link in iocs_links:
+        link = link._asdict()
+        links.setdefault(link.pop('ioc_id'), []).append(link)
+
+    return links
+
+
+def get_iocs_links_key(caseid):
+    """
+    Return a digest of the other cases sharing IOCs with a case, with their names and IOC states. It changes
+    whenever a shared IOC is linked, unlinked or edited from another case, so the lists of the case showing
+    shared IOCs and their links can be cached on it
+    :param caseid: Case ID
+    :return: Digest string, or None if the case shares no IOC
+    """
+    case_link = aliased(IocLink)
+    linked_cases = db.session.query(
+        IocLink.case_id
+    ).select_from(
+        case_link
+    ).join(
+        IocLink, and_(
+            IocLink.ioc_id == case_link.ioc_id,
+            IocLink.case_id != caseid
+        )
+    ).filter(
+        case_link.case_id == caseid
+    )
+
+    return db.session.query(
+        func.md5(func.string_agg(
+            func.concat(Cases.case_id, ':', ObjectState.object_state, ':', func.md5(Cases.name), ':',
+                        func.md5(Client.name)),
+            aggregate_order_by(literal_column("','"), Cases.case_id)
+        ))
+    ).select_from(
+        Cases
+    ).join(
+        Client, Client.client_id == Cases.client_id
+    ).outerjoin(
+        ObjectState, and_(
+            ObjectState.object_case_id == Cases.case_id,
+            ObjectState.object_name == 'ioc'
+        )
+    ).filter(
+        Cases.case_id.in_(linked_cases)
+    ).scalar()
+
+
 def find_ioc(ioc_value, ioc_type_id):
-    ioc = Ioc.query.filter(Ioc.ioc_value == ioc_value,
+    ioc = Ioc.query.filter(func.md5(Ioc.ioc_value) == func.md5(ioc_value),
+                           Ioc.ioc_value == ioc_value,
                            Ioc.ioc_type_id == ioc_type_id).first()
 
     return ioc
@@ -164,6 +278,99 @@ def add_ioc(ioc, user_id, caseid):
         return db_ioc, True
 
 
+def resolve_iocs(keys):
+    """
+    Find the existing IOCs matching a list of (ioc_value, ioc_type_id), in a single query
+    :param keys: List of tuples (ioc_value, ioc_type_id)
+    :return: dict (ioc_value, ioc_type_id) -> ioc_id of the IOCs found
+    """
+    if not keys:
+        return {}
+
+    batch = values(column('ioc_value', Text), column('ioc_type_id', Integer), name='batch').data(list(keys))
+
+    # The md5 condition lets the planner use the unique index on (md5(ioc_value), ioc_type_id)
+    iocs = db.session.query(
+        Ioc.ioc_id,
+        Ioc.ioc_value,
+        Ioc.ioc_type_id
+    ).join(
+        batch, and_(
+            func.md5(Ioc.ioc_value) == func.md5(batch.c.ioc_value),
+            Ioc.ioc_type_id == batch.c.ioc_type_id,
+            Ioc.ioc_value == batch.c.ioc_value
+        )
+    ).all()
+
+    return {(ioc.ioc_value, ioc.ioc_type_id): ioc.ioc_id for ioc in iocs}
+
+
+def add_case_iocs_batch(iocs, caseid, user_id):
+    """
+    Add a batch of IOCs to a case, without committing.
+    IOCs already known with the same value and type are reused. The new IOCs and the links to the case are
+    inserted with a single statement each, and the links already existing are left untouched.
+    The caller is expected to bump the IOC state and commit once all the batches are added.
+    :param iocs: List of dicts with ioc_value, ioc_type_id, ioc_description, ioc_tags and ioc_tlp_id,
+                 unique by (ioc_value, ioc_type_id)
+    :param caseid: Case ID
+    :param user_id: ID of the user adding the IOCs
+    :return: Tuple (dict (ioc_value, ioc_type_id) -> ioc_id, set of the IOC IDs newly linked to the case)
+    """
+    if not iocs:
+        return {}, set()
+
+    keys = [(ioc['ioc_value'], ioc['ioc_type_id']) for ioc in iocs]
+    ioc_ids = resolve_iocs(keys)
+
+    new_iocs = [ioc for ioc, key in zip(iocs, keys) if key not in ioc_ids]
+    if new_iocs:
+        custom_attributes = get_default_custom_attributes('ioc')
+
+        inserted = db.session.execute(
+            insert(Ioc).values([{
+                'ioc_value': ioc['ioc_value'],
+                'ioc_type_id': ioc['ioc_type_id'],
+                'ioc_description': ioc.get('ioc_description'),
+                'ioc_tags': ioc.get('ioc_tags'),
+                'ioc_tlp_id': ioc['ioc_tlp_id'],
+                'user_id': user_id,
+                'custom_attributes': custom_attributes
+            } for ioc in new_iocs]).on_conflict_do_nothing(
+                index_elements=[func.md5(Ioc.ioc_value), Ioc.ioc_type_id]
+            ).returning(
+                Ioc.ioc_id, Ioc.ioc_value, Ioc.ioc_type_id
+            )
+        )
+        ioc_ids.update({(ioc.ioc_value, ioc.ioc_type_id): ioc.ioc_id for ioc in inserted})
+
+        # IOCs created by a concurrent import in the meantime
+        if len(ioc_ids) < len(keys):
+            ioc_ids.update(resolve_iocs([key for key in keys if key not in ioc_ids]))
+
+    if not ioc_ids:
+        return ioc_ids, set()
+
+    linked = db.session.execute(
+        insert(IocLink).values([
+            {'ioc_id': ioc_id, 'case_id': caseid} for ioc_id in set(ioc_ids.values())
+        ]).on_conflict_do_nothing(
+            index_elements=[IocLink.case_id, IocLink.ioc_id]
+        ).returning(
+            IocLink.ioc_id
+        )
+    )
+    linked_ids = {link.ioc_id for link in linked}
+
+    refresh_search_documents('ioc', linked_ids, caseid)
+
+    return ioc_ids, linked_ids
+
+
+def get_iocs_by_ids(ioc_ids):
+    return Ioc.query.filter(Ioc.ioc_id.in_(ioc_ids)).all()
+
+
 def find_ioc_link(ioc_id, caseid):
     db_link = IocLink.query.filter(
         IocLink.case_id == caseid,
@@ -185,6 +392,8 @@ def add_ioc_link(ioc_id, caseid):
         link.ioc_id = ioc_id
 
         db.session.add(link)
+
+        update_ioc_state(caseid=caseid)
         db.session.commit()
 
         return False
@@ -233,6 +442,18 @@ def get_tlps():
     return [(tlp.tlp_id, tlp.tlp_name) for tlp in Tlp.query.all()]
 
 
+def get_ioc_types_map():
+    """
+    Return the IOC types as a dict lowered name -> ID
+    """
+    types = IocType.query.with_entities(
+        IocType.type_id,
+        IocType.type_name
+    ).all()
+
+    return {ioc_type.type_name.lower(): ioc_type.type_id for ioc_type in types}
+
+
 def get_tlps_dict():
     tlpDict = {}
     for tlp in Tlp.query.all():
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from sqlalchemy import and_, func, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from app import db
+from app.models import IocMention, Ioc, IocLink, CasesEvent, Notes
+
+# Text fields scanned for IOC mentions, per type of object
+MENTION_SOURCES = {
+    'event': (CasesEvent, CasesEvent.event_id, CasesEvent.case_id,
+              ('event_title', 'event_content', 'event_raw')),
+    'note': (Notes, Notes.note_id, Notes.note_case_id,
+             ('note_title', 'note_content'))
+}
+
+MENTION_SCAN_BATCH_SIZE = 500
+
+
+def iter_mention_sources(caseid, object_type, object_ids=None):
+    """
+    Iterate over the scanned fields of the objects of a case
+    :param caseid: Case ID
+    :param object_type: Type of object, key of MENTION_SOURCES
+    :param object_ids: Restrict to these objects. All the objects of the case if None
+    :return: Iterator of (object_id, dict field -> text)
+    """
+    model, id_column, case_column, fields = MENTION_SOURCES[object_type]
+
+    query = model.query.with_entities(
+        id_column,
+        *[getattr(model, field) for field in fields]
+    ).filter(
+        case_column == caseid
+    )
+
+    if object_ids is not None:
+        query = query.filter(id_column.in_(object_ids))
+
+    for row in query.yield_per(MENTION_SCAN_BATCH_SIZE):
+        yield row[0], dict(zip(fields, row[1:]))
+
+
+def replace_ioc_mentions(caseid, object_type, object_ids, mentions):
+    """
+    Replace the mentions stored for some objects. Expects a db commit soon after
+    :param caseid: Case ID
+    :param object_type: Type of object
+    :param object_ids: Objects scanned. All the objects of the case if None
+    :param mentions: List of (object_id, object_field, ioc_id, mention_count)
+    """
+    delete_object_mentions(caseid, object_type, object_ids)
+
+    if mentions:
+        db.session.bulk_insert_mappings(IocMention, [{
+            'case_id': caseid,
+            'object_type': object_type,
+            'object_id': object_id,
+            'object_field': object_field,
+            'ioc_id': ioc_id,
+            'mention_count': mention_count
+        } for object_id, object_field, ioc_id, mention_count in mentions])
+
+
+def delete_object_mentions(caseid, object_type, object_ids=None):
+    """
+    Delete the mentions stored for some objects. Expects a db commit soon after
+    :param caseid: Case ID
+    :param object_type: Type of object
+    :param object_ids: Objects to clear. All the objects of the case if None
+    """
+    query = IocMention.query.filter(and_(
+        IocMention.case_id == caseid,
+        IocMention.object_type == object_type
+    ))
+
+    if object_ids is not None:
+        query = query.filter(IocMention.object_id.in_(object_ids))
+
+    query.delete(synchronize_session=False)
+
+
+def delete_ioc_mentions(ioc_id, caseid):
+    """
+    Delete the mentions of an IOC in a case. Expects a db commit soon after
+    """
+    IocMention.query.filter(and_(
+        IocMention.ioc_id == ioc_id,
+        IocMention.case_id == caseid
+    )).delete(synchronize_session=False)
+
+
+def get_mentioned_iocs(caseid, object_type):
+    """
+    Return the IOCs of a case mentioned at least once by an object of the given type
+    """
+    return IocMention.query.with_entities(
+        Ioc.ioc_id,
+        Ioc.ioc_value,
+        Ioc.ioc_description
+    ).filter(and_(
+        IocMention.case_id == caseid,
+        IocMention.object_type == object_type
+    )).join(
+        IocMention.ioc
+    ).distinct().all()
+
+
+def get_ioc_mentions(ioc_id, caseid):
+    """
+    Return the objects of a case mentioning an IOC
+    """
+    return IocMention.query.with_entities(
+        IocMention.object_type,
+        IocMention.object_id,
+        IocMention.object_field,
+        IocMention.mention_count
+    ).filter(and_(
+        IocMention.ioc_id == ioc_id,
+        IocMention.case_id == caseid
+    )).order_by(
+        IocMention.object_type,
+        IocMention.object_id
+    ).all()
+
+
+def get_case_ioc_fingerprint(caseid):
+    """
+    Return a digest of the IDs and values of the IOCs linked to a case. It changes whenever an IOC of the case is
+    added, removed or edited, including from another case sharing the IOC
+    """
+    return IocLink.query.with_entities(
+        func.md5(func.string_agg(
+            func.concat(Ioc.ioc_id, ':', func.md5(func.coalesce(Ioc.ioc_value, ''))),
+            aggregate_order_by(literal_column("','"), Ioc.ioc_id)
+        ))
+    ).filter(
+        IocLink.case_id == caseid
+    ).join(
+        IocLink.ioc
+    ).scalar()
+
+
+def get_case_ioc_values(caseid):
+    """
+    Return the (ioc_id, ioc_value) of the IOCs linked to a case
+    """
+    return IocLink.query.with_entities(
+        Ioc.ioc_id,
+        Ioc.ioc_value
+    ).filter(
+        IocLink.case_id == caseid
+    ).join(
+        IocLink.ioc
+    ).all()
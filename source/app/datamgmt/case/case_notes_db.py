@@ -18,12 +18,19 @@
 #  along with this program; if not, write to the Free Software Foundation,
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-from sqlalchemy import and_
+from sqlalchemy import and_, func, literal, Text
+from sqlalchemy.orm.exc import StaleDataError
 
-from app import db
+from app import app, db
+from app.datamgmt.case.case_mentions_db import delete_object_mentions
+from app.datamgmt.exceptions.ElementExceptions import ElementConflictException
 from app.datamgmt.manage.manage_attribute_db import get_default_custom_attributes
+from app.datamgmt.search.search_db import search_notes
+from app.datamgmt.search.search_index_db import refresh_search_documents, delete_search_documents
 from app.datamgmt.states import update_notes_state
-from app.models import Notes, NotesGroupLink, NotesGroup, User
+from app.iris_engine.utils.note_patch import validate_note_patch, apply_note_patch, reverse_note_patch, \
+    diff_note_content
+from app.models import Notes, NotesGroupLink, NotesGroup, User, NoteRevision
 
 
 def get_note(note_id, caseid=None):
@@ -35,7 +42,8 @@ def get_note(note_id, caseid=None):
         Notes.note_lastupdate,
         NotesGroupLink.group_id,
         NotesGroup.group_title,
-        Notes.custom_attributes
+        Notes.custom_attributes,
+        Notes.note_version
     ).filter(and_(
         Notes.note_id == note_id,
         Notes.note_case_id == caseid
@@ -63,20 +71,45 @@ def delete_note(note_id, caseid):
 
     db.session.commit()
     Notes.query.filter(Notes.note_id == note_id).delete()
+    delete_object_mentions(caseid, 'note', [note_id])
+    delete_search_documents('note', [note_id], caseid)
 
     update_notes_state(caseid=caseid)
     db.session.commit()
 
 
-def update_note(note_content, note_title, update_date, user_id, note_id, caseid):
+def update_note(note_content, note_title, update_date, user_id, note_id, caseid, base_version=None):
+    """
+    Replace the content of a note
+    :param base_version: Version of the note the content was edited from. Not checked if None
+    :return: The updated note, or None if the note doesn't exist
+    :raise ElementConflictException: If the note was updated since the base version
+    """
     note = get_note_raw(note_id, caseid=caseid)
 
     if note:
+        if base_version is not None and note.note_version != base_version:
+            raise ElementConflictException(f'Note {note_id} is at version {note.note_version}')
+
+        previous_content = note.note_content
+        previous_version = note.note_version
+
         note.note_content = note_content
         note.note_title = note_title
         note.note_lastupdate = update_date
         note.note_user = user_id
 
+        try:
+            db.session.flush()
+
+        except StaleDataError:
+            db.session.rollback()
+            raise ElementConflictException(f'Note {note_id} was updated concurrently')
+
+        add_note_revision(note_id, previous_version, diff_note_content(note_content, previous_content),
+                          update_date, user_id)
+
+        update_notes_state(caseid=caseid, userid=user_id)
         db.session.commit()
         return note
 
@@ -84,6 +117,167 @@ def update_note(note_content, note_title, update_date, user_id, note_id, caseid)
         return None
 
 
+def patch_note(note_id, caseid, base_version, base_length, patch, update_date, user_id, note_title=None):
+    """
+    Apply a patch on the content of a note. The patch is applied by the database, so the content of the note
+    is never loaded.
+    :param base_version: Version of the note the patch was computed from
+    :param base_length: Length in characters of the content the patch was computed from. Editors normalize the
+                        line endings, so a client base can differ from the stored content of the same version
+    :param patch: List of operations {offset, delete, insert}. See validate_note_patch
+    :param note_title: New title of the note. Unchanged if None
+    :return: The new version of the note, or None if the note doesn't exist
+    :raise ElementConflictException: If the note was updated since the base version, or if the base content differs
+    :raise NotePatchError: If the patch doesn't fit the base version
+    """
+    content = func.coalesce(Notes.note_content, '')
+    note_filter = and_(
+        Notes.note_id == note_id,
+        Notes.note_case_id == caseid
+    )
+
+    note = Notes.query.with_entities(
+        Notes.note_version,
+        func.char_length(content).label('content_length')
+    ).filter(note_filter).first()
+
+    if not note:
+        return None
+
+    if note.note_version != base_version:
+        raise ElementConflictException(f'Note {note_id} is at version {note.note_version}')
+
+    if note.content_length != base_length:
+        raise ElementConflictException(f'Note {note_id} content is {note.content_length} characters long, '
+                                       f'the patch base is {base_length}')
+
+    operations = validate_note_patch(patch, note.content_length)
+
+    # Texts removed by the patch, to revert it
+    deleted = [''] * len(operations)
+    removals = [(index, offset, delete) for index, (offset, delete, _) in enumerate(operations) if delete]
+    if removals:
+        removed = db.session.query(
+            *[func.substr(content, offset + 1, delete) for _, offset, delete in removals]
+        ).filter(note_filter).one()
+
+        for (index, _, _), text in zip(removals, removed):
+            deleted[index] = text
+
+    new_content = None
+    position = 0
+    for offset, delete, insert in operations:
+        new_content = _concat(new_content, func.substr(content, position + 1, offset - position))
+        new_content = _concat(new_content, literal(insert, Text))
+        position = offset + delete
+
+    new_content = _concat(new_content, func.substr(content, position + 1))
+
+    values = {
+        Notes.note_content: new_content,
+        Notes.note_version: Notes.note_version + 1,
+        Notes.note_lastupdate: update_date,
+        Notes.note_user: user_id
+    }
+    if note_title is not None:
+        values[Notes.note_title] = note_title
+
+    updated = Notes.query.filter(
+        note_filter,
+        Notes.note_version == base_version
+    ).update(values, synchronize_session=False)
+
+    if not updated:
+        db.session.rollback()
+        raise ElementConflictException(f'Note {note_id} was updated concurrently')
+
+    add_note_revision(note_id, base_version, reverse_note_patch(operations, deleted), update_date, user_id)
+    refresh_search_documents('note', [note_id])
+
+    update_notes_state(caseid=caseid, userid=user_id)
+    db.session.commit()
+
+    return base_version + 1
+
+
+def _concat(left, right):
+    return right if left is None else left.op('||')(right)
+
+
+def add_note_revision(note_id, note_version, revision_patch, revision_date, user_id):
+    """
+    Keep a previous version of a note, and drop the revisions beyond NOTES_MAX_REVISIONS.
+    Expects a db commit soon after
+    :param note_version: Version replaced
+    :param revision_patch: Patch turning the new content into the replaced one
+    """
+    max_revisions = app.config.get('NOTES_MAX_REVISIONS', 0)
+    if max_revisions <= 0:
+        return
+
+    revision = NoteRevision()
+    revision.note_id = note_id
+    revision.note_version = note_version
+    revision.revision_patch = revision_patch
+    revision.revision_date = revision_date
+    revision.revision_user = user_id
+    db.session.add(revision)
+
+    NoteRevision.query.filter(
+        NoteRevision.note_id == note_id,
+        NoteRevision.note_version <= note_version - max_revisions
+    ).delete(synchronize_session=False)
+
+
+def get_note_revisions(note_id, caseid):
+    """
+    Return the previous versions of a note kept in the history, latest first
+    """
+    return NoteRevision.query.with_entities(
+        NoteRevision.note_version,
+        NoteRevision.revision_date,
+        User.name.label('user_name')
+    ).filter(
+        NoteRevision.note_id == note_id,
+        Notes.note_case_id == caseid
+    ).join(
+        Notes, Notes.note_id == NoteRevision.note_id
+    ).outerjoin(
+        User, User.id == NoteRevision.revision_user
+    ).order_by(
+        NoteRevision.note_version.desc()
+    ).all()
+
+
+def get_note_content_at_version(note_id, caseid, version):
+    """
+    Rebuild the content of a note at a previous version, by reverting the saves made since then
+    :return: The content, or None if the note or one of the revisions needed doesn't exist
+    """
+    note = get_note_raw(note_id, caseid)
+    if not note or version > note.note_version:
+        return None
+
+    revisions = NoteRevision.query.with_entities(
+        NoteRevision.revision_patch
+    ).filter(
+        NoteRevision.note_id == note_id,
+        NoteRevision.note_version >= version,
+        NoteRevision.note_version < note.note_version
+    ).order_by(
+        NoteRevision.note_version.desc()
+    ).all()
+
+    if len(revisions) != note.note_version - version:
+        return None
+
+    content = note.note_content or ''
+    for revision in revisions:
+        content = apply_note_patch(content, validate_note_patch(revision.revision_patch, len(content)))
+
+    return content
+
+
 def add_note(note_title, creation_date, user_id, caseid, group_id, note_content=""):
     note = Notes()
     note.note_title = note_title
@@ -94,8 +288,6 @@ def add_note(note_title, creation_date, user_id, caseid, group_id, note_content=
 
     note.custom_attributes = get_default_custom_attributes('note')
     db.session.add(note)
-
-    update_notes_state(caseid=caseid, userid=user_id)
     db.session.commit()
 
     if note.note_id:
@@ -105,6 +297,9 @@ def add_note(note_title, creation_date, user_id, caseid, group_id, note_content=
         ngl.case_id = caseid
 
         db.session.add(ngl)
+
+        # The notes list is built from the groups links, the state changes once the note is linked
+        update_notes_state(caseid=caseid, userid=user_id)
         db.session.commit()
 
         return note
@@ -193,12 +388,12 @@ def add_note_group(group_title, caseid, userid, creationdate):
     ng.group_lastupdate = creationdate
 
     db.session.add(ng)
-
-    update_notes_state(caseid=caseid)
     db.session.commit()
 
     if group_title == '':
         ng.group_title = "Group {}".format(ng.group_id)
+
+    update_notes_state(caseid=caseid)
     db.session.commit()
 
     return ng
@@ -238,6 +433,9 @@ def delete_note_group(group_id, caseid):
     for nid in to_delete:
         Notes.query.filter(Notes.note_id == nid).delete()
 
+    delete_object_mentions(caseid, 'note', to_delete)
+    delete_search_documents('note', to_delete, caseid)
+
     NotesGroup.query.filter(and_(
         NotesGroup.group_id == group_id,
         NotesGroup.group_case_id == caseid
@@ -265,13 +463,8 @@ def update_note_group(group_title, group_id, caseid):
         return None
 
 
-def find_pattern_in_notes(pattern, caseid):
-    notes = Notes.query.filter(
-        Notes.note_content.like(pattern),
-        Notes.note_case_id == caseid
-    ).with_entities(
-        Notes.note_id,
-        Notes.note_title
-    ).all()
-
-    return notes
+def find_pattern_in_notes(search_value, caseid, page=1, per_page=50):
+    """
+    Full-text search of the notes of a case. See search_notes
+    """
+    return search_notes(search_value, caseid=caseid, page=page, per_page=per_page)
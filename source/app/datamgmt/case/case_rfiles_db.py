@@ -23,13 +23,21 @@ import datetime
 from sqlalchemy import desc, and_
 
 from app import db
+from app.datamgmt.datatables import paginate_datatables
 from app.datamgmt.manage.manage_attribute_db import get_default_custom_attributes
+from app.datamgmt.search.search_index_db import delete_search_documents
 from app.datamgmt.states import update_evidences_state
 from app.models import CaseReceivedFile, User
 
 
-def get_rfiles(caseid):
-    crf = CaseReceivedFile.query.with_entities(
+def get_rfiles(caseid, dt_query=None):
+    """
+    Return the evidences of a case, latest first
+    :param caseid: Case ID
+    :param dt_query: Optional DataTablesQuery. If set, only the requested page is returned
+    :return: List of rows, or DataTablesPage if dt_query is set
+    """
+    query = CaseReceivedFile.query.with_entities(
         CaseReceivedFile.id,
         CaseReceivedFile.filename,
         CaseReceivedFile.date_added,
@@ -39,9 +47,23 @@ def get_rfiles(caseid):
         User.name.label('username')
     ).filter(
         CaseReceivedFile.case_id == caseid
-    ).join(CaseReceivedFile.user).order_by(desc(CaseReceivedFile.date_added)).all()
+    ).join(CaseReceivedFile.user)
 
-    return crf
+    if dt_query:
+        return paginate_datatables(query, dt_query,
+                                   columns={
+                                       'filename': CaseReceivedFile.filename,
+                                       'date_added': CaseReceivedFile.date_added,
+                                       'file_hash': CaseReceivedFile.file_hash,
+                                       'file_size': CaseReceivedFile.file_size,
+                                       'file_description': CaseReceivedFile.file_description,
+                                       'username': User.name
+                                   },
+                                   search_columns=[CaseReceivedFile.filename, CaseReceivedFile.file_hash,
+                                                   CaseReceivedFile.file_description, User.name],
+                                   default_order=[desc(CaseReceivedFile.date_added), CaseReceivedFile.id])
+
+    return query.order_by(desc(CaseReceivedFile.date_added)).all()
 
 
 def add_rfile(evidence, caseid, user_id):
@@ -61,6 +83,23 @@ def add_rfile(evidence, caseid, user_id):
     return evidence
 
 
+def get_rfiles_by_filenames(caseid, filenames):
+    """
+    Return the evidences of a case registered under some file names
+    :param caseid: Case ID
+    :param filenames: List of file names
+    :return: dict file name -> list of CaseReceivedFile
+    """
+    evidences = {}
+    for evidence in CaseReceivedFile.query.filter(
+        CaseReceivedFile.case_id == caseid,
+        CaseReceivedFile.filename.in_(list(filenames))
+    ).all():
+        evidences.setdefault(evidence.filename, []).append(evidence)
+
+    return evidences
+
+
 def get_rfile(rfile_id, caseid):
     return CaseReceivedFile.query.filter(
         CaseReceivedFile.id == rfile_id,
@@ -82,6 +121,7 @@ def delete_rfile(rfile_id, caseid):
         CaseReceivedFile.id == rfile_id,
         CaseReceivedFile.case_id == caseid,
     )).delete()
+    delete_search_documents('evidence', [rfile_id], caseid)
 
     update_evidences_state(caseid=caseid)
 
@@ -23,6 +23,7 @@ from datetime import datetime
 from sqlalchemy import desc
 
 from app import db
+from app.datamgmt.datatables import paginate_datatables
 from app.datamgmt.manage.manage_attribute_db import get_default_custom_attributes
 from app.datamgmt.states import update_tasks_state
 from app.models import CaseTasks, User, TaskStatus
@@ -32,8 +33,14 @@ def get_tasks_status():
     return TaskStatus.query.all()
 
 
-def get_tasks(caseid):
-    return CaseTasks.query.with_entities(
+def get_tasks(caseid, dt_query=None):
+    """
+    Return the tasks of a case with their assignee and status
+    :param caseid: Case ID
+    :param dt_query: Optional DataTablesQuery. If set, only the requested page is returned
+    :return: List of rows, or DataTablesPage if dt_query is set
+    """
+    query = CaseTasks.query.with_entities(
         CaseTasks.id.label("task_id"),
         CaseTasks.task_title,
         CaseTasks.task_description,
@@ -48,7 +55,23 @@ def get_tasks(caseid):
         CaseTasks.task_case_id == caseid
     ).join(
         CaseTasks.user_assigned, CaseTasks.status
-    ).order_by(
+    )
+
+    if dt_query:
+        return paginate_datatables(query, dt_query,
+                                   columns={
+                                       'task_title': CaseTasks.task_title,
+                                       'task_description': CaseTasks.task_description,
+                                       'task_status_id': TaskStatus.status_name,
+                                       'assignee_name': User.name,
+                                       'task_open_date': CaseTasks.task_open_date,
+                                       'task_tags': CaseTasks.task_tags
+                                   },
+                                   search_columns=[CaseTasks.task_title, CaseTasks.task_description,
+                                                   TaskStatus.status_name, User.name, CaseTasks.task_tags],
+                                   default_order=[desc(TaskStatus.status_name), CaseTasks.id])
+
+    return query.order_by(
         desc(TaskStatus.status_name)
     ).all()
 
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from sqlalchemy import and_, or_, cast, Text
+
+DATATABLES_DEFAULT_LENGTH = 100
+DATATABLES_MAX_LENGTH = 1000
+
+
+class DataTablesQuery(object):
+    """
+    Paging, sorting and filtering requested by a table in server-side processing mode
+    """
+    def __init__(self, start=0, length=DATATABLES_DEFAULT_LENGTH, order_column=None, order_dir='asc',
+                 search=None, columns_search=None, draw=None):
+        self.start = start
+        self.length = length
+        self.order_column = order_column
+        self.order_dir = order_dir
+        self.search = search
+        self.columns_search = columns_search or {}
+        self.draw = draw
+
+
+class DataTablesPage(object):
+    """
+    Page of rows returned for a DataTablesQuery
+    """
+    def __init__(self, rows, records_total, records_filtered, draw=None):
+        self.rows = rows
+        self.records_total = records_total
+        self.records_filtered = records_filtered
+        self.draw = draw
+
+    def meta(self):
+        """
+        Return the paging information expected by DataTables along with the rows
+        """
+        return {
+            'draw': self.draw,
+            'recordsTotal': self.records_total,
+            'recordsFiltered': self.records_filtered
+        }
+
+
+def _int_arg(args, *names, default=None):
+    for name in names:
+        value = args.get(name)
+        if value is None or value == '':
+            continue
+
+        try:
+            return int(value)
+        except ValueError:
+            return default
+
+    return default
+
+
+def parse_datatables_args(args, max_length=DATATABLES_MAX_LENGTH):
+    """
+    Read the server-side processing parameters of a request.
+    Both the DataTables parameters (start, length, order[0][column], search[value], columns[i][...]) and
+    their plain counterparts (offset, limit, sort, order, search) are accepted.
+    :param args: Arguments of the request
+    :param max_length: Max number of rows of a page
+    :return: DataTablesQuery, or None if the request doesn't ask for a page
+    """
+    if not any(name in args for name in ('draw', 'start', 'length', 'offset', 'limit')):
+        return None
+
+    start = max(_int_arg(args, 'start', 'offset', default=0), 0)
+
+    # DataTables sends -1 when all the rows are requested
+    length = _int_arg(args, 'length', 'limit', default=DATATABLES_DEFAULT_LENGTH)
+    if length < 1 or length > max_length:
+        length = max_length
+
+    columns = []
+    while f'columns[{len(columns)}][data]' in args:
+        columns.append(args.get(f'columns[{len(columns)}][data]'))
+
+    order_column = args.get('sort')
+    order_index = _int_arg(args, 'order[0][column]')
+    if order_index is not None and 0 <= order_index < len(columns):
+        order_column = columns[order_index]
+
+    order_dir = args.get('order[0][dir]') or args.get('order') or 'asc'
+
+    columns_search = {}
+    for index, column in enumerate(columns):
+        value = args.get(f'columns[{index}][search][value]')
+        if value:
+            columns_search[column] = value
+
+    return DataTablesQuery(start=start,
+                           length=length,
+                           order_column=order_column,
+                           order_dir='desc' if order_dir.lower() == 'desc' else 'asc',
+                           search=args.get('search[value]') or args.get('search') or None,
+                           columns_search=columns_search,
+                           draw=_int_arg(args, 'draw'))
+
+
+def _contains(column, value):
+    value = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return cast(column, Text).ilike(f'%{value}%', escape='\\')
+
+
+def paginate_datatables(query, dt_query, columns, search_columns=None, default_order=None):
+    """
+    Apply a DataTablesQuery to a query.
+    The global search matches any of the search columns, and each column search matches its own column.
+    Rows are sorted on the requested column, then on the default order, which should end with a unique
+    column so the pages are stable.
+    :param query: Query returning all the rows of the table
+    :param dt_query: DataTablesQuery
+    :param columns: dict column name -> SQL expression, of the columns that can be sorted and filtered
+    :param search_columns: SQL expressions matched by the global search
+    :param default_order: List of order clauses applied after the requested one
+    :return: DataTablesPage
+    """
+    query = query.order_by(None)
+    records_total = query.count()
+
+    conditions = []
+    if dt_query.search and search_columns:
+        conditions.append(or_(*[_contains(column, dt_query.search) for column in search_columns]))
+
+    for name, value in dt_query.columns_search.items():
+        if name in columns:
+            conditions.append(_contains(columns[name], value))
+
+    records_filtered = records_total
+    if conditions:
+        query = query.filter(and_(*conditions))
+        records_filtered = query.count()
+
+    order = []
+    if dt_query.order_column in columns:
+        column = columns[dt_query.order_column]
+        order.append(column.desc() if dt_query.order_dir == 'desc' else column.asc())
+
+    order.extend(default_order or [])
+
+    rows = query.order_by(*order).offset(dt_query.start).limit(dt_query.length).all()
+
+    return DataTablesPage(rows=rows,
+                          records_total=records_total,
+                          records_filtered=records_filtered,
+                          draw=dt_query.draw)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+from datetime import datetime
+
+from sqlalchemy import case, desc, func
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db
+from app.datamgmt.datatables import paginate_datatables
+from app.models import Cases, CeleryTaskIndex
+
+# Arguments of the tasks kept when the worker reports a task without them
+_TASK_ARGUMENTS_COLUMNS = ('task_name', 'task_module', 'task_hook', 'task_user', 'task_case_id')
+
+
+def get_task_index_values(task_name, kwargs):
+    """
+    Extract the indexed fields from the keyword arguments of a task. Modules tasks and pipelines receive the
+    module, the user and the case as keyword arguments
+    :param task_name: Name of the Celery task
+    :param kwargs: Keyword arguments of the task
+    :return: dict of CeleryTaskIndex columns
+    """
+    kwargs = kwargs if isinstance(kwargs, dict) else {}
+
+    try:
+        caseid = int(kwargs['caseid']) if kwargs.get('caseid') is not None else None
+
+    except (TypeError, ValueError):
+        caseid = None
+
+    module = kwargs.get('module_name') or kwargs.get('module')
+    hook = kwargs.get('hook_name')
+    user = kwargs.get('init_user')
+
+    return {
+        'task_name': task_name,
+        'task_module': str(module) if module else None,
+        'task_hook': str(hook) if hook else None,
+        'task_user': str(user) if user else None,
+        'task_case_id': caseid
+    }
+
+
+def index_celery_task(task_id, status, task_name=None, kwargs=None, success=None, date_done=None):
+    """
+    Insert or update the index row of a task.
+    The row is written on its own connection and committed at once, so it never commits the changes pending in
+    the session of the caller.
+    :param task_id: Celery task ID
+    :param status: Celery state of the task
+    :param task_name: Name of the Celery task
+    :param kwargs: Keyword arguments of the task
+    :param success: Whether the task succeeded. None if unknown or not finished
+    :param date_done: Date the task ended. None if not finished
+    """
+    values = get_task_index_values(task_name, kwargs)
+    values.update({
+        'task_id': task_id,
+        'task_status': status,
+        'task_success': success,
+        'task_date': date_done or datetime.utcnow(),
+        'task_date_done': date_done
+    })
+
+    statement = insert(CeleryTaskIndex).values(**values)
+
+    update = {column: statement.excluded[column]
+              for column in ('task_status', 'task_success', 'task_date', 'task_date_done')}
+    for column in _TASK_ARGUMENTS_COLUMNS:
+        update[column] = func.coalesce(statement.excluded[column], CeleryTaskIndex.__table__.c[column])
+
+    statement = statement.on_conflict_do_update(
+        index_elements=[CeleryTaskIndex.task_id],
+        set_=update
+    )
+
+    with db.engine.begin() as connection:
+        connection.execute(statement)
+
+
+def get_indexed_task(task_id):
+    """
+    Return the index row of a task, or None if the task is unknown
+    """
+    return CeleryTaskIndex.query.filter(
+        CeleryTaskIndex.task_id == task_id
+    ).first()
+
+
+def get_dim_tasks(dt_query=None, limit=200, caseid=None, user=None):
+    """
+    List the tasks of the index, the most recent first. Rows are shaped as the DIM tables expect them.
+    :param dt_query: DataTablesQuery. If None, the first rows up to limit are returned
+    :param limit: Number of rows returned without dt_query
+    :param caseid: Restrict to the tasks of a case
+    :param user: Restrict to the tasks started by a user
+    :return: DataTablesPage if dt_query, else list of rows
+    """
+    state = case(
+        (CeleryTaskIndex.task_success.is_(True), 'success'),
+        # Module tasks end successfully even when the module reports a failure
+        (CeleryTaskIndex.task_status == 'SUCCESS', 'failure'),
+        else_=func.lower(CeleryTaskIndex.task_status)
+    )
+    module = case(
+        (CeleryTaskIndex.task_hook.isnot(None), func.concat(CeleryTaskIndex.task_module, '::',
+                                                            CeleryTaskIndex.task_hook)),
+        else_=func.coalesce(CeleryTaskIndex.task_module, CeleryTaskIndex.task_name)
+    )
+    case_name = case(
+        (Cases.case_id.isnot(None), Cases.name),
+        (CeleryTaskIndex.task_case_id.isnot(None), func.concat('Case #', CeleryTaskIndex.task_case_id)),
+        else_='Unknown'
+    )
+    date_done = func.coalesce(CeleryTaskIndex.task_date_done, CeleryTaskIndex.task_date)
+    task_user = func.coalesce(CeleryTaskIndex.task_user, 'Shadow Iris')
+
+    query = db.session.query(
+        CeleryTaskIndex.task_id,
+        state.label('state'),
+        date_done.label('date_done'),
+        case_name.label('case'),
+        module.label('module'),
+        task_user.label('user')
+    ).outerjoin(
+        Cases, Cases.case_id == CeleryTaskIndex.task_case_id
+    )
+
+    if caseid:
+        query = query.filter(CeleryTaskIndex.task_case_id == caseid)
+
+    if user:
+        query = query.filter(CeleryTaskIndex.task_user == user)
+
+    default_order = [desc(CeleryTaskIndex.task_date), desc(CeleryTaskIndex.id)]
+
+    if dt_query:
+        return paginate_datatables(query, dt_query,
+                                   columns={
+                                       'task_id': CeleryTaskIndex.task_id,
+                                       'state': state,
+                                       'date_done': date_done,
+                                       'case': case_name,
+                                       'module': module,
+                                       'user': task_user
+                                   },
+                                   search_columns=[CeleryTaskIndex.task_id, module, case_name, task_user],
+                                   default_order=default_order)
+
+    return query.order_by(*default_order).limit(limit).all()
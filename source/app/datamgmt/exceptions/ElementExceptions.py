@@ -24,3 +24,7 @@ class ElementNotFoundException(Exception):
 
 class ElementInUseException(Exception):
     pass
+
+
+class ElementConflictException(Exception):
+    pass
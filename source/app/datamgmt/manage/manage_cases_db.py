@@ -25,7 +25,7 @@ from sqlalchemy import and_
 from app import db
 from app.datamgmt.states import delete_case_states
 from app.models import Cases, Client, User, UserActivity, CaseReceivedFile, CaseAssets, IocLink, Notes, NotesGroupLink, \
-    NotesGroup, CaseTasks, CaseEventsAssets, IocAssetLink, CasesEvent, CaseEventCategory
+    NotesGroup, CaseTasks, CaseEventsAssets, IocAssetLink, CasesEvent, CaseEventCategory, IocMention
 
 
 def list_cases_dict():
@@ -114,6 +114,7 @@ def delete_case(case_id):
     UserActivity.query.filter(UserActivity.case_id == case_id).delete()
     CaseReceivedFile.query.filter(CaseReceivedFile.case_id == case_id).delete()
     IocLink.query.filter(IocLink.case_id == case_id).delete()
+    IocMention.query.filter(IocMention.case_id == case_id).delete()
 
     da = CaseAssets.query.with_entities(CaseAssets.asset_id).filter(CaseAssets.case_id == case_id).all()
     for asset in da:
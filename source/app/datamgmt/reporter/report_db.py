@@ -20,7 +20,7 @@
 
 import datetime
 
-from sqlalchemy import desc
+from sqlalchemy import desc, func
 
 from app.models import User, Cases, Client, CaseReceivedFile, CasesEvent, CaseEventsAssets, CaseAssets, \
     AssetsType, IocLink, Ioc, IocAssetLink, AnalysisStatus, CaseTasks, Notes, EventCategory, IocType, TaskStatus
@@ -111,8 +111,22 @@ def export_case_notes_json(case_id):
     return []
 
 
-def export_case_tm_json(case_id):
-    timeline = CasesEvent.query.with_entities(
+def get_case_tm_export_query(case_id):
+    """
+    Build the query exporting the timeline of a case, with the assets of each event aggregated by the database
+    """
+    assets_agg = CaseEventsAssets.query.with_entities(
+        CaseEventsAssets.event_id,
+        func.array_agg(func.concat(CaseAssets.asset_name, ' (', AssetsType.asset_name, ')')).label('assets')
+    ).filter(
+        CaseEventsAssets.case_id == case_id
+    ).join(
+        CaseEventsAssets.asset, CaseAssets.asset_type
+    ).group_by(
+        CaseEventsAssets.event_id
+    ).subquery()
+
+    return CasesEvent.query.with_entities(
         CasesEvent.event_id,
         CasesEvent.event_title,
         CasesEvent.event_date,
@@ -124,7 +138,8 @@ def export_case_tm_json(case_id):
         CasesEvent.event_raw,
         CasesEvent.custom_attributes,
         EventCategory.name.label('category'),
-        User.name.label('last_edited_by')
+        User.name.label('last_edited_by'),
+        assets_agg.c.assets
     ).filter(
         CasesEvent.case_id == case_id
     ).order_by(
@@ -133,30 +148,37 @@ def export_case_tm_json(case_id):
         CasesEvent.user
     ).outerjoin(
         CasesEvent.category
-    ).all()
+    ).outerjoin(
+        assets_agg, assets_agg.c.event_id == CasesEvent.event_id
+    )
+
+
+def export_case_tm_json(case_id):
+    timeline = get_case_tm_export_query(case_id).all()
 
     tim = []
     for row in timeline:
         ras = row._asdict()
-        ras['assets'] = None
+        ras['assets'] = row.assets or []
 
-        as_list = CaseEventsAssets.query.with_entities(
-            CaseAssets.asset_id,
-            CaseAssets.asset_name,
-            AssetsType.asset_name.label('type')
-        ).filter(
-            CaseEventsAssets.event_id == row.event_id
-        ).join(CaseEventsAssets.asset, CaseAssets.asset_type).all()
+        tim.append(ras)
 
-        alki = []
-        for asset in as_list:
-            alki.append("{} ({})".format(asset.asset_name, asset.type))
+    return tim
 
-        ras['assets'] = alki
 
-        tim.append(ras)
+def iter_case_tm_export(case_id, chunk_size=1000):
+    """
+    Iterate over the timeline of a case with a server side cursor, so the memory usage
+    does not depend on the number of events
+    :param case_id: Case ID
+    :param chunk_size: Number of rows fetched from the database at once
+    :return: Generator of dict
+    """
+    for row in get_case_tm_export_query(case_id).yield_per(chunk_size):
+        ras = row._asdict()
+        ras['assets'] = row.assets or []
 
-    return tim
+        yield ras
 
 
 def export_case_iocs_json(case_id):
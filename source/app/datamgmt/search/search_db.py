@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from sqlalchemy import and_, func, distinct
+
+from app import db
+from app.datamgmt.search.search_index_db import SEARCH_DOCUMENT_SOURCES, SEARCH_KEYS_CONFIG, SEARCH_TEXT_CONFIG
+from app.models import Ioc, IocLink, IocType, Tlp, Cases, Client, Notes, SearchDocument
+from app.models.models import NOTES_SEARCH_CONFIG, NOTES_SEARCH_MAX_LENGTH
+
+IOC_SEARCH_MODES = ('exact', 'prefix', 'wildcard')
+
+# The trigram index can't narrow down patterns with less characters than a trigram
+IOC_SEARCH_MIN_PATTERN_LENGTH = 3
+
+# Matches are wrapped in <mark> tags in the snippets of the notes
+NOTES_HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2'
+
+SEARCH_OBJECT_TYPES = tuple(SEARCH_DOCUMENT_SOURCES)
+
+
+def get_ioc_search_mode(search_value):
+    """
+    Guess the search mode of a LIKE pattern
+    :param search_value: Searched value, with optional % and _ wildcards
+    :return: exact, prefix or wildcard
+    """
+    if '%' not in search_value and '_' not in search_value:
+        return 'exact'
+
+    head = search_value[:-1]
+    if search_value.endswith('%') and '%' not in head and '_' not in head:
+        return 'prefix'
+
+    return 'wildcard'
+
+
+def get_ioc_search_pattern_length(search_value):
+    """
+    Return the number of characters of a LIKE pattern which are not wildcards
+    """
+    return len(search_value.replace('%', '').replace('_', ''))
+
+
+def search_iocs(search_value, search_mode=None, page=1, per_page=50):
+    """
+    Search the IOCs linked to cases by value.
+    - exact: equality, served by the unique index on (md5(ioc_value), ioc_type_id)
+    - prefix: value starting with the pattern, without its trailing %
+    - wildcard: LIKE pattern with % and _ wildcards
+    Prefix and wildcard searches are served by the trigram index on ioc_value.
+    :param search_value: Searched value
+    :param search_mode: exact, prefix or wildcard. Guessed from the value if not set
+    :param page: Page number, starting at 1
+    :param per_page: Number of results per page
+    :return: dict with the results of the page, the total number of results and of distinct IOCs matched
+    """
+    if not search_mode:
+        search_mode = get_ioc_search_mode(search_value)
+
+    if search_mode == 'exact':
+        condition = and_(
+            func.md5(Ioc.ioc_value) == func.md5(search_value),
+            Ioc.ioc_value == search_value
+        )
+
+    elif search_mode == 'prefix':
+        prefix = search_value[:-1] if search_value.endswith('%') else search_value
+        prefix = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        condition = Ioc.ioc_value.like(f'{prefix}%', escape='\\')
+
+    else:
+        condition = Ioc.ioc_value.like(search_value)
+
+    query = db.session.query(
+        Ioc.ioc_id,
+        Ioc.ioc_value.label('ioc_name'),
+        Ioc.ioc_description.label('ioc_description'),
+        Ioc.ioc_misp,
+        IocType.type_name,
+        Tlp.tlp_name,
+        Tlp.tlp_bscolor,
+        Cases.case_id,
+        Cases.name.label('case_name'),
+        Client.name.label('customer_name')
+    ).select_from(
+        Ioc
+    ).join(
+        IocLink, IocLink.ioc_id == Ioc.ioc_id
+    ).join(
+        Cases, Cases.case_id == IocLink.case_id
+    ).join(
+        Client, Client.client_id == Cases.client_id
+    ).outerjoin(
+        Tlp, Tlp.tlp_id == Ioc.ioc_tlp_id
+    ).outerjoin(
+        IocType, IocType.type_id == Ioc.ioc_type_id
+    ).filter(
+        condition
+    )
+
+    counts = db.session.query(
+        func.count(IocLink.ioc_link_id),
+        func.count(distinct(IocLink.ioc_id))
+    ).select_from(
+        Ioc
+    ).join(
+        IocLink, IocLink.ioc_id == Ioc.ioc_id
+    ).filter(
+        condition
+    ).one()
+
+    results = query.order_by(
+        Ioc.ioc_value,
+        Ioc.ioc_id,
+        Cases.case_id
+    ).offset((page - 1) * per_page).limit(per_page).all()
+
+    return {
+        'search_mode': search_mode,
+        'page': page,
+        'per_page': per_page,
+        'total': counts[0],
+        'total_iocs': counts[1],
+        'results': [row._asdict() for row in results]
+    }
+
+
+def search_notes(search_value, caseid=None, page=1, per_page=50):
+    """
+    Full-text search of the notes, served by the text search index on the stored search vectors of the notes.
+    The search value follows the web search syntax: quoted phrases, OR, and - to exclude a word.
+    Notes are ordered by relevance, titles weighting more than contents. Snippets of the matching parts are
+    only computed for the notes of the page, on the indexed beginning of their contents.
+    :param search_value: Searched text
+    :param caseid: Restrict the search to a case. All the cases if None
+    :param page: Page number, starting at 1
+    :param per_page: Number of results per page
+    :return: dict with the results of the page and the total number of results
+    """
+    ts_query = func.websearch_to_tsquery(NOTES_SEARCH_CONFIG, search_value)
+    rank = func.ts_rank(Notes.note_search_vector, ts_query)
+
+    query = db.session.query(
+        Notes.note_id
+    ).filter(
+        Notes.note_search_vector.op('@@')(ts_query)
+    )
+
+    if caseid:
+        query = query.filter(Notes.note_case_id == caseid)
+
+    total = query.count()
+
+    page_notes = query.add_columns(
+        rank.label('rank')
+    ).order_by(
+        rank.desc(),
+        Notes.note_id
+    ).offset((page - 1) * per_page).limit(per_page).subquery()
+
+    results = db.session.query(
+        Notes.note_id,
+        Notes.note_title,
+        func.ts_headline(NOTES_SEARCH_CONFIG,
+                         func.left(func.coalesce(Notes.note_content, ''), NOTES_SEARCH_MAX_LENGTH),
+                         ts_query, NOTES_HEADLINE_OPTIONS).label('note_headline'),
+        page_notes.c.rank,
+        Cases.case_id,
+        Cases.name.label('case_name'),
+        Client.name.label('client_name')
+    ).select_from(
+        page_notes
+    ).join(
+        Notes, Notes.note_id == page_notes.c.note_id
+    ).join(
+        Cases, Cases.case_id == Notes.note_case_id
+    ).join(
+        Client, Client.client_id == Cases.client_id
+    ).order_by(
+        page_notes.c.rank.desc(),
+        Notes.note_id
+    ).all()
+
+    return {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'results': [row._asdict() for row in results]
+    }
+
+
+def search_objects(search_value, object_types=None, caseid=None, page=1, per_page=50, per_type_limit=None):
+    """
+    Full-text search over the IOCs, assets, events, tasks, evidences and notes, served by the text search index of
+    the search documents. The search value follows the web search syntax, and matches either the identifiers as
+    they are or the stemmed words of the texts.
+    Results of all the types are ordered together by relevance. Snippets are only computed for the page.
+    The number of matches per type is counted on all the types, whatever the types searched.
+    :param search_value: Searched text
+    :param object_types: Types of objects to search. All the types if None
+    :param caseid: Restrict the search to a case. All the cases if None
+    :param page: Page number, starting at 1
+    :param per_page: Number of results per page
+    :param per_type_limit: Maximum number of results of each type. No limit if None
+    :return: dict with the results of the page, the total number of results and the number of matches per type
+    """
+    ts_query = func.websearch_to_tsquery(SEARCH_TEXT_CONFIG, search_value).op('||')(
+        func.websearch_to_tsquery(SEARCH_KEYS_CONFIG, search_value)
+    )
+    rank = func.ts_rank(SearchDocument.document_vector, ts_query)
+
+    conditions = [SearchDocument.document_vector.op('@@')(ts_query)]
+    if caseid:
+        conditions.append(SearchDocument.case_id == caseid)
+
+    facets = dict(db.session.query(
+        SearchDocument.object_type,
+        func.count(SearchDocument.document_id)
+    ).filter(
+        *conditions
+    ).group_by(
+        SearchDocument.object_type
+    ).all())
+
+    if object_types:
+        conditions.append(SearchDocument.object_type.in_(object_types))
+
+    counts = [count for object_type, count in facets.items() if not object_types or object_type in object_types]
+
+    matches = db.session.query(
+        SearchDocument.document_id,
+        rank.label('rank')
+    ).filter(
+        *conditions
+    )
+    order_by = (rank.desc(), SearchDocument.document_id)
+
+    if per_type_limit:
+        ranked = matches.add_columns(
+            func.row_number().over(
+                partition_by=SearchDocument.object_type,
+                order_by=(rank.desc(), SearchDocument.document_id)
+            ).label('type_rank')
+        ).subquery()
+
+        matches = db.session.query(
+            ranked.c.document_id,
+            ranked.c.rank
+        ).filter(
+            ranked.c.type_rank <= per_type_limit
+        )
+        order_by = (ranked.c.rank.desc(), ranked.c.document_id)
+
+        total = sum(min(count, per_type_limit) for count in counts)
+
+    else:
+        total = sum(counts)
+
+    page_documents = matches.order_by(
+        *order_by
+    ).offset((page - 1) * per_page).limit(per_page).subquery()
+
+    results = db.session.query(
+        SearchDocument.object_type,
+        SearchDocument.object_id,
+        SearchDocument.document_title,
+        func.ts_headline(SEARCH_TEXT_CONFIG, func.coalesce(SearchDocument.document_content, ''), ts_query,
+                         NOTES_HEADLINE_OPTIONS).label('document_headline'),
+        page_documents.c.rank,
+        Cases.case_id,
+        Cases.name.label('case_name'),
+        Client.name.label('client_name')
+    ).select_from(
+        page_documents
+    ).join(
+        SearchDocument, SearchDocument.document_id == page_documents.c.document_id
+    ).join(
+        Cases, Cases.case_id == SearchDocument.case_id
+    ).join(
+        Client, Client.client_id == Cases.client_id
+    ).order_by(
+        page_documents.c.rank.desc(),
+        SearchDocument.document_id
+    ).all()
+
+    return {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'facets': {object_type: facets.get(object_type, 0) for object_type in SEARCH_OBJECT_TYPES},
+        'results': [row._asdict() for row in results]
+    }
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import itertools
+
+from sqlalchemy import event, func, insert, literal
+
+from app import db
+from app.models import Ioc, IocLink, CaseAssets, CasesEvent, CaseTasks, CaseReceivedFile, Notes, SearchDocument
+
+# Text search configurations. Identifiers (IOC values, IPs, hashes, file names...) are indexed as-is, while titles
+# and descriptions are stemmed. Queries are parsed with both configurations
+SEARCH_KEYS_CONFIG = 'simple'
+SEARCH_TEXT_CONFIG = 'english'
+
+# Characters of the objects contents kept in the documents. Postgres refuses tsvectors above 1MB
+SEARCH_DOCUMENT_MAX_LENGTH = 256 * 1024
+
+# Objects indexed in the search documents and the attribute holding their ID
+SEARCH_TRACKED_MODELS = {
+    Ioc: ('ioc', 'ioc_id'),
+    IocLink: ('ioc', 'ioc_id'),
+    CaseAssets: ('asset', 'asset_id'),
+    CasesEvent: ('event', 'event_id'),
+    CaseTasks: ('task', 'id'),
+    CaseReceivedFile: ('evidence', 'id'),
+    Notes: ('note', 'note_id')
+}
+
+_PENDING_KEY = 'search_index_pending'
+
+
+def _document_columns(object_type, object_id, case_id, title, keys, content):
+    """
+    Build the columns of the documents of a type of object
+    :param keys: Identifier columns, indexed without stemming
+    :param content: Free text columns
+    """
+    content = func.left(func.concat_ws('\n', *content), SEARCH_DOCUMENT_MAX_LENGTH)
+
+    vector = func.setweight(
+        func.to_tsvector(SEARCH_TEXT_CONFIG, func.coalesce(title, '')), 'A'
+    ).op('||')(
+        func.setweight(func.to_tsvector(SEARCH_TEXT_CONFIG, content), 'B')
+    )
+
+    if keys:
+        vector = func.setweight(
+            func.to_tsvector(SEARCH_KEYS_CONFIG, func.concat_ws(' ', *keys)), 'A'
+        ).op('||')(vector)
+
+    return [literal(object_type), object_id, case_id, title, content, vector]
+
+
+def _ioc_documents():
+    return db.session.query(
+        *_document_columns('ioc', Ioc.ioc_id, IocLink.case_id, Ioc.ioc_value,
+                           keys=[Ioc.ioc_value, Ioc.ioc_tags],
+                           content=[Ioc.ioc_description])
+    ).join(
+        IocLink, IocLink.ioc_id == Ioc.ioc_id
+    ), Ioc.ioc_id, IocLink.case_id
+
+
+def _asset_documents():
+    return db.session.query(
+        *_document_columns('asset', CaseAssets.asset_id, CaseAssets.case_id, CaseAssets.asset_name,
+                           keys=[CaseAssets.asset_name, CaseAssets.asset_ip, CaseAssets.asset_domain,
+                                 CaseAssets.asset_tags],
+                           content=[CaseAssets.asset_description, CaseAssets.asset_info])
+    ), CaseAssets.asset_id, CaseAssets.case_id
+
+
+def _event_documents():
+    return db.session.query(
+        *_document_columns('event', CasesEvent.event_id, CasesEvent.case_id, CasesEvent.event_title,
+                           keys=[CasesEvent.event_source, CasesEvent.event_tags],
+                           content=[CasesEvent.event_content, CasesEvent.event_raw])
+    ), CasesEvent.event_id, CasesEvent.case_id
+
+
+def _task_documents():
+    return db.session.query(
+        *_document_columns('task', CaseTasks.id, CaseTasks.task_case_id, CaseTasks.task_title,
+                           keys=[CaseTasks.task_tags],
+                           content=[CaseTasks.task_description])
+    ), CaseTasks.id, CaseTasks.task_case_id
+
+
+def _evidence_documents():
+    return db.session.query(
+        *_document_columns('evidence', CaseReceivedFile.id, CaseReceivedFile.case_id, CaseReceivedFile.filename,
+                           keys=[CaseReceivedFile.filename, CaseReceivedFile.file_hash],
+                           content=[CaseReceivedFile.file_description])
+    ), CaseReceivedFile.id, CaseReceivedFile.case_id
+
+
+def _note_documents():
+    return db.session.query(
+        *_document_columns('note', Notes.note_id, Notes.note_case_id, Notes.note_title,
+                           keys=[],
+                           content=[Notes.note_content])
+    ), Notes.note_id, Notes.note_case_id
+
+
+# Queries building the documents, per type of object
+SEARCH_DOCUMENT_SOURCES = {
+    'ioc': _ioc_documents,
+    'asset': _asset_documents,
+    'event': _event_documents,
+    'task': _task_documents,
+    'evidence': _evidence_documents,
+    'note': _note_documents
+}
+
+
+def refresh_search_documents(object_type, object_ids=None, caseid=None):
+    """
+    Rebuild the search documents of objects from their current content. The documents are built by the database,
+    and the documents of the objects which no longer exist are removed. Expects a db commit soon after
+    :param object_type: Type of object, key of SEARCH_DOCUMENT_SOURCES
+    :param object_ids: Objects to refresh. All the objects of the type if None
+    :param caseid: Restrict to a case. All the cases if None
+    """
+    if object_ids is not None:
+        object_ids = list(object_ids)
+        if not object_ids:
+            return
+
+    source, id_column, case_column = SEARCH_DOCUMENT_SOURCES[object_type]()
+    documents = SearchDocument.query.filter(SearchDocument.object_type == object_type)
+
+    if object_ids is not None:
+        source = source.filter(id_column.in_(object_ids))
+        documents = documents.filter(SearchDocument.object_id.in_(object_ids))
+
+    if caseid:
+        source = source.filter(case_column == caseid)
+        documents = documents.filter(SearchDocument.case_id == caseid)
+
+    documents.delete(synchronize_session=False)
+
+    db.session.execute(
+        insert(SearchDocument).from_select(
+            ['object_type', 'object_id', 'case_id', 'document_title', 'document_content', 'document_vector'],
+            source.filter(case_column.isnot(None)).statement
+        )
+    )
+
+
+def delete_search_documents(object_type, object_ids, caseid=None):
+    """
+    Delete the search documents of objects. Only needed when the objects are deleted with bulk queries, the ORM
+    deletions being tracked. Expects a db commit soon after
+    """
+    query = SearchDocument.query.filter(
+        SearchDocument.object_type == object_type,
+        SearchDocument.object_id.in_(list(object_ids))
+    )
+
+    if caseid:
+        query = query.filter(SearchDocument.case_id == caseid)
+
+    query.delete(synchronize_session=False)
+
+
+def rebuild_search_index():
+    """
+    Rebuild all the search documents. Used to index the existing objects, the index is kept up to date afterwards
+    """
+    for object_type in SEARCH_DOCUMENT_SOURCES:
+        refresh_search_documents(object_type)
+
+    db.session.commit()
+
+
+def _track_search_changes(session, flush_context):
+    """
+    Collect the indexed objects written by a flush
+    """
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for instance in itertools.chain(session.new, session.dirty, session.deleted):
+        tracked = SEARCH_TRACKED_MODELS.get(type(instance))
+        if tracked is None:
+            continue
+
+        # Read from the state to avoid reloading expired or deleted objects
+        object_id = instance.__dict__.get(tracked[1])
+        if object_id is not None:
+            pending.setdefault(tracked[0], set()).add(object_id)
+
+
+def _refresh_pending_documents(session):
+    """
+    Refresh the documents of the objects written in the transaction, right before it is committed
+    """
+    session.flush()
+
+    pending = session.info.pop(_PENDING_KEY, None)
+    while pending:
+        for object_type, object_ids in pending.items():
+            refresh_search_documents(object_type, object_ids)
+
+        # The refresh flushed the session, so more objects may have been written
+        session.flush()
+        pending = session.info.pop(_PENDING_KEY, None)
+
+
+def _discard_pending_documents(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+event.listen(db.session, 'after_flush', _track_search_changes)
+event.listen(db.session, 'before_commit', _refresh_pending_documents)
+event.listen(db.session, 'after_rollback', _discard_pending_documents)
@@ -24,7 +24,7 @@ from flask_login import current_user
 from sqlalchemy import and_
 
 from app import db
-from app.models import ObjectState
+from app.models import ObjectState, CaseEventsChanges
 
 
 def update_object_state(object_name, caseid, userid=None):
@@ -72,20 +72,97 @@ def get_object_state(object_name, caseid):
         return None
 
 
+def get_object_states(object_names, caseid):
+    """
+    Return the states of several objects of a case with a single query
+    :param object_names: List of object names
+    :param caseid: Case ID
+    :return: Dict object name -> state. Objects without a state are missing
+    """
+    states = ObjectState.query.with_entities(
+        ObjectState.object_name,
+        ObjectState.object_state
+    ).filter(and_(
+        ObjectState.object_name.in_(object_names),
+        ObjectState.object_case_id == caseid
+    )).all()
+
+    return {os.object_name: os.object_state for os in states}
+
+
 def delete_case_states(caseid):
     ObjectState.query.filter(
         ObjectState.object_case_id == caseid
     ).delete()
 
+    CaseEventsChanges.query.filter(
+        CaseEventsChanges.case_id == caseid
+    ).delete()
+
+
+def update_timeline_state(caseid, userid=None, event_ids=None, op='upsert'):
+    """
+    Expects a db commit soon after.
+    When event_ids are provided, the change is recorded in the timeline change log
+    with the new state, so clients can later fetch only the modified events.
+    :param op: Either upsert or delete
+    """
+    os = update_object_state('timeline', caseid=caseid, userid=userid)
+
+    if event_ids:
+        for event_id in event_ids:
+            change = CaseEventsChanges()
+            change.case_id = caseid
+            change.event_id = event_id
+            change.object_state = os.object_state
+            change.change_op = op
+            change.change_date = os.object_last_update
+
+            db.session.add(change)
 
-def update_timeline_state(caseid, userid=None):
-    return update_object_state('timeline', caseid=caseid, userid=userid)
+    return os
 
 
 def get_timeline_state(caseid):
     return get_object_state('timeline', caseid=caseid)
 
 
+def get_timeline_changes(caseid, since_state, current_state):
+    """
+    Return the events modified between a state known by a client and the current state.
+    :param caseid: Case ID
+    :param since_state: Timeline state last seen by the client
+    :param current_state: Current timeline state of the case
+    :return: Tuple (upserted event IDs, deleted event IDs), or None if the change log does not cover the
+             whole range and the client needs to reload the full timeline
+    """
+    changes = CaseEventsChanges.query.with_entities(
+        CaseEventsChanges.event_id,
+        CaseEventsChanges.object_state,
+        CaseEventsChanges.change_op
+    ).filter(and_(
+        CaseEventsChanges.case_id == caseid,
+        CaseEventsChanges.object_state > since_state,
+        CaseEventsChanges.object_state <= current_state
+    )).order_by(
+        CaseEventsChanges.object_state,
+        CaseEventsChanges.id
+    ).all()
+
+    # Each state bump must have been recorded, otherwise some changes are unknown
+    if len(set(change.object_state for change in changes)) != current_state - since_state:
+        return None
+
+    last_ops = {}
+    for change in changes:
+        last_ops[change.event_id] = change.change_op
+
+    upserted = [event_id for event_id, op in last_ops.items() if op == 'upsert']
+    deleted = [event_id for event_id, op in last_ops.items() if op == 'delete']
+
+    return upserted, deleted
+
+
 def update_tasks_state(caseid, userid=None):
     return update_object_state('tasks', caseid=caseid, userid=userid)
 
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# IMPORTS ------------------------------------------------
+import itertools
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from functools import lru_cache
+
+from app.datamgmt.case.case_events_db import get_case_events_graph
+from app.datamgmt.states import get_object_states
+from app.iris_engine.graph.graph_layout import compute_graph_layout
+
+# VARS ---------------------------------------------------
+GRAPH_IMG_PATH = '/static/assets/img/graph/'
+
+# Max number of event titles kept on a merged edge
+GRAPH_EDGE_MAX_TITLES = 10
+
+# Number of case graphs kept in memory by each worker
+GRAPH_CACHE_SIZE = 16
+
+# Ordered (pattern, image, is master type). The first pattern found in the lowered asset type wins.
+# Master types are the machines events are pivoting on: the other assets of an event are linked to them.
+ASSET_TYPE_ICONS = (
+    ('windows - server', 'windows_server.png', True),
+    ('windows - computer', 'windows_desktop.png', True),
+    ('windows - dc', 'windows_server.png', True),
+    ('computer', 'desktop.png', True),
+    ('server', 'server.png', True),
+    ('domain controller', 'windows_server.png', True),
+    ('account', 'user.png', False),
+    ('vpn', 'vpn.png', True),
+    ('firewall', 'firewall.png', True),
+    ('router', 'router.png', True),
+    ('waf', 'firewall.png', True),
+    ('switch', 'switch.png', True),
+    ('phone', 'phone.png', True)
+)
+
+
+# CONTENT ------------------------------------------------
+@lru_cache(maxsize=256)
+def get_asset_type_icon(asset_type):
+    """
+    Return the graph image of an asset type, and whether the type is a master type.
+    The result is cached, as a case only holds a handful of asset types.
+    :param asset_type: Lowered name of the asset type
+    :return: Tuple (image, is master type)
+    """
+    for pattern, img, is_master in ASSET_TYPE_ICONS:
+        if pattern in asset_type:
+            return img, is_master
+
+    return 'question-mark.png', False
+
+
+def build_case_graph(events):
+    """
+    Build the vis.js graph of a case from the rows returned by get_case_events_graph.
+    Nodes are the assets. Two assets are linked when an event references both of them. If the event
+    references master assets, only the links from these are kept.
+    All the links between two assets are merged into a single edge, whose value is the number of events
+    linking them.
+    :param events: Rows of get_case_events_graph
+    :return: dict with nodes, edges and dates
+    """
+    nodes = {}
+    events_map = {}
+    dates = {
+        "human": [],
+        "machine": []
+    }
+    seen_dates = set()
+
+    for event in events:
+        atype = event.asset_type.lower()
+        img, is_master_atype = get_asset_type_icon(atype)
+
+        try:
+            date = "{}-{}-{}".format(event.event_date.day, event.event_date.month, event.event_date.year)
+        except Exception:
+            date = '15-05-2021'
+
+        if date not in seen_dates:
+            seen_dates.add(date)
+            dates['human'].append(date)
+            dates['machine'].append(datetime.timestamp(event.event_date))
+
+        if event.asset_id not in nodes:
+            if event.asset_ip:
+                title = "{} -{}".format(event.asset_ip, event.asset_description)
+            else:
+                title = "{}".format(event.asset_description)
+
+            nodes[event.asset_id] = {
+                'id': event.asset_id,
+                'label': event.asset_name,
+                'image': GRAPH_IMG_PATH + ("ioc_" if event.asset_compromised else "") + img,
+                'shape': 'image',
+                'title': title,
+                'value': 1
+            }
+
+        cur_event = events_map.get(event.event_id)
+        if cur_event is None:
+            cur_event = {
+                'title': "{} -{}".format(event.event_date, event.event_title),
+                'color': event.event_color,
+                'master_nodes': [],
+                'nodes': []
+            }
+            events_map[event.event_id] = cur_event
+
+        cur_event['nodes'].append(event.asset_id)
+        if is_master_atype:
+            cur_event['master_nodes'].append(event.asset_id)
+
+    edges = {}
+    for cur_event in events_map.values():
+        if cur_event['master_nodes']:
+            pairs = ((master, node) for master in cur_event['master_nodes'] for node in cur_event['nodes'])
+        else:
+            pairs = itertools.combinations(cur_event['nodes'], 2)
+
+        # An event counts once per pair of assets, whatever the direction
+        event_pairs = set()
+        for from_node, to_node in pairs:
+            if from_node != to_node:
+                event_pairs.add((from_node, to_node) if from_node < to_node else (to_node, from_node))
+
+        for pair in event_pairs:
+            edge = edges.get(pair)
+            if edge is None:
+                edges[pair] = {
+                    'from': pair[0],
+                    'to': pair[1],
+                    'color': cur_event['color'],
+                    'value': 1,
+                    'titles': [cur_event['title']]
+                }
+            else:
+                edge['value'] += 1
+                if len(edge['titles']) < GRAPH_EDGE_MAX_TITLES:
+                    edge['titles'].append(cur_event['title'])
+
+    edges = list(edges.values())
+    for edge in edges:
+        title = '<br/>'.join(edge['titles'])
+        if edge['value'] > len(edge['titles']):
+            title += '<br/>... and {} more events'.format(edge['value'] - len(edge['titles']))
+        edge['title'] = title
+
+    return {
+        'nodes': list(nodes.values()),
+        'edges': edges,
+        'dates': dates
+    }
+
+
+def apply_level_of_detail(graph, max_edges_per_node=None):
+    """
+    Return the graph with only the heaviest edges of each node.
+    The graph is returned as is if no limit is set.
+    :param graph: Graph built by build_case_graph
+    :param max_edges_per_node: Max number of edges kept per node
+    :return: dict with nodes, edges, dates and the number of dropped_edges
+    """
+    edges, dropped_edges = graph['edges'], 0
+    if max_edges_per_node:
+        edges, dropped_edges = cap_edges_per_node(edges, max_edges_per_node)
+
+    return {
+        'nodes': graph['nodes'],
+        'edges': edges,
+        'dates': graph['dates'],
+        'dropped_edges': dropped_edges
+    }
+
+
+def cap_edges_per_node(edges, max_edges_per_node):
+    """
+    Keep the heaviest edges, until each node reaches max_edges_per_node edges
+    :param edges: List of merged edges
+    :param max_edges_per_node: Max number of edges kept per node
+    :return: Tuple (kept edges, number of dropped edges)
+    """
+    degrees = {}
+    kept = []
+    for edge in sorted(edges, key=lambda e: e['value'], reverse=True):
+        if degrees.get(edge['from'], 0) < max_edges_per_node and degrees.get(edge['to'], 0) < max_edges_per_node:
+            degrees[edge['from']] = degrees.get(edge['from'], 0) + 1
+            degrees[edge['to']] = degrees.get(edge['to'], 0) + 1
+            kept.append(edge)
+
+    return kept, len(edges) - len(kept)
+
+
+class CaseGraphIndex(object):
+    """
+    Graph of a case along with its adjacency, heaviest edges first
+    """
+    def __init__(self, graph, version):
+        self.graph = graph
+        self.version = version
+        self.nodes = {node['id']: node for node in graph['nodes']}
+        self.adjacency = {node_id: [] for node_id in self.nodes}
+
+        for edge in graph['edges']:
+            self.adjacency[edge['from']].append((edge['to'], edge))
+            self.adjacency[edge['to']].append((edge['from'], edge))
+
+        for neighbors in self.adjacency.values():
+            neighbors.sort(key=lambda neighbor: neighbor[1]['value'], reverse=True)
+
+        self._layout = None
+
+    def get_layout(self):
+        """
+        Return the positions of the nodes, computed on first use and kept with this version of the graph
+        :return: dict node ID -> (x, y), or None if the layout can't be computed server side
+        """
+        if self._layout is None:
+            self._layout = compute_graph_layout(self.graph)
+
+        return self._layout
+
+    def get_neighborhood(self, node_id, hops, max_nodes, max_edges):
+        """
+        Return the subgraph of the nodes located at most `hops` edges away from node_id.
+        Nodes are expanded level by level, following the heaviest edges first, until max_nodes is reached.
+        The heaviest edges between the selected nodes are then kept, up to max_edges.
+        :param node_id: ID of the central asset
+        :param hops: Max distance to the central asset
+        :param max_nodes: Max number of nodes returned
+        :param max_edges: Max number of edges returned
+        :return: dict with nodes, edges, and truncated set if a limit was reached. None if the node is unknown
+        """
+        if node_id not in self.nodes:
+            return None
+
+        distances = {node_id: 0}
+        queue = deque([node_id])
+        truncated = False
+
+        while queue and not truncated:
+            current = queue.popleft()
+            if distances[current] >= hops:
+                continue
+
+            for neighbor, _ in self.adjacency[current]:
+                if neighbor in distances:
+                    continue
+
+                if len(distances) >= max_nodes:
+                    truncated = True
+                    break
+
+                distances[neighbor] = distances[current] + 1
+                queue.append(neighbor)
+
+        edges = []
+        seen_edges = set()
+        for current in distances:
+            for neighbor, edge in self.adjacency[current]:
+                if neighbor in distances and id(edge) not in seen_edges:
+                    seen_edges.add(id(edge))
+                    edges.append(edge)
+
+        if len(edges) > max_edges:
+            edges = sorted(edges, key=lambda e: e['value'], reverse=True)[:max_edges]
+            truncated = True
+
+        nodes = []
+        for current, distance in distances.items():
+            node = dict(self.nodes[current])
+            node['hops'] = distance
+            # Nodes with edges outside of the subgraph can be expanded further by the client
+            node['expandable'] = any(neighbor not in distances for neighbor, _ in self.adjacency[current])
+            nodes.append(node)
+
+        return {
+            'center': node_id,
+            'nodes': nodes,
+            'edges': edges,
+            'truncated': truncated
+        }
+
+
+_graph_cache = OrderedDict()
+_graph_cache_lock = threading.Lock()
+
+
+def get_case_graph_index(caseid):
+    """
+    Return the graph index of a case, built from get_case_events_graph.
+    Indexes are cached per case and rebuilt once the timeline or the assets of the case changed.
+    :param caseid: Case ID
+    :return: CaseGraphIndex
+    """
+    states = get_object_states(['timeline', 'assets'], caseid=caseid)
+    version = (states.get('timeline'), states.get('assets'))
+
+    with _graph_cache_lock:
+        index = _graph_cache.get(caseid)
+        if index is not None and index.version == version:
+            _graph_cache.move_to_end(caseid)
+            return index
+
+    index = CaseGraphIndex(build_case_graph(get_case_events_graph(caseid)), version)
+
+    with _graph_cache_lock:
+        _graph_cache[caseid] = index
+        _graph_cache.move_to_end(caseid)
+        while len(_graph_cache) > GRAPH_CACHE_SIZE:
+            _graph_cache.popitem(last=False)
+
+    return index
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# IMPORTS ------------------------------------------------
+import math
+
+# NumPy is optional. Without it, the layout is left to the client
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# VARS ---------------------------------------------------
+LAYOUT_ITERATIONS = 60
+
+# Number of nodes handled at once when computing the repulsion, to bound the memory used
+LAYOUT_CHUNK_SIZE = 1024
+
+# Spacing of the nodes, in vis.js pixels
+LAYOUT_NODE_SPACING = 120
+
+
+# CONTENT ------------------------------------------------
+def compute_graph_layout(graph, iterations=LAYOUT_ITERATIONS, seed=2):
+    """
+    Compute a force-directed (Fruchterman-Reingold) layout of a graph built by build_case_graph.
+    All the nodes repel each other and the edges pull their nodes together, proportionally to the log
+    of their number of events. A light gravity keeps the disconnected parts close to the center.
+    The repulsion is computed with matrix products, by chunks of nodes so the memory stays linear in the
+    number of nodes.
+    :param graph: Graph built by build_case_graph
+    :param iterations: Number of iterations
+    :param seed: Seed of the initial positions, so a graph always gets the same layout
+    :return: dict node ID -> (x, y), or None if NumPy is not installed
+    """
+    if np is None:
+        return None
+
+    node_ids = [node['id'] for node in graph['nodes']]
+    nb_nodes = len(node_ids)
+    if nb_nodes == 0:
+        return {}
+
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    sources = np.array([index[edge['from']] for edge in graph['edges']], dtype=np.int64)
+    targets = np.array([index[edge['to']] for edge in graph['edges']], dtype=np.int64)
+    weights = np.log1p(np.array([edge['value'] for edge in graph['edges']], dtype=np.float64))
+
+    rng = np.random.default_rng(seed)
+    pos = rng.random((nb_nodes, 2)) - 0.5
+
+    # Optimal distance between nodes, for a layout fitting in a unit square
+    k = 1.0 / math.sqrt(nb_nodes)
+    gravity = 0.1 * k
+    temperature = 0.1
+
+    for iteration in range(iterations):
+        disp = np.zeros_like(pos)
+
+        # The pairwise part only needs single precision
+        pos32 = pos.astype(np.float32)
+        sq_norms = (pos32 ** 2).sum(axis=1)
+
+        # Repulsion k²/d between every pair of nodes. The sum of the (p_i - p_j) * k²/d² over j is
+        # expanded as p_i * sum(f_ij) - f @ p to rely on matrix products
+        for start in range(0, nb_nodes, LAYOUT_CHUNK_SIZE):
+            chunk = pos32[start:start + LAYOUT_CHUNK_SIZE]
+
+            forces = chunk @ pos32.T
+            forces *= -2
+            forces += sq_norms[start:start + LAYOUT_CHUNK_SIZE, None]
+            forces += sq_norms[None, :]
+            np.maximum(forces, 1e-6, out=forces)
+            np.divide(k * k, forces, out=forces)
+            forces[np.arange(len(chunk)), np.arange(start, start + len(chunk))] = 0
+
+            disp[start:start + LAYOUT_CHUNK_SIZE] += chunk * forces.sum(axis=1)[:, None] - forces @ pos32
+
+        # Attraction d²/k along the edges
+        if len(sources):
+            delta = pos[sources] - pos[targets]
+            dist = np.maximum(np.sqrt((delta ** 2).sum(axis=-1)), 1e-3)
+            force = delta * (dist / k * weights)[:, None]
+            np.add.at(disp, sources, -force)
+            np.add.at(disp, targets, force)
+
+        disp -= gravity * pos * nb_nodes
+
+        # Limit the moves to the temperature, which cools down linearly
+        length = np.maximum(np.sqrt((disp ** 2).sum(axis=-1)), 1e-6)
+        step = temperature * (1 - iteration / iterations)
+        pos += disp * (np.minimum(length, step) / length)[:, None]
+
+    pos -= pos.mean(axis=0)
+    pos *= LAYOUT_NODE_SPACING * math.sqrt(nb_nodes)
+
+    return {node_id: (float(pos[i, 0]), float(pos[i, 1])) for node_id, i in index.items()}
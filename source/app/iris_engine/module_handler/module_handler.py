@@ -453,7 +453,7 @@ def task_hook_wrapper(self, module_name, hook_name, hook_ui_name, data, init_use
     return task_status
 
 
-def call_modules_hook(hook_name: str, data: any, caseid: int, hook_ui_name: str = None) -> any:
+def call_modules_hook(hook_name: str, data: any, caseid: int, hook_ui_name: str = None, init_user: str = None) -> any:
     """
     Calls modules which have registered the specified hook
 
@@ -462,6 +462,7 @@ def call_modules_hook(hook_name: str, data: any, caseid: int, hook_ui_name: str
     :param hook_ui_name: UI name of the hook
     :param data: Data associated with the hook
     :param caseid: Case ID
+    :param init_user: Name of the user triggering the hook. Default to the current user
     :return: Any
     """
     hook = IrisHook.query.filter(IrisHook.hook_name == hook_name).first()
@@ -498,7 +499,7 @@ def call_modules_hook(hook_name: str, data: any, caseid: int, hook_ui_name: str
             ser_data = base64.b64encode(dumps(data)).decode('utf8')
             task_hook_wrapper.delay(module_name=module.module_name, hook_name=hook_name,
                                     hook_ui_name=module.manual_hook_ui_name, data=ser_data,
-                                    init_user=current_user.name, caseid=caseid)
+                                    init_user=init_user or current_user.name, caseid=caseid)
 
         else:
             # Direct call. Should be fast
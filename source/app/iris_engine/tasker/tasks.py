@@ -21,16 +21,20 @@
 # IMPORTS ------------------------------------------------
 import os
 import urllib.parse
-from celery.signals import task_prerun
+from datetime import datetime
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
 from flask_login import current_user
 
 from app import db, app
 from app.datamgmt.case.case_db import get_case
+from app.datamgmt.dim.dim_tasks_db import index_celery_task
 from app.iris_engine.module_handler.module_handler import pipeline_dispatcher
 from app.iris_engine.utils.common import build_upload_path
 from app.iris_engine.utils.tracker import track_activity
 from app.models.cases import Cases
 from iris_interface import IrisInterfaceStatus as IStatus
+from iris_interface.IrisInterfaceStatus import IIStatus
 from iris_interface.IrisModuleInterface import IrisPipelineTypes
 
 app.config['timezone'] = 'Europe/Paris'
@@ -42,6 +46,53 @@ def on_task_init(*args, **kwargs):
     db.engine.dispose()
 
 
+def _index_task(task_id, status, **kwargs):
+    """
+    Update the task index. A failure is logged but never fails the task nor its publication
+    """
+    if not task_id:
+        return
+
+    try:
+        index_celery_task(task_id, status, **kwargs)
+
+    except Exception as e:
+        app.logger.warning(f'Unable to index task {task_id}: {e}')
+
+
+@before_task_publish.connect
+def on_task_publish(sender=None, headers=None, body=None, **kwargs):
+    headers = headers or {}
+    if 'task' in headers:
+        # Message protocol 2, the body is (args, kwargs, embed)
+        task_id = headers.get('id')
+        task_kwargs = body[1] if isinstance(body, (list, tuple)) and len(body) > 1 else None
+
+    else:
+        # Message protocol 1
+        body = body if isinstance(body, dict) else {}
+        task_id = body.get('id')
+        task_kwargs = body.get('kwargs')
+
+    _index_task(task_id, 'PENDING', task_name=sender, kwargs=task_kwargs)
+
+
+@task_prerun.connect
+def on_task_started(sender=None, task_id=None, task=None, kwargs=None, **kw):
+    _index_task(task_id, 'STARTED', task_name=getattr(task, 'name', None), kwargs=kwargs)
+
+
+@task_postrun.connect
+def on_task_done(sender=None, task_id=None, task=None, kwargs=None, retval=None, state=None, **kw):
+    if isinstance(retval, IIStatus):
+        success = retval.is_success()
+    else:
+        success = state == 'SUCCESS'
+
+    _index_task(task_id, state or 'UNKNOWN', task_name=getattr(task, 'name', None), kwargs=kwargs,
+                success=success, date_done=datetime.utcnow())
+
+
 def task_case_update(module, pipeline, pipeline_args, caseid):
     """
     Update the current case of the current user with fresh data.
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# IMPORTS ------------------------------------------------
+import csv
+import io
+
+import marshmallow
+
+from app import celery, db
+from app.datamgmt.case.case_assets_db import add_case_assets_batch, get_assets_types_map
+from app.datamgmt.states import update_assets_state
+from app.iris_engine.module_handler.module_handler import call_modules_hook
+from app.iris_engine.utils.tracker import track_activity
+from app.models import AnalysisStatus
+from app.schema.marshables import CaseAssetsSchema
+
+# VARS ---------------------------------------------------
+ASSETS_CSV_HEADERS = ["asset_name", "asset_type_name", "asset_description", "asset_ip", "asset_domain", "asset_tags"]
+
+ASSETS_IMPORT_BATCH_SIZE = 1000
+
+
+# CONTENT ------------------------------------------------
+def iter_assets_csv(csv_data):
+    """
+    Iterate over the rows of an assets CSV. The header line is optional.
+    :param csv_data: CSV content
+    :return: Iterator of (row index, row dict)
+    """
+    stream = io.StringIO(csv_data)
+
+    first_line = stream.readline()
+    if first_line.strip().lower() != ",".join(ASSETS_CSV_HEADERS):
+        stream.seek(0)
+
+    reader = csv.DictReader(stream, fieldnames=ASSETS_CSV_HEADERS, delimiter=',')
+    for index, row in enumerate(reader):
+        # Extra columns are ignored
+        row.pop(None, None)
+        yield index, row
+
+
+def import_assets_csv(csv_data, caseid, user_id, init_user=None, batch_size=ASSETS_IMPORT_BATCH_SIZE,
+                      progress=None):
+    """
+    Import the assets of a CSV into a case.
+    Asset types are resolved from a map loaded once. Assets are inserted by batches, and the modules hooks
+    are called once per batch with the list of assets. The whole import is committed at once, with a
+    single bump of the assets state.
+    :param csv_data: CSV content
+    :param caseid: Case ID
+    :param user_id: ID of the user importing the assets
+    :param init_user: Name of the user importing the assets, passed to the modules. Default to the current user
+    :param batch_size: Number of assets per batch
+    :param progress: Optional callable receiving the number of rows processed and the approximate total
+    :return: Tuple (list of imported rows, list of errors)
+    """
+    types_map = get_assets_types_map()
+    analysis_status_id = AnalysisStatus.query.filter(AnalysisStatus.name == 'Unspecified').first().id
+
+    asset_schema = CaseAssetsSchema(context={
+        'asset_types': set(types_map.values()),
+        'analysis_status': {analysis_status_id}
+    })
+
+    total = csv_data.count('\n') + 1
+    imported = []
+    added_batches = []
+    errors = []
+
+    def add_batch(rows):
+        request_data = call_modules_hook('on_preload_asset_create', data=rows, caseid=caseid, init_user=init_user)
+
+        assets = []
+        for row in request_data:
+            try:
+                assets.append(asset_schema.load(row))
+                imported.append(row)
+
+            except marshmallow.exceptions.ValidationError as e:
+                errors.append(f"{row.get('asset_name')} ({e.normalized_messages()})")
+
+        if assets:
+            added_batches.append(add_case_assets_batch(assets=assets, caseid=caseid, user_id=user_id))
+
+    batch = []
+    index = 0
+    for index, row in iter_assets_csv(csv_data):
+        missing_fields = [field for field in ASSETS_CSV_HEADERS if row.get(field) is None]
+        if missing_fields:
+            errors.append(f"{', '.join(missing_fields)} missing for row {index}")
+            continue
+
+        # Asset name must not be empty
+        if not row.get("asset_name"):
+            errors.append(f"Empty asset name for row {index}")
+            continue
+
+        if not row.get('asset_type_name'):
+            errors.append(f"Empty asset type for row {index}")
+            continue
+
+        type_id = types_map.get(row['asset_type_name'].lower())
+        if not type_id:
+            errors.append(f"{row.get('asset_name')} (invalid asset type: {row.get('asset_type_name')}) "
+                          f"for row {index}")
+            continue
+
+        if row.get("asset_tags"):
+            row["asset_tags"] = row.get("asset_tags").replace("|", ",")  # Reformat Tags
+
+        row['asset_type_id'] = type_id
+        row.pop('asset_type_name', None)
+        row['analysis_status_id'] = analysis_status_id
+
+        batch.append(row)
+        if len(batch) >= batch_size:
+            add_batch(batch)
+            batch = []
+
+            if progress:
+                progress(index + 1, total)
+
+    if batch:
+        add_batch(batch)
+
+    if progress:
+        progress(index + 1, total)
+
+    if not added_batches:
+        db.session.rollback()
+        return imported, errors
+
+    update_assets_state(caseid=caseid, userid=user_id)
+    db.session.commit()
+
+    # Hooks are called once the assets are committed, so asynchronous modules can read them
+    for assets in added_batches:
+        call_modules_hook('on_postload_asset_create', data=assets, caseid=caseid, init_user=init_user)
+
+    track_activity(f"imported {len(imported)} assets", caseid=caseid, user_id=user_id)
+
+    return imported, errors
+
+
+@celery.task(bind=True)
+def task_import_assets_csv(self, csv_data, caseid, user_id, init_user):
+    """
+    Import an assets CSV in the background. The progress is reported in the task state as
+    {'processed': rows processed, 'total': approximate number of rows}.
+    :return: dict with the number of imported assets and the errors
+    """
+    def progress(processed, total):
+        self.update_state(state='PROGRESS', meta={'processed': processed, 'total': total})
+
+    imported, errors = import_assets_csv(csv_data=csv_data, caseid=caseid, user_id=user_id, init_user=init_user,
+                                         progress=progress)
+
+    return {
+        'imported': len(imported),
+        'errors': errors
+    }
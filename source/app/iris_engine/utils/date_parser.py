@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# IMPORTS ------------------------------------------------
+import threading
+from datetime import datetime
+
+
+# CONTENT ------------------------------------------------
+# Formats are tried in this order, the first one matching wins
+DATE_FORMATS = tuple(dict.fromkeys((
+    '%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M%z', '%Y-%m-%d %H:%M:%S%z', '%Y-%m-%d %H:%M:%S.%f%z',
+    '%Y-%m-%d %H:%M %Z', '%Y-%m-%d %H:%M:%S %Z', '%Y-%m-%d %H:%M:%S.%f %Z',
+
+    '%b %d %H:%M:%S', '%Y %b %d %H:%M:%S', '%b %d %H:%M:%S %Y', '%b %d %Y %H:%M:%S',
+    '%y %b %d %H:%M:%S', '%b %d %H:%M:%S %y', '%b %d %y %H:%M:%S',
+
+    '%Y-%m-%d', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M%z', '%Y-%m-%dT%H:%M:%S%z', '%Y-%m-%dT%H:%M:%S.%f%z',
+    '%Y-%m-%dT%H:%M %Z', '%Y-%m-%dT%H:%M:%S %Z', '%Y-%m-%dT%H:%M:%S.%f %Z',
+
+    '%Y-%d-%m', '%Y-%d-%m %H:%M', '%Y-%d-%m %H:%M:%S', '%Y-%d-%m %H:%M:%S.%f',
+    '%Y-%d-%m %H:%M%z', '%Y-%d-%m %H:%M:%S%z', '%Y-%d-%m %H:%M:%S.%f%z',
+    '%Y-%d-%m %H:%M %Z', '%Y-%d-%m %H:%M:%S %Z', '%Y-%d-%m %H:%M:%S.%f %Z',
+
+    '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S.%f',
+    '%d.%m.%Y %H:%M', '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M:%S.%f',
+    '%d-%m-%Y %H:%M', '%d-%m-%Y %H:%M:%S', '%d-%m-%Y %H:%M:%S.%f',
+
+    '%b %d %Y %H:%M', '%b %d %Y %H:%M:%S', '%b %d %Y %H:%M:%S',
+
+    '%a, %d %b %Y %H:%M:%S', '%a, %d %b %Y %H:%M:%S %Z', '%a, %d %b %Y %H:%M:%S.%f',
+    '%a, %d %b %y %H:%M:%S', '%a, %d %b %y %H:%M:%S %Z', '%a, %d %b %y %H:%M:%S.%f',
+
+    '%d %b %Y %H:%M', '%d %b %Y %H:%M:%S', '%d %b %Y %H:%M:%S.%f',
+    '%d %b %y %H:%M', '%d %b %y %H:%M:%S', '%d %b %y %H:%M:%S.%f',
+
+    '%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', "%A, %B %d, %Y", "%A %B %d, %Y", "%A %B %d %Y",
+    '%d %B %Y'
+)))
+
+DATE_SHAPE_CACHE_SIZE = 4096
+
+_shape_cache = {}
+_shape_cache_lock = threading.Lock()
+
+_SHAPE_TABLE = str.maketrans(
+    '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ',
+    '0' * 10 + 'a' * 52
+)
+
+
+def get_date_shape(date_value):
+    """
+    Reduce a date string to its shape: digits become 0, letters become a, everything else is kept.
+    Two strings with the same shape can only be matched by the same formats.
+    :param date_value: Stripped date string
+    :return: Shape string
+    """
+    return date_value.translate(_SHAPE_TABLE)
+
+
+def _ambiguous_formats(fmt):
+    """
+    Return the formats which have the same layout as fmt once day and month are swapped.
+    These can match the same shape depending on the values, so they are kept as a group in
+    the order they have in DATE_FORMATS.
+    :param fmt: Winning format
+    :return: Tuple of formats
+    """
+    layout = fmt.replace('%m', '%d')
+    return tuple(f for f in DATE_FORMATS if f.replace('%m', '%d') == layout)
+
+
+def _parse_timestamp(date_value):
+    if len(date_value) == 10:
+        # Assume linux timestamp, from 1966 to 2286
+        return datetime.fromtimestamp(int(date_value))
+
+    if len(date_value) == 13:
+        # Assume millisecond timestamp
+        return datetime.fromtimestamp(int(date_value) / 1000)
+
+    return None
+
+
+def _parse_with_formats(date_value, formats):
+    for fmt in formats:
+        try:
+            return datetime.strptime(date_value, fmt), fmt
+        except ValueError:
+            pass
+
+    return None, None
+
+
+def parse_date(date_value):
+    """
+    Parse a date string of an unknown format.
+    The formats matching a given shape are looked up once and cached, so the next strings of the same
+    shape are parsed with a single strptime in most cases. If the cached formats fail, all the formats
+    are tried again in order.
+    :param date_value: Date string
+    :return: datetime or None if no format matches
+    """
+    if not date_value:
+        return None
+
+    date_value = date_value.strip()
+
+    if date_value.isdigit():
+        date = _parse_timestamp(date_value)
+        if date is not None:
+            return date
+
+    shape = get_date_shape(date_value)
+    formats = _shape_cache.get(shape)
+    if formats:
+        date, _ = _parse_with_formats(date_value, formats)
+        if date is not None:
+            return date
+
+    date, fmt = _parse_with_formats(date_value, DATE_FORMATS)
+    if fmt is None:
+        return None
+
+    with _shape_cache_lock:
+        if len(_shape_cache) >= DATE_SHAPE_CACHE_SIZE:
+            _shape_cache.clear()
+        _shape_cache[shape] = _ambiguous_formats(fmt)
+
+    return date
+
+
+def format_parsed_date(date):
+    """
+    Split a parsed date into the date, time and tz fields used by the timeline forms
+    :param date: datetime
+    :return: dict
+    """
+    tz = date.strftime("%z")
+    return {
+        "date": date.strftime("%Y-%m-%d"),
+        "time": date.strftime("%H:%M:%S.%f")[:-3],
+        "tz": tz if tz else "+00:00"
+    }
+
+
+def convert_date(date_value):
+    """
+    Parse a date string and return its timeline fields
+    :param date_value: Date string
+    :return: dict or None if the date can't be parsed
+    """
+    try:
+        date = parse_date(date_value)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+    if date is None:
+        return None
+
+    return format_parsed_date(date)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# IMPORTS ------------------------------------------------
+import hashlib
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import billiard
+
+# VARS ---------------------------------------------------
+EVIDENCE_HASH_ALGORITHMS = ('md5', 'sha1', 'sha256')
+
+# Size of the slices of the file given to the digests. Large enough for hashlib to release the GIL and for the
+# thread handoff to be negligible
+EVIDENCE_HASH_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+# CONTENT ------------------------------------------------
+def hash_evidence_file(path, chunk_size=EVIDENCE_HASH_CHUNK_SIZE, threaded=True):
+    """
+    Compute the MD5, SHA1 and SHA256 of a file in a single read.
+    The file is memory mapped and each chunk is fed to the three digests. When threaded, each digest runs in its
+    own thread. hashlib releases the GIL on large buffers, so a file is hashed at the speed of the slowest digest
+    instead of the sum of them.
+    :param path: Path of the file
+    :param chunk_size: Number of bytes hashed at once
+    :param threaded: Update the digests in parallel
+    :return: dict with the size of the file and its hex digests
+    """
+    digests = {name: hashlib.new(name) for name in EVIDENCE_HASH_ALGORITHMS}
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+
+        # Empty files can't be mapped
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                    ThreadPoolExecutor(max_workers=len(digests) if threaded else 1) as executor:
+                if hasattr(mapped, 'madvise'):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+                view = memoryview(mapped)
+                try:
+                    for offset in range(0, size, chunk_size):
+                        with view[offset:offset + chunk_size] as chunk:
+                            list(executor.map(lambda digest: digest.update(chunk), digests.values()))
+
+                finally:
+                    # The map can't be closed while views on it exist
+                    view.release()
+
+    result = {name: digest.hexdigest() for name, digest in digests.items()}
+    result['size'] = size
+
+    return result
+
+
+def _hash_evidence_file_safe(path, threaded=True):
+    try:
+        return path, hash_evidence_file(path, threaded=threaded), None
+
+    except OSError as e:
+        return path, None, str(e)
+
+
+def hash_evidence_files(paths, processes=None):
+    """
+    Hash files in a pool of processes, one file per process at a time.
+    The pool is a billiard one, as Celery workers are daemonic processes which multiprocessing forbids to fork.
+    :param paths: List of paths
+    :param processes: Size of the pool. Default to the number of CPUs
+    :return: List of (path, hashes or None, error or None), in the order of the paths
+    """
+    paths = list(paths)
+    cpus = os.cpu_count() or 1
+    processes = min(processes or cpus, len(paths))
+
+    if processes <= 1:
+        return [_hash_evidence_file_safe(path) for path in paths]
+
+    # Spare CPUs go to the digests of each file
+    hash_file = partial(_hash_evidence_file_safe, threaded=processes < cpus)
+
+    with billiard.Pool(processes=processes) as pool:
+        return pool.map(hash_file, paths, chunksize=1)
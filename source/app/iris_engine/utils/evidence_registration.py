@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# IMPORTS ------------------------------------------------
+import os
+import urllib.parse
+
+from app import app, celery, db
+from app.datamgmt.case.case_db import get_case
+from app.datamgmt.case.case_rfiles_db import add_rfile, get_rfiles_by_filenames
+from app.datamgmt.states import update_evidences_state
+from app.iris_engine.utils.common import build_upload_path
+from app.iris_engine.utils.evidence_hasher import hash_evidence_files, EVIDENCE_HASH_ALGORITHMS
+from app.models import CaseReceivedFile
+from iris_interface import IrisInterfaceStatus as IStatus
+
+log = app.logger
+
+# VARS ---------------------------------------------------
+# Sub folder of the case upload path holding the evidences files
+EVIDENCE_UPLOAD_MODULE = 'evidences'
+
+
+# CONTENT ------------------------------------------------
+def get_evidences_upload_path(caseid, create=False):
+    """
+    Return the folder of the evidences files of a case
+    :param caseid: Case ID
+    :param create: Create the folder if it doesn't exist
+    :return: Path, None if the case doesn't exist
+    """
+    case = get_case(caseid=caseid)
+    if not case:
+        return None
+
+    return build_upload_path(case_customer=case.client.name,
+                             case_name=urllib.parse.unquote(case.name),
+                             module=EVIDENCE_UPLOAD_MODULE,
+                             create=create)
+
+
+def list_evidences_files(fpath, filenames=None):
+    """
+    List the regular files of an evidences folder
+    :param fpath: Evidences folder
+    :param filenames: Restrict to these file names. Anything else than a plain name in the folder is ignored
+    :return: Sorted list of file names
+    """
+    if filenames is None:
+        candidates = os.listdir(fpath)
+    else:
+        candidates = {filename for filename in filenames if filename and filename == os.path.basename(filename)}
+
+    return sorted(filename for filename in candidates if os.path.isfile(os.path.join(fpath, filename)))
+
+
+def match_registered_hash(file_hash, hashes):
+    """
+    Tell if the hash registered for an evidence, usually typed by an analyst, is one of the computed digests
+    :param file_hash: Registered hash. Any of MD5, SHA1 or SHA256
+    :param hashes: Computed digests, as returned by hash_evidence_file
+    :return: True if the registered hash is empty or matches one of the digests
+    """
+    if not file_hash or not file_hash.strip():
+        return True
+
+    return file_hash.strip().lower() in (hashes[name] for name in EVIDENCE_HASH_ALGORITHMS)
+
+
+def register_evidences(caseid, user_id, filenames=None):
+    """
+    Hash the files of the evidences folder of a case and register them. Evidences already registered under the
+    same file name get the computed size and hashes, the other files are added as new evidences.
+    An evidence registered with a hash matching none of the computed digests is left untouched, as the file may be
+    corrupted or tampered with, and the registration fails for this file.
+    :param caseid: Case ID
+    :param user_id: ID of the user registering the evidences
+    :param filenames: Files to register. All the files of the folder if None
+    :return: IIStatus, with the registered evidences IDs as data. A failure if a registered hash mismatched
+    """
+    fpath = get_evidences_upload_path(caseid)
+    if not fpath or not os.path.isdir(fpath):
+        return IStatus.I2FileNotFound("Evidences upload path not found")
+
+    files = list_evidences_files(fpath, filenames)
+    if not files:
+        return IStatus.I2FileNotFound("No evidence file to register")
+
+    results = hash_evidence_files([os.path.join(fpath, filename) for filename in files],
+                                  processes=app.config.get('EVIDENCE_HASH_PROCESSES'))
+
+    registered = get_rfiles_by_filenames(caseid, files)
+    evidences_ids = []
+    mismatches = []
+    logs = []
+
+    for path, hashes, error in results:
+        filename = os.path.basename(path)
+        if error:
+            logs.append(f"{filename}: unable to hash - {error}")
+            continue
+
+        evidences = registered.get(filename)
+        if not evidences:
+            evidence = CaseReceivedFile()
+            evidence.filename = filename
+            evidences = [evidence]
+
+        for evidence in evidences:
+            if not match_registered_hash(evidence.file_hash, hashes):
+                mismatches.append(filename)
+                logs.append(f"{filename}: registered hash {evidence.file_hash} doesn't match the file - "
+                            f"MD5 {hashes['md5']}, SHA1 {hashes['sha1']}, SHA256 {hashes['sha256']}. "
+                            f"Evidence ID {evidence.id} left unchanged")
+                continue
+
+            evidence.file_size = hashes['size']
+            evidence.file_hash = hashes['sha256']
+            evidence.file_md5 = hashes['md5']
+            evidence.file_sha1 = hashes['sha1']
+
+            if evidence.id is None:
+                add_rfile(evidence, caseid, user_id)
+
+            evidences_ids.append(evidence.id)
+
+        logs.append(f"{filename}: {hashes['size']} bytes, SHA256 {hashes['sha256']}")
+
+    update_evidences_state(caseid=caseid, userid=user_id)
+    db.session.commit()
+
+    if mismatches:
+        return IStatus.I2UnexpectedResult(f"{len(mismatches)} evidences don't match their registered hash: "
+                                          f"{', '.join(mismatches)}", data=evidences_ids, logs=logs)
+
+    if not evidences_ids:
+        return IStatus.I2UnexpectedResult("No evidence could be hashed", logs=logs)
+
+    return IStatus.I2Success(f"{len(evidences_ids)} evidences registered", data=evidences_ids, logs=logs)
+
+
+@celery.task(bind=True)
+def task_register_evidences(self, caseid, user_id, filenames=None, init_user=None):
+    """
+    Hash and register evidences files in the background. init_user is only kept for the tasks listing
+    :return: IIStatus
+    """
+    return register_evidences(caseid=caseid, user_id=user_id, filenames=filenames)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# IMPORTS ------------------------------------------------
+import re
+
+# VARS ---------------------------------------------------
+_IPV4 = r'(?:(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.){3}(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)'
+_IPV6 = r'(?:(?:[0-9a-f]{1,4}:){7}[0-9a-f]{1,4}|(?:[0-9a-f]{1,4}:){0,6}[0-9a-f]{0,4}::(?:[0-9a-f]{1,4}:){0,6}[0-9a-f]{0,4})'
+_DOMAIN = r'(?:[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9])?\.)+[a-z][a-z0-9-]{0,61}[a-z0-9]'
+_PORT = r'(?::|\|)\d{1,5}'
+_FILE_EXTENSIONS = ('exe', 'dll', 'sys', 'scr', 'cpl', 'ocx', 'drv', 'ps1', 'psm1', 'bat', 'cmd', 'vbs', 'vbe', 'js',
+                    'jse', 'wsf', 'hta', 'jar', 'lnk', 'msi', 'msp', 'doc', 'docx', 'docm', 'xls', 'xlsx', 'xlsm',
+                    'ppt', 'pptx', 'pptm', 'rtf', 'pdf', 'zip', 'rar', '7z', 'gz', 'tar', 'iso', 'img', 'vhd',
+                    'elf', 'so', 'sh', 'py', 'pl', 'php', 'asp', 'aspx', 'jsp', 'txt', 'log', 'tmp', 'dat', 'bin')
+
+# Patterns of the IOC types of the default taxonomy, by decreasing priority. The first pattern matching the
+# whole value gives its type, so the specific formats must come before the generic ones (hashes before
+# filenames, filenames before domains...). Groups must be non-capturing.
+IOC_TYPE_PATTERNS = [
+    ('yara', r'(?s:(?:(?:private|global)\s+)*rule\s+\w+.*\{.*\})'),
+    ('sigma', r'(?s:(?=.*^title:).*^detection:.*)'),
+    ('vulnerability', r'cve-\d{4}-\d{4,}'),
+    ('md5', r'[0-9a-f]{32}'),
+    ('sha1', r'[0-9a-f]{40}'),
+    ('sha224', r'[0-9a-f]{56}'),
+    ('sha256', r'[0-9a-f]{64}'),
+    ('sha384', r'[0-9a-f]{96}'),
+    ('sha512', r'[0-9a-f]{128}'),
+    ('tlsh', r't1[0-9a-f]{70}'),
+    ('ssdeep', r'\d+:[a-z0-9/+]{3,}:[a-z0-9/+]{3,}'),
+    ('filename|md5', r'[^|\r\n]+\|[0-9a-f]{32}'),
+    ('filename|sha1', r'[^|\r\n]+\|[0-9a-f]{40}'),
+    ('filename|sha256', r'[^|\r\n]+\|[0-9a-f]{64}'),
+    ('mac-address', r'[0-9a-f]{2}(?:[:-][0-9a-f]{2}){5}'),
+    ('ip-any', f'{_IPV4}|{_IPV6}'),
+    ('ip-dst|port', f'{_IPV4}{_PORT}'),
+    ('email', rf'[\w.+-]+@{_DOMAIN}'),
+    ('url', r'[a-z][a-z0-9+.-]*://\S+'),
+    ('regkey', r'(?:hklm|hkcu|hkcr|hku|hkcc|hkey_[a-z_]+)\\.+'),
+    ('file-path', r'(?:[a-z]:\\|\\\\)[^\r\n]*|/(?:[^/\x00\r\n]+/)+[^/\x00\r\n]*'),
+    ('filename', rf'[^\\/:*?"<>|\r\n]+\.(?:{"|".join(_FILE_EXTENSIONS)})'),
+    ('domain', _DOMAIN),
+    ('hostname|port', f'{_DOMAIN}{_PORT}'),
+    ('btc', r'(?-i:[13][a-km-zA-HJ-NP-Z1-9]{25,34}|bc1[a-z0-9]{39,59})'),
+    ('AS', r'as\d{1,10}')
+]
+
+
+# CONTENT ------------------------------------------------
+class IocTypeClassifier(object):
+    """
+    Guess the type of IOC values from their format.
+    The patterns of the types known to the IOC taxonomy are combined into a single regex, so each value is
+    matched once whatever the number of types.
+    """
+    def __init__(self, types_map, patterns=None):
+        """
+        :param types_map: dict lowered type name -> type ID, as returned by get_ioc_types_map
+        :param patterns: List of (type name, pattern) by decreasing priority. Default to IOC_TYPE_PATTERNS
+        """
+        self._types = []
+        alternatives = []
+        for type_name, pattern in patterns or IOC_TYPE_PATTERNS:
+            type_id = types_map.get(type_name.lower())
+            if type_id is None:
+                # Type removed from the taxonomy
+                continue
+
+            alternatives.append(f'(?P<t{len(self._types)}>{pattern})')
+            self._types.append((type_name, type_id))
+
+        self._regex = re.compile('|'.join(alternatives), re.IGNORECASE | re.MULTILINE) if alternatives else None
+        self._cache = {}
+
+    def detect(self, value):
+        """
+        Detect the type of a value
+        :param value: IOC value
+        :return: Tuple (type name, type ID), or None if no type matches
+        """
+        if not value or self._regex is None:
+            return None
+
+        if value in self._cache:
+            return self._cache[value]
+
+        match = self._regex.fullmatch(value.strip())
+        result = self._types[int(match.lastgroup[1:])] if match else None
+
+        self._cache[value] = result
+        return result
+
+    def classify(self, values):
+        """
+        Detect the types of a list of values. Duplicated values are only matched once.
+        :param values: List of IOC values
+        :return: List of (type name, type ID) or None, in the order of the values
+        """
+        return [self.detect(value) for value in values]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# IMPORTS ------------------------------------------------
+from collections import deque
+
+# VARS ---------------------------------------------------
+# Shorter values match too many unrelated words
+IOC_MATCH_MIN_LENGTH = 3
+
+
+# CONTENT ------------------------------------------------
+def _is_boundary(text, index):
+    """
+    A match only counts if it is not glued to a word character, so 1.2.3.4 isn't found in 11.2.3.45
+    """
+    if index < 0 or index >= len(text):
+        return True
+
+    char = text[index]
+    return not (char.isalnum() or char == '_')
+
+
+class IocMatcher(object):
+    """
+    Aho-Corasick automaton finding all the occurrences of a set of IOC values in a single pass over a text,
+    whatever the number of IOCs. Matching is case insensitive.
+    """
+    def __init__(self, iocs):
+        """
+        :param iocs: Iterable of (ioc_id, ioc_value)
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for ioc_id, ioc_value in iocs:
+            if not ioc_value or len(ioc_value) < IOC_MATCH_MIN_LENGTH:
+                continue
+
+            value = ioc_value.lower()
+            node = 0
+            for char in value:
+                child = self._goto[node].get(char)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][char] = child
+
+                node = child
+
+            self._out[node].append((len(value), ioc_id))
+
+        # Failure links, level by level. The nodes of the first level fall back to the root
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def __len__(self):
+        return len(self._goto)
+
+    def find(self, text):
+        """
+        Count the occurrences of the IOCs in a text
+        :param text: Text to scan
+        :return: dict ioc_id -> number of occurrences
+        """
+        counts = {}
+        if not text:
+            return counts
+
+        goto, fail, out = self._goto, self._fail, self._out
+
+        text = text.lower()
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+
+            node = goto[node].get(char, 0)
+
+            for length, ioc_id in out[node]:
+                if _is_boundary(text, position - length) and _is_boundary(text, position + 1):
+                    counts[ioc_id] = counts.get(ioc_id, 0) + 1
+
+        return counts
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# IMPORTS ------------------------------------------------
+import threading
+from collections import OrderedDict
+
+from flask import has_request_context
+from flask_login import current_user
+
+from app import app, celery, db
+from app.datamgmt.case.case_mentions_db import MENTION_SOURCES, get_case_ioc_fingerprint, get_case_ioc_values, \
+    iter_mention_sources, replace_ioc_mentions
+from app.iris_engine.utils.ioc_matcher import IocMatcher
+
+log = app.logger
+
+# VARS ---------------------------------------------------
+# Number of cases whose matcher is kept in memory
+MATCHER_CACHE_SIZE = 16
+
+_matcher_cache = OrderedDict()
+_matcher_cache_lock = threading.Lock()
+
+
+# CONTENT ------------------------------------------------
+def get_case_ioc_matcher(caseid):
+    """
+    Return the matcher of the IOCs of a case.
+    Matchers are cached per case and rebuilt once the IOCs of the case changed. The IOC state of the case is not
+    enough, as IOCs shared with other cases can be edited from them.
+    :param caseid: Case ID
+    :return: IocMatcher
+    """
+    version = get_case_ioc_fingerprint(caseid)
+
+    with _matcher_cache_lock:
+        cached = _matcher_cache.get(caseid)
+        if cached is not None and cached[0] == version:
+            _matcher_cache.move_to_end(caseid)
+            return cached[1]
+
+    matcher = IocMatcher(get_case_ioc_values(caseid))
+
+    with _matcher_cache_lock:
+        _matcher_cache[caseid] = (version, matcher)
+        _matcher_cache.move_to_end(caseid)
+        while len(_matcher_cache) > MATCHER_CACHE_SIZE:
+            _matcher_cache.popitem(last=False)
+
+    return matcher
+
+
+def scan_ioc_mentions(caseid, object_type=None, object_ids=None):
+    """
+    Scan objects of a case for mentions of the case IOCs, and replace their stored mentions.
+    :param caseid: Case ID
+    :param object_type: Type of object to scan. All the types if None
+    :param object_ids: Objects to scan. All the objects of the type if None
+    :return: Number of mentions found
+    """
+    matcher = get_case_ioc_matcher(caseid)
+
+    object_types = [object_type] if object_type else list(MENTION_SOURCES)
+    nb_mentions = 0
+
+    for scanned_type in object_types:
+        mentions = []
+        for object_id, fields in iter_mention_sources(caseid, scanned_type, object_ids):
+            for field, text in fields.items():
+                for ioc_id, count in matcher.find(text).items():
+                    mentions.append((object_id, field, ioc_id, count))
+
+        replace_ioc_mentions(caseid, scanned_type, object_ids, mentions)
+        nb_mentions += len(mentions)
+
+    db.session.commit()
+
+    return nb_mentions
+
+
+@celery.task(bind=True)
+def task_scan_ioc_mentions(self, caseid, object_type=None, object_ids=None, init_user=None):
+    """
+    Scan objects of a case for IOC mentions in the background. init_user is only kept for the tasks listing
+    :return: Number of mentions found
+    """
+    return scan_ioc_mentions(caseid=caseid, object_type=object_type, object_ids=object_ids)
+
+
+def schedule_ioc_mentions_scan(caseid, object_type=None, object_ids=None):
+    """
+    Queue a scan of objects of a case. Mentions are updated once the worker has processed it.
+    :param caseid: Case ID
+    :param object_type: Type of object to scan. All the types if None
+    :param object_ids: Objects to scan. All the objects of the type if None
+    """
+    init_user = current_user.name if has_request_context() and current_user.is_authenticated else None
+
+    try:
+        task_scan_ioc_mentions.delay(caseid=caseid, object_type=object_type,
+                                     object_ids=list(object_ids) if object_ids is not None else None,
+                                     init_user=init_user)
+
+    except Exception as e:
+        # The scan is best-effort, the objects are saved anyway
+        log.warning(f'Unable to schedule the IOC mentions scan of case {caseid}: {e}')
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# IMPORTS ------------------------------------------------
+import csv
+import io
+
+from app import db
+from app.datamgmt.case.case_iocs_db import add_case_iocs_batch, get_ioc_types_map, get_tlps_dict, get_iocs_by_ids
+from app.datamgmt.states import update_ioc_state
+from app.iris_engine.module_handler.module_handler import call_modules_hook
+from app.iris_engine.utils.ioc_classifier import IocTypeClassifier
+from app.iris_engine.utils.tracker import track_activity
+
+# VARS ---------------------------------------------------
+IOCS_CSV_HEADERS = ["ioc_value", "ioc_type", "ioc_description", "ioc_tags", "ioc_tlp"]
+
+IOCS_IMPORT_BATCH_SIZE = 1000
+
+# Size of the ioc_tags column
+IOC_TAGS_MAX_LENGTH = 512
+
+
+# CONTENT ------------------------------------------------
+def iter_iocs_csv(csv_data):
+    """
+    Iterate over the rows of an IOCs CSV. The header line is optional.
+    :param csv_data: CSV content
+    :return: Iterator of (row index, row dict)
+    """
+    stream = io.StringIO(csv_data)
+
+    first_line = stream.readline()
+    if first_line.strip().lower() != ",".join(IOCS_CSV_HEADERS):
+        stream.seek(0)
+
+    reader = csv.DictReader(stream, fieldnames=IOCS_CSV_HEADERS, quotechar='"', delimiter=',')
+    for index, row in enumerate(reader):
+        # Extra columns are ignored
+        row.pop(None, None)
+        yield index, row
+
+
+def import_iocs_csv(csv_data, caseid, user_id, batch_size=IOCS_IMPORT_BATCH_SIZE, detect_types=False):
+    """
+    Import the IOCs of a CSV into a case.
+    Rows are deduplicated by (value, type) before reaching the database. Each batch then resolves the
+    existing IOCs in one query, and inserts the new IOCs and the links to the case in one statement each.
+    The modules hooks are called once per batch, and the whole import is committed at once with a single
+    bump of the IOC state.
+    :param csv_data: CSV content
+    :param caseid: Case ID
+    :param user_id: ID of the user importing the IOCs
+    :param batch_size: Number of IOCs per batch
+    :param detect_types: Guess the type of the rows with an empty or unknown type from their value
+    :return: Tuple (list of imported rows, list of errors)
+    """
+    types_map = get_ioc_types_map()
+    tlp_dict = get_tlps_dict()
+    classifier = IocTypeClassifier(types_map) if detect_types else None
+
+    imported = []
+    linked_batches = []
+    errors = []
+
+    def add_batch(rows):
+        request_data = call_modules_hook('on_preload_ioc_create', data=rows, caseid=caseid)
+
+        ioc_ids, linked_ids = add_case_iocs_batch(iocs=request_data, caseid=caseid, user_id=user_id)
+
+        for row in request_data:
+            if ioc_ids.get((row['ioc_value'], row['ioc_type_id'])) in linked_ids:
+                imported.append(row)
+            else:
+                errors.append(f"{row['ioc_value']} (already exists and linked to this case)")
+
+        if linked_ids:
+            linked_batches.append(linked_ids)
+
+    batch = []
+    seen = set()
+    for index, row in iter_iocs_csv(csv_data):
+        missing_fields = [field for field in IOCS_CSV_HEADERS if row.get(field) is None]
+        if missing_fields:
+            errors.append(f"{', '.join(missing_fields)} missing for row {index}")
+            continue
+
+        # IOC value must not be empty
+        if not row.get("ioc_value"):
+            errors.append(f"Empty IOC value for row {index}")
+            continue
+
+        row["ioc_tags"] = row["ioc_tags"].replace("|", ",")  # Reformat Tags
+        if len(row["ioc_tags"]) > IOC_TAGS_MAX_LENGTH:
+            errors.append(f"{row['ioc_value']} (tags longer than {IOC_TAGS_MAX_LENGTH} characters) for row {index}")
+            continue
+
+        # Convert TLP into TLP id
+        if row["ioc_tlp"] not in tlp_dict:
+            errors.append(f"{row['ioc_value']} (invalid TLP: {row['ioc_tlp']}) for row {index}")
+            continue
+
+        row["ioc_tlp_id"] = tlp_dict[row.pop("ioc_tlp")]
+
+        type_id = types_map.get(row['ioc_type'].lower())
+        if not type_id and classifier:
+            detected = classifier.detect(row['ioc_value'])
+            if not detected:
+                errors.append(f"{row['ioc_value']} (unable to detect the ioc type) for row {index}")
+                continue
+
+            row['ioc_type'], type_id = detected
+
+        if not type_id:
+            errors.append(f"{row['ioc_value']} (invalid ioc type: {row['ioc_type']}) for row {index}")
+            continue
+
+        row['ioc_type_id'] = type_id
+        row.pop('ioc_type', None)
+
+        key = (row['ioc_value'], type_id)
+        if key in seen:
+            errors.append(f"{row['ioc_value']} (duplicated in the file) for row {index}")
+            continue
+
+        seen.add(key)
+
+        batch.append(row)
+        if len(batch) >= batch_size:
+            add_batch(batch)
+            batch = []
+
+    if batch:
+        add_batch(batch)
+
+    if not linked_batches:
+        db.session.rollback()
+        return imported, errors
+
+    update_ioc_state(caseid=caseid, userid=user_id)
+    db.session.commit()
+
+    # Hooks are called once the IOCs are committed, so asynchronous modules can read them
+    for linked_ids in linked_batches:
+        call_modules_hook('on_postload_ioc_create', data=get_iocs_by_ids(linked_ids), caseid=caseid)
+
+    track_activity(f"imported {len(imported)} iocs", caseid=caseid)
+
+    return imported, errors
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# VARS ---------------------------------------------------
+# A patch is a list of operations {"offset": int, "delete": int, "insert": str} on a base text. Offsets are
+# counted in characters (code points) of the base text, and the operations must be sorted and must not overlap.
+NOTE_PATCH_MAX_OPERATIONS = 100
+
+
+# CONTENT ------------------------------------------------
+class NotePatchError(ValueError):
+    pass
+
+
+def validate_note_patch(patch, base_length):
+    """
+    Check a patch can be applied on a text
+    :param patch: List of operations
+    :param base_length: Length of the base text
+    :return: List of (offset, delete, insert) tuples
+    :raise NotePatchError: If the patch is malformed or doesn't fit the text
+    """
+    if not isinstance(patch, list):
+        raise NotePatchError("The patch must be a list of operations")
+
+    if len(patch) > NOTE_PATCH_MAX_OPERATIONS:
+        raise NotePatchError(f"Too many operations. Maximum is {NOTE_PATCH_MAX_OPERATIONS} per patch")
+
+    operations = []
+    position = 0
+    for operation in patch:
+        if not isinstance(operation, dict):
+            raise NotePatchError("Invalid patch operation")
+
+        offset = operation.get('offset')
+        delete = operation.get('delete', 0)
+        insert = operation.get('insert', '')
+
+        if not isinstance(offset, int) or not isinstance(delete, int) or not isinstance(insert, str) \
+                or isinstance(offset, bool) or isinstance(delete, bool):
+            raise NotePatchError("Invalid patch operation")
+
+        if offset < position or delete < 0 or offset + delete > base_length:
+            raise NotePatchError("Patch operations out of the note or overlapping")
+
+        operations.append((offset, delete, insert))
+        position = offset + delete
+
+    return operations
+
+
+def apply_note_patch(text, operations):
+    """
+    Apply validated operations on a text
+    :param text: Base text
+    :param operations: List of (offset, delete, insert), as returned by validate_note_patch
+    :return: Patched text
+    """
+    parts = []
+    position = 0
+    for offset, delete, insert in operations:
+        parts.append(text[position:offset])
+        parts.append(insert)
+        position = offset + delete
+
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def reverse_note_patch(operations, deleted):
+    """
+    Build the patch reverting validated operations
+    :param operations: List of (offset, delete, insert), as returned by validate_note_patch
+    :param deleted: List of the texts removed by each operation
+    :return: List of operations, to apply on the patched text to get the base text back
+    """
+    reverse = []
+    shift = 0
+    for (offset, delete, insert), removed in zip(operations, deleted):
+        reverse.append({'offset': offset + shift, 'delete': len(insert), 'insert': removed})
+        shift += len(insert) - delete
+
+    return reverse
+
+
+def _common_prefix_length(a, b):
+    """
+    Length of the common prefix of two strings. Slices are compared by dichotomy, which is much faster than
+    comparing characters one by one on large notes
+    """
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+
+    return low
+
+
+def diff_note_content(old, new):
+    """
+    Build a single operation patch turning a text into another, from their common prefix and suffix
+    :param old: Base text
+    :param new: Target text
+    :return: List of operations, empty if the texts are equal
+    """
+    old = old or ''
+    new = new or ''
+    if old == new:
+        return []
+
+    prefix = _common_prefix_length(old, new)
+    suffix = _common_prefix_length(old[prefix:][::-1], new[prefix:][::-1])
+
+    return [{
+        'offset': prefix,
+        'delete': len(old) - prefix - suffix,
+        'insert': new[prefix:len(new) - suffix]
+    }]
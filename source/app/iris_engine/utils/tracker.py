@@ -33,16 +33,17 @@ import logging as log
 
 
 # CONTENT ------------------------------------------------
-def track_activity(message, caseid=None, ctx_less=False, user_input=False):
+def track_activity(message, caseid=None, ctx_less=False, user_input=False, user_id=None):
     """
     Register a user activity in DB.
     :param message: Message to save as activity
+    :param user_id: ID of the user of the activity. Default to the current user, for the calls out of a request
     :return: Nothing
     """
     ua = UserActivity()
 
     try:
-        ua.user_id = current_user.id
+        ua.user_id = user_id or current_user.id
     except:
         pass
 
@@ -19,7 +19,7 @@
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 # IMPORTS ------------------------------------------------
-from sqlalchemy import Column, Date, Integer, String, Boolean, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Date, Integer, String, Boolean, Text, ForeignKey, DateTime, Index
 from sqlalchemy.dialects.postgresql import JSONB, JSON
 from sqlalchemy.orm import relationship, backref
 from flask_login import current_user
@@ -112,6 +112,9 @@ class Cases(db.Model):
 
 class CasesEvent(db.Model):
     __tablename__ = "cases_events"
+    __table_args__ = (
+        Index('idx_cases_events_case_date', 'case_id', 'event_date', 'event_id'),
+    )
 
     event_id = Column(Integer, primary_key=True)
     case_id = Column(ForeignKey('cases.case_id'))
@@ -25,9 +25,9 @@ from app import db, app
 from flask_login import UserMixin
 
 from sqlalchemy import Boolean, Column, Date, ForeignKey, Index, Integer, Numeric, String, Text, UniqueConstraint, text, \
-    LargeBinary, DateTime, Sequence, or_, BigInteger, TIMESTAMP
-from sqlalchemy.dialects.postgresql import UUID, JSON, JSON
-from sqlalchemy.orm import relationship
+    LargeBinary, DateTime, Sequence, or_, BigInteger, TIMESTAMP, func, Computed
+from sqlalchemy.dialects.postgresql import UUID, JSON, JSON, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.ext.declarative import declarative_base
 
 from sqlalchemy import create_engine
@@ -79,6 +79,10 @@ class AssetsType(db.Model):
 
 class CaseAssets(db.Model):
     __tablename__ = 'case_assets'
+    __table_args__ = (
+        Index('idx_case_assets_case_id', 'case_id'),
+        Index('idx_case_assets_name_type', 'asset_name', 'asset_type_id'),
+    )
 
     asset_id = Column(Integer, primary_key=True)
     asset_name = Column(Text)
@@ -111,6 +115,11 @@ class AnalysisStatus(db.Model):
 
 class CaseEventsAssets(db.Model):
     __tablename__ = 'case_events_assets'
+    __table_args__ = (
+        Index('idx_case_events_assets_case_event', 'case_id', 'event_id'),
+        Index('idx_case_events_assets_event_id', 'event_id'),
+        Index('idx_case_events_assets_asset_id', 'asset_id'),
+    )
 
     id = Column(Integer, primary_key=True)
     event_id = Column(ForeignKey('cases_events.event_id'))
@@ -123,6 +132,10 @@ class CaseEventsAssets(db.Model):
 
 
 class ObjectState(db.Model):
+    __table_args__ = (
+        Index('idx_object_state_name_case', 'object_name', 'object_case_id'),
+    )
+
     object_id = Column(Integer, primary_key=True)
     object_case_id = Column(ForeignKey('cases.case_id'))
     object_updated_by_id = db.Column(db.Integer(), db.ForeignKey('user.id'))
@@ -134,6 +147,22 @@ class ObjectState(db.Model):
     updated_by = relationship('User')
 
 
+class CaseEventsChanges(db.Model):
+    __tablename__ = 'case_events_changes'
+    __table_args__ = (
+        Index('idx_case_events_changes_case_state', 'case_id', 'object_state'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    case_id = Column(ForeignKey('cases.case_id'), nullable=False)
+    event_id = Column(Integer, nullable=False)
+    object_state = Column(BigInteger, nullable=False)
+    change_op = Column(Text)
+    change_date = Column(TIMESTAMP)
+
+    case = relationship('Cases')
+
+
 class EventCategory(db.Model):
     __tablename__ = 'event_category'
 
@@ -398,6 +427,13 @@ class Ioc(db.Model):
     ioc_type = relationship('IocType')
 
 
+# An IOC is unique by value and type. The value is hashed, as IOCs like signatures can exceed the size of a btree entry
+Index('idx_ioc_value_type', func.md5(Ioc.ioc_value), Ioc.ioc_type_id, unique=True)
+
+# Prefix and wildcard searches on IOC values. Requires the pg_trgm extension
+Index('idx_ioc_value_trgm', Ioc.ioc_value, postgresql_using='gin', postgresql_ops={'ioc_value': 'gin_trgm_ops'})
+
+
 class CustomAttribute(db.Model):
     __tablename__ = 'custom_attribute'
 
@@ -419,6 +455,10 @@ class IocType(db.Model):
 
 class IocLink(db.Model):
     __tablename__ = 'ioc_link'
+    __table_args__ = (
+        Index('idx_ioc_link_case_ioc', 'case_id', 'ioc_id', unique=True),
+        Index('idx_ioc_link_ioc_id', 'ioc_id'),
+    )
 
     ioc_link_id = Column(Integer, primary_key=True)
     ioc_id = Column(ForeignKey('ioc.ioc_id'))
@@ -439,6 +479,43 @@ class IocAssetLink(db.Model):
     asset = relationship('CaseAssets')
 
 
+class IocMention(db.Model):
+    __tablename__ = 'ioc_mention'
+    __table_args__ = (
+        Index('idx_ioc_mention_case_object', 'case_id', 'object_type', 'object_id'),
+        Index('idx_ioc_mention_ioc_case', 'ioc_id', 'case_id'),
+    )
+
+    mention_id = Column(BigInteger, primary_key=True)
+    case_id = Column(ForeignKey('cases.case_id'), nullable=False)
+    ioc_id = Column(ForeignKey('ioc.ioc_id', ondelete='CASCADE'), nullable=False)
+    object_type = Column(Text, nullable=False)
+    object_id = Column(Integer, nullable=False)
+    object_field = Column(Text, nullable=False)
+    mention_count = Column(Integer, nullable=False, default=1)
+
+    ioc = relationship('Ioc')
+
+
+class SearchDocument(db.Model):
+    """
+    Searchable text of a case object. Documents are refreshed from the objects as they change, see search_index_db
+    """
+    __tablename__ = 'search_document'
+    __table_args__ = (
+        Index('idx_search_document_object', 'object_type', 'object_id', 'case_id', unique=True),
+        Index('idx_search_document_vector', 'document_vector', postgresql_using='gin'),
+    )
+
+    document_id = Column(BigInteger, primary_key=True)
+    case_id = Column(ForeignKey('cases.case_id', ondelete='CASCADE'), nullable=False)
+    object_type = Column(Text, nullable=False)
+    object_id = Column(Integer, nullable=False)
+    document_title = Column(Text)
+    document_content = Column(Text)
+    document_vector = Column(TSVECTOR, nullable=False)
+
+
 class HashLink(db.Model):
     __tablename__ = 'hash_link'
 
@@ -497,8 +574,24 @@ class CasesAssetsExt(db.Model):
     case = relationship('Cases')
 
 
+# Text search configuration of the notes. The queries must use the same configuration as the search vector
+NOTES_SEARCH_CONFIG = 'english'
+# Postgres refuses tsvectors of 1 MB or more, so only the beginning of large notes (log dumps...) is indexed
+NOTES_SEARCH_MAX_LENGTH = 128 * 1024
+
+# Titles weighting more than contents
+NOTES_SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{NOTES_SEARCH_CONFIG}', coalesce(note_title, '')), 'A') || "
+    f"setweight(to_tsvector('{NOTES_SEARCH_CONFIG}', left(coalesce(note_content, ''), {NOTES_SEARCH_MAX_LENGTH})), 'B')"
+)
+
+
 class Notes(db.Model):
     __tablename__ = 'notes'
+    __table_args__ = (
+        Index('idx_notes_case_id', 'note_case_id'),
+        Index('idx_notes_search', 'note_search_vector', postgresql_using='gin')
+    )
 
     note_id = Column(Integer, primary_key=True)
     note_title = Column(String(155))
@@ -508,10 +601,37 @@ class Notes(db.Model):
     note_lastupdate = Column(DateTime)
     note_case_id = Column(ForeignKey('cases.case_id'))
     custom_attributes = Column(JSON)
+    note_version = Column(Integer, nullable=False, server_default=text('1'))
+    # Stored, so the ranking of the searches doesn't parse the notes again. Only loaded by the searches
+    note_search_vector = deferred(Column(TSVECTOR, Computed(NOTES_SEARCH_VECTOR_SQL, persisted=True)))
 
     user = relationship('User')
     case = relationship('Cases')
 
+    # Saves of a note which was updated since it was loaded fail with a StaleDataError
+    __mapper_args__ = {
+        'version_id_col': note_version
+    }
+
+
+class NoteRevision(db.Model):
+    """
+    Previous version of a note, stored as the patch reverting the save which replaced it
+    """
+    __tablename__ = 'note_revision'
+    __table_args__ = (
+        Index('idx_note_revision_note_version', 'note_id', 'note_version', unique=True),
+    )
+
+    revision_id = Column(BigInteger, primary_key=True)
+    note_id = Column(ForeignKey('notes.note_id', ondelete='CASCADE'), nullable=False)
+    note_version = Column(Integer, nullable=False)
+    revision_patch = Column(JSON, nullable=False)
+    revision_date = Column(DateTime, nullable=False)
+    revision_user = Column(ForeignKey('user.id'))
+
+    user = relationship('User')
+
 
 class NotesGroup(db.Model):
     __tablename__ = 'notes_group'
@@ -529,6 +649,9 @@ class NotesGroup(db.Model):
 
 class NotesGroupLink(db.Model):
     __tablename__ = 'notes_group_link'
+    __table_args__ = (
+        Index('idx_notes_group_link_case_id', 'case_id'),
+    )
 
     link_id = Column(Integer, primary_key=True)
     group_id = Column(ForeignKey('notes_group.group_id'))
@@ -556,8 +679,10 @@ class CaseReceivedFile(db.Model):
     filename = Column(Text)
     date_added = Column(DateTime)
     file_hash = Column(String(65))
+    file_md5 = Column(String(32))
+    file_sha1 = Column(String(40))
     file_description = Column(Text)
-    file_size = Column(Integer)
+    file_size = Column(BigInteger)
     case_id = Column(ForeignKey('cases.case_id'))
     user_id = Column(ForeignKey('user.id'))
     custom_attributes = Column(JSON)
@@ -626,6 +751,9 @@ class GlobalTasks(db.Model):
 
 class UserActivity(db.Model):
     __tablename__ = "user_activity"
+    __table_args__ = (
+        Index('idx_user_activity_case_date', 'case_id', 'activity_date'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(ForeignKey('user.id'), nullable=True)
@@ -757,6 +885,31 @@ class CeleryTaskMeta(db.Model):
         return str(self.id) + ' - ' + str(self.user)
 
 
+class CeleryTaskIndex(db.Model):
+    """
+    Summary of a Celery task, written when the task is published and when it ends. The DIM lists read it instead
+    of loading the results of the tasks from the backend
+    """
+    __tablename__ = 'celery_task_index'
+    __table_args__ = (
+        Index('idx_celery_task_index_date', 'task_date', 'id'),
+        Index('idx_celery_task_index_case_date', 'task_case_id', 'task_date'),
+        Index('idx_celery_task_index_user_date', 'task_user', 'task_date'),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    task_id = Column(String(155), nullable=False, unique=True)
+    task_name = Column(String(155))
+    task_module = Column(Text)
+    task_hook = Column(Text)
+    task_user = Column(Text)
+    task_case_id = Column(Integer)
+    task_status = Column(String(50), nullable=False)
+    task_success = Column(Boolean)
+    task_date = Column(DateTime, nullable=False)
+    task_date_done = Column(DateTime)
+
+
 def create_safe_attr(session, attribute_display_name, attribute_description, attribute_for, attribute_content):
     cat = CustomAttribute.query.filter(
         CustomAttribute.attribute_display_name == attribute_display_name,
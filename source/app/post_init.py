@@ -22,6 +22,8 @@ import random
 import secrets
 import string
 import os
+from datetime import datetime
+
 from alembic.config import Config
 from alembic import command, context
 
@@ -30,13 +32,17 @@ from sqlalchemy_utils import database_exists, create_database
 
 from app import db, bc, app, celery
 from app.configuration import SQLALCHEMY_BASE_URI
+from app.datamgmt.dim.dim_tasks_db import index_celery_task
 from app.datamgmt.iris_engine.modules_db import iris_module_disable_by_id
+from app.datamgmt.search.search_index_db import rebuild_search_index
 from app.iris_engine.module_handler.module_handler import instantiate_module_from_name, register_module, \
     check_module_health
+from app.iris_engine.utils.ioc_mentions import task_scan_ioc_mentions
 from app.models.cases import Cases, Client
 from app.models.models import Role, Languages, User, get_or_create, create_safe, UserRoles, OsType, Tlp, AssetsType, \
     IrisModule, EventCategory, AnalysisStatus, ReportType, IocType, TaskStatus, IrisHook, CustomAttribute, \
-    create_safe_attr, ServerSettings
+    create_safe_attr, ServerSettings, SearchDocument, CeleryTaskMeta, ObjectState
+from iris_interface.IrisInterfaceStatus import IIStatus
 
 log = app.logger
 
@@ -47,6 +53,10 @@ def run_post_init(development=False):
 
     if os.getenv("IRIS_WORKER") is None:
         # Setup database before everything
+        log.info("Creating database extensions")
+        db.session.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        db.session.commit()
+
         log.info("Creating all Iris tables")
         db.create_all(bind=None)
         db.session.commit()
@@ -62,6 +72,12 @@ def run_post_init(development=False):
         alembic_cfg.set_main_option('sqlalchemy.url',  SQLALCHEMY_BASE_URI + 'iris_db')
         command.upgrade(alembic_cfg, 'head')
 
+        log.info("Building search index")
+        create_safe_search_index()
+
+        log.info("Building tasks index")
+        create_safe_task_index()
+
         log.info("Creating base languages")
         create_safe_languages()
 
@@ -116,6 +132,9 @@ def run_post_init(development=False):
             client=client
         )
 
+        log.info("Scanning existing cases for IOC mentions")
+        create_safe_ioc_mentions()
+
     if development:
         if os.getenv("IRIS_WORKER") is None:
             log.warning("=================================")
@@ -295,6 +314,69 @@ def create_safe_hooks():
                 hook_description='Triggered on activities report creation, before download of the document')
 
 
+def create_safe_search_index():
+    # Index the objects created before the search index existed. It is kept up to date afterwards
+    if SearchDocument.query.first() is None:
+        rebuild_search_index()
+
+
+def _is_post_init_done(marker):
+    # One-time steps are marked done with a global object state, not bound to any case
+    return ObjectState.query.filter(
+        ObjectState.object_name == marker,
+        ObjectState.object_case_id.is_(None)
+    ).first() is not None
+
+
+def _set_post_init_done(marker):
+    db.session.add(ObjectState(object_name=marker, object_state=0, object_last_update=datetime.utcnow()))
+    db.session.commit()
+
+
+def create_safe_task_index(limit=1000):
+    # Index the last tasks ran before the tasks index existed, once. New tasks are indexed by the Celery signals,
+    # which can already have indexed some, so the index being empty is not a marker
+    if _is_post_init_done('post_init_task_index'):
+        return
+
+    for row in CeleryTaskMeta.query.order_by(CeleryTaskMeta.date_done.desc().nullslast()).limit(limit).all():
+        task = celery.AsyncResult(row.task_id)
+        try:
+            kwargs = task.kwargs
+            result = task.result
+
+        except AttributeError:
+            # Legacy task
+            kwargs = None
+            result = None
+
+        try:
+            success = result.is_success() if isinstance(result, IIStatus) else row.status == 'SUCCESS'
+        except Exception:
+            success = None
+
+        index_celery_task(row.task_id, row.status or 'UNKNOWN', task_name=row.name, kwargs=kwargs, success=success,
+                          date_done=row.date_done)
+
+    _set_post_init_done('post_init_task_index')
+
+
+def create_safe_ioc_mentions():
+    # Scan the events and notes saved before the IOC mentions existed, once. They are scanned on save afterwards
+    if _is_post_init_done('post_init_ioc_mentions'):
+        return
+
+    try:
+        for case in Cases.query.with_entities(Cases.case_id).all():
+            task_scan_ioc_mentions.delay(caseid=case.case_id)
+
+    except Exception as e:
+        log.warning(f'Unable to queue the IOC mentions scans, retrying on next start: {e}')
+        return
+
+    _set_post_init_done('post_init_ioc_mentions')
+
+
 def create_safe_languages():
     create_safe(db.session, Languages, name="french", code="FR")
     create_safe(db.session, Languages, name="english", code="EN")
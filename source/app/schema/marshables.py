@@ -34,6 +34,13 @@ from app.models import Cases, GlobalTasks, User, Client, Notes, NotesGroup, Case
     CaseReceivedFile, AssetsType, IocType, TaskStatus, AnalysisStatus, Tlp, EventCategory, ServerSettings
 
 
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
 class CaseNoteSchema(ma.SQLAlchemyAutoSchema):
     csrf_token = fields.String(required=False)
     group_id = fields.Integer()
@@ -42,6 +49,7 @@ class CaseNoteSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = Notes
         load_instance = True
+        exclude = ('note_search_vector',)
 
 
 class CaseAddNoteSchema(ma.Schema):
@@ -51,6 +59,7 @@ class CaseAddNoteSchema(ma.Schema):
     group_id = fields.Integer(required=True)
     csrf_token = fields.String(required=False)
     custom_attributes = fields.Dict(required=False)
+    note_version = fields.Integer(required=False)
 
     def verify_group_id(self, data, **kwargs):
         group = NotesGroup.query.filter(
@@ -89,12 +98,24 @@ class CaseAssetsSchema(ma.SQLAlchemyAutoSchema):
 
     @pre_load
     def verify_data(self, data, **kwargs):
-        asset_type = AssetsType.query.filter(AssetsType.asset_id == data.get('asset_type_id')).count()
+        # Bulk loads provide the valid IDs in the context to avoid querying them for each asset
+        asset_types = self.context.get('asset_types')
+        analysis_status = self.context.get('analysis_status')
+
+        if asset_types is not None:
+            asset_type = _int_or_none(data.get('asset_type_id')) in asset_types
+        else:
+            asset_type = AssetsType.query.filter(AssetsType.asset_id == data.get('asset_type_id')).count()
+
         if not asset_type:
             raise marshmallow.exceptions.ValidationError("Invalid asset type ID",
                                                          field_name="asset_type_id")
 
-        status = AnalysisStatus.query.filter(AnalysisStatus.id == data.get('analysis_status_id')).count()
+        if analysis_status is not None:
+            status = _int_or_none(data.get('analysis_status_id')) in analysis_status
+        else:
+            status = AnalysisStatus.query.filter(AnalysisStatus.id == data.get('analysis_status_id')).count()
+
         if not status:
             raise marshmallow.exceptions.ValidationError("Invalid analysis status ID",
                                                          field_name="analysis_status_id")
@@ -172,13 +193,25 @@ class EventSchema(ma.SQLAlchemyAutoSchema):
 
     @pre_load
     def verify_data(self, data, **kwargs):
-        event_cat = EventCategory.query.filter(EventCategory.id == data.get('event_category_id')).count()
+        # Batch loads provide the valid IDs in the context to avoid one query per event
+        categories = self.context.get('categories')
+        assets = self.context.get('assets')
+
+        if categories is not None:
+            event_cat = _int_or_none(data.get('event_category_id')) in categories
+        else:
+            event_cat = EventCategory.query.filter(EventCategory.id == data.get('event_category_id')).count()
+
         if not event_cat:
             raise marshmallow.exceptions.ValidationError("Invalid event category ID",
                                                          field_name="event_category_id")
 
-        for asset in data.get('event_assets'):
-            ast = CaseAssets.query.filter(CaseAssets.asset_id == asset).count()
+        for asset in data.get('event_assets') or []:
+            if assets is not None:
+                ast = _int_or_none(asset) in assets
+            else:
+                ast = CaseAssets.query.filter(CaseAssets.asset_id == asset).count()
+
             if not ast:
                 raise marshmallow.exceptions.ValidationError("Invalid assets ID",
                                                              field_name="event_assets")
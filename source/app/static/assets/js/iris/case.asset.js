@@ -416,9 +416,14 @@ function upload_assets() {
             success: function (data) {
                 jsdata = data;
                 if (jsdata.status == "success") {
-                    reload_assets();
                     $('#modal_upload_assets').modal('hide');
                     swal("Got news for you", data.message, "success");
+                    if (jsdata.data && jsdata.data.task_id) {
+                        /* Large files are imported in the background */
+                        poll_assets_upload(jsdata.data.task_id);
+                    } else {
+                        reload_assets();
+                    }
 
                 } else {
                     swal("Got bad news for you", data.message, "error");
@@ -435,6 +440,35 @@ function upload_assets() {
     return false;
 }
 
+function poll_assets_upload(task_id) {
+    $.ajax({
+        url: '/case/assets/upload/status/' + task_id + case_param(),
+        type: "GET",
+        dataType: "json",
+        success: function (data) {
+            if (data.status != 'success') {
+                return;
+            }
+            if (data.data.state == 'SUCCESS') {
+                reload_assets();
+                var result = data.data.result;
+                if (result.errors.length == 0) {
+                    notify_success('Imported ' + result.imported + ' assets');
+                } else {
+                    swal("Got news for you", 'Imported ' + result.imported + ' assets but we got errors with the following rows:\n- ' + result.errors.join('\n- '), "warning");
+                }
+            } else if (data.data.state == 'FAILURE') {
+                notify_error('Assets import failed: ' + data.data.result);
+            } else {
+                setTimeout(function() { poll_assets_upload(task_id); }, 2000);
+            }
+        },
+        error: function (error) {
+            notify_error(error.statusText);
+        }
+    });
+}
+
 function generate_sample_csv(){
     csv_data = "asset_name,asset_type_name,asset_description,asset_ip,asset_domain,asset_tags\n"
     csv_data += '"My computer","Mac - Computer","Computer of Mme Michu","192.168.15.5","iris.local","Compta|Mac"\n'
@@ -2,7 +2,7 @@
 function get_case_graph() {
 
     $.ajax({
-        url: 'graph/getdata' + case_param(),
+        url: 'graph/getdata' + case_param() + '&layout=1',
         type: "GET",
         dataType: "json",
         success: function (data) {
@@ -81,6 +81,12 @@ function redrawAll(data) {
     }
   };
 
+  if (data.layout) {
+      /* Positions are computed server side, no need to stabilize the graph */
+      options.physics = false;
+      options.layout = { randomSeed: 2, improvedLayout: false };
+  }
+
   nodes = data.nodes;
   edges = data.edges;
 
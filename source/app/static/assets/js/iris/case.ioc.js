@@ -346,6 +346,7 @@ function upload_ioc() {
         var data = new Object();
         data['csrf_token'] = $('#csrf_token').val();
         data['CSVData'] = fileData;
+        data['detect_types'] = $('#input_upload_ioc_detect_types').is(':checked');
         $.ajax({
             url: '/case/ioc/upload' + case_param(),
             type: "POST",
@@ -390,6 +390,12 @@ function note_detail(id) {
 
         target.innerHTML = html;
 
+        note_base_content = editor.getSession().getValue();
+        note_base_version = parseInt($("#info_note_modal_content").find('iris_noteversion').text());
+        if (isNaN(note_base_version)) {
+            note_base_version = null;
+        }
+
         edit_innote();
         load_menu_mod_options_modal(id, 'note', $("#note_modal_quick_actions"));
         $('#modal_note_detail').modal({ show: true, backdrop: 'static', keyboard: false });
@@ -411,9 +417,11 @@ function search_notes() {
         success: function (data) {
             if (data.status == 'success') {
                 $('#notes_search_list').empty();
-                for (e in data.data) {
+                notes = data.data.results;
+                for (e in notes) {
                     li = `<li class="list-group-item list-group-item-action">
-                    <span class="name" style="cursor:pointer" title="Click to open note" onclick="note_detail(`+ data.data[e]['note_id'] +`);">`+ data.data[e]['note_title'] +`</span>
+                    <span class="name" style="cursor:pointer" title="Click to open note" onclick="note_detail(`+ notes[e]['note_id'] +`);">`+ sanitizeHTML(notes[e]['note_title']) +`</span>
+                    <br/><small class="text-muted">`+ sanitizeHeadline(notes[e]['note_headline']) +`</small>
                     </li>`
                     $('#notes_search_list').append(li);
                 }
@@ -431,28 +439,83 @@ function search_notes() {
     });
 }
 
+/* Content and version of the opened note as last saved. Saves only send the changes made since then */
+var note_base_content = null;
+var note_base_version = null;
+
+/* Number of characters of a string as counted by the server, surrogate pairs being a single character */
+function code_points_length(str) {
+    var pairs = str.match(/[\uD800-\uDBFF][\uDC00-\uDFFF]/g);
+    return str.length - (pairs ? pairs.length : 0);
+}
+
+/* Patch turning the base content into the new one, from their common prefix and suffix */
+function note_patch(base, content) {
+    var prefix = 0;
+    var max_prefix = Math.min(base.length, content.length);
+    while (prefix < max_prefix && base.charCodeAt(prefix) === content.charCodeAt(prefix)) {
+        prefix++;
+    }
+    if (prefix > 0 && /[\uD800-\uDBFF]/.test(base.charAt(prefix - 1))) {
+        prefix--;
+    }
+
+    var suffix = 0;
+    var max_suffix = max_prefix - prefix;
+    while (suffix < max_suffix && base.charCodeAt(base.length - 1 - suffix) === content.charCodeAt(content.length - 1 - suffix)) {
+        suffix++;
+    }
+    if (suffix > 0 && /[\uDC00-\uDFFF]/.test(base.charAt(base.length - suffix))) {
+        suffix--;
+    }
+
+    return [{
+        'offset': code_points_length(base.substring(0, prefix)),
+        'delete': code_points_length(base.substring(prefix, base.length - suffix)),
+        'insert': content.substring(prefix, content.length - suffix)
+    }];
+}
+
 /* Save a note into db */
-function save_note(this_item) {
+function save_note(this_item, full_update) {
     var n_id = $("#info_note_modal_content").find('iris_notein').text();
 
     var data_sent = $('#form_note').serializeObject();
-    data_sent['note_content'] = $('#note_content').val();
+    var content = $('#note_content').val();
+    var url = '/case/notes/update/'+ n_id + case_param();
     ret = get_custom_attributes_fields();
     has_error = ret[0].length > 0;
     attributes = ret[1];
 
     if (has_error){return false;}
 
-    data_sent['custom_attributes'] = attributes;
+    if (!full_update && note_base_version !== null && note_base_content !== null) {
+        data_sent = {
+            'csrf_token': data_sent['csrf_token'],
+            'note_title': data_sent['note_title'],
+            'note_version': note_base_version,
+            'note_length': code_points_length(note_base_content),
+            'patch': note_patch(note_base_content, content)
+        };
+        url = '/case/notes/patch/'+ n_id + case_param();
+    } else {
+        data_sent['note_content'] = content;
+        data_sent['custom_attributes'] = attributes;
+        if (note_base_version !== null) {
+            data_sent['note_version'] = note_base_version;
+        }
+    }
 
     $.ajax({
-        url: '/case/notes/update/'+ n_id + case_param(),
+        url: url,
         type: "POST",
         dataType: "json",
         contentType: "application/json;charset=UTF-8",
         data: JSON.stringify(data_sent),
         success: function (data) {
             if (data.status == 'success') {
+                note_base_content = content;
+                note_base_version = data.data.note_version;
                 $('#btn_save_note').text("Saved").addClass('btn-success').removeClass('btn-danger').removeClass('btn-warning');
                 $('#last_saved').text('Changes saved').removeClass('badge-danger').addClass('badge-success');
             }
@@ -460,6 +523,17 @@ function save_note(this_item) {
         error: function (error) {
             $('#btn_save_note').text("Error saving!").removeClass('btn-success').addClass('btn-danger').removeClass('btn-danger');
             $('#last_saved').text('Error saving !').addClass('badge-danger').removeClass('badge-success');
+            if (error.status == 409) {
+                if (!full_update && error.responseJSON && error.responseJSON.data
+                    && error.responseJSON.data.note_version === note_base_version) {
+                    /* Same version but another base content, as the editor normalized the line endings of
+                       the stored note. The whole note is saved instead */
+                    save_note(this_item, true);
+                    return;
+                }
+                notify_error("The note was modified by someone else since it was opened. Copy your changes and reopen the note.");
+                return;
+            }
             propagate_form_api_errors(error.responseJSON.data);
         }
     });
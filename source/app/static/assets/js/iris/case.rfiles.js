@@ -11,7 +11,14 @@ $.each($.find("table"), function(index, element){
 
 Table = $("#rfiles_table").DataTable({
     dom: 'Blfrtip',
-    aaData: [],
+    serverSide: true,
+    deferLoading: 0,
+    ajax: serverSideAjax('/case/evidences/list', 'evidences', function (data) {
+        load_menu_mod_options('evidence', Table);
+        set_last_state(data.state);
+        hide_loader();
+        $('#rfiles_table_wrapper').show();
+    }),
     aoColumns: [
       {
         "data": "filename",
@@ -66,47 +73,17 @@ Table = $("#rfiles_table").DataTable({
 });
 $("#rfiles_table").css("font-size", 12);
 var buttons = new $.fn.dataTable.Buttons(Table, {
-     buttons: [
-        { "extend": 'csvHtml5', "text":'<i class="fas fa-cloud-download-alt"></i>',"className": 'btn btn-link text-white'
+     buttons: serverSideExportButtons(serverSideFetchAll('/case/evidences/list', 'evidences'), 'evidences',
+        { "text":'<i class="fas fa-cloud-download-alt"></i>',"className": 'btn btn-link text-white'
         , "titleAttr": 'Download as CSV' },
-        { "extend": 'copyHtml5', "text":'<i class="fas fa-copy"></i>',"className": 'btn btn-link text-white'
-        , "titleAttr": 'Copy' },
-    ]
+        { "text":'<i class="fas fa-copy"></i>',"className": 'btn btn-link text-white'
+        , "titleAttr": 'Copy' }
+    )
 }).container().appendTo($('#tables_button'));
 
-/* Retrieve the list of rfiles and build a datatable for each type of rfiles */
+/* Retrieve the current page of rfiles. Paging, sorting and filtering are done server side */
 function get_case_rfiles() {
-    $.ajax({
-        url: "/case/evidences/list" + case_param(),
-        type: "GET",
-        dataType: 'json',
-        success: function (response) {
-            if (response.status == 'success') {
-                if (response.data != null) {
-                    jsdata = response.data;
-                    Table.clear();
-                    Table.rows.add(jsdata.evidences);
-                    Table.columns.adjust().draw();
-
-                    load_menu_mod_options('evidence', Table);
-
-                    set_last_state(jsdata.state);
-                    hide_loader();
-
-                    $('#rfiles_table_wrapper').show();
-
-                } else {
-                    Table.clear().draw();
-                    swal("Oh no !", data.message, "error")
-                }
-            } else {
-                Table.clear().draw()
-            }
-        },
-        error: function (error) {
-            swal("Oh no !", error.statusText, "error")
-        }
-    });
+    Table.ajax.reload(null, false);
 }
 
 /* Edit an rfiles */
@@ -191,6 +168,27 @@ function delete_rfile(rfiles_id) {
     });
 }
 
+/* Hash and register the files of the evidences upload folder. The hashing runs on the worker */
+function register_uploaded_rfiles() {
+    $.ajax({
+        url: 'evidences/register' + case_param(),
+        type: "POST",
+        data: JSON.stringify({'csrf_token': $('#csrf_token').val()}),
+        contentType: "application/json;charset=UTF-8",
+        dataType: "json",
+        success: function (data) {
+            if (data.status == 'success') {
+                notify_success(data.data.filenames.length + " files are being hashed. They will appear once the task is done");
+            } else {
+                swal("Oh no !", data.message, "error")
+            }
+        },
+        error: function (error) {
+            swal("Oh no !", error.responseJSON ? error.responseJSON.message : error.statusText, "error")
+        }
+    });
+}
+
 /* Modal to add rfiles is closed, clear its contents */
 $('.modal').on('hidden.bs.modal', function () {
     $(this).find('form').trigger('reset');
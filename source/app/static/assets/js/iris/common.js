@@ -450,6 +450,13 @@ var sanitizeHTML = function (str) {
     }
 };
 
+/* Sanitize a text search snippet, keeping the <mark> tags wrapping the matches */
+var sanitizeHeadline = function (str) {
+    return sanitizeHTML(str).replace(/&#60;(&#47;)?mark&#62;/g, function (tag, closing) {
+        return closing ? '</mark>' : '<mark>';
+    });
+};
+
 function isWhiteSpace(s) {
   return /^\s+$/.test(s);
 }
@@ -41,19 +41,153 @@ function tableFiltering(api) {
                     var regexr = '({search})'; 
                     var cursorPosition = this.selectionStart;
                     // Search the column for that value
-                    api
-                        .column(colIdx)
-                        .search(
-                            this.value != ''
-                                ? regexr.replace('{search}', '(((' + this.value + ')))')
-                                : '',
-                            this.value != '',
-                            this.value == ''
-                        )
-                        .draw();
+                    if (api.page.info().serverSide) {
+                        // The server matches the plain value
+                        api.column(colIdx).search(this.value).draw();
+                    } else {
+                        api
+                            .column(colIdx)
+                            .search(
+                                this.value != ''
+                                    ? regexr.replace('{search}', '(((' + this.value + ')))')
+                                    : '',
+                                this.value != '',
+                                this.value == ''
+                            )
+                            .draw();
+                    }
                     $(this)
                         .focus()[0]
                         .setSelectionRange(cursorPosition, cursorPosition);
                 });
         });
-}
\ No newline at end of file
+}
+
+/* ajax option of a datatable in server-side processing mode. The server returns the page of rows
+   in the data_key of the response, and on_load is called with the data of each response */
+function serverSideAjax(url, data_key, on_load) {
+    return function (data, callback, settings) {
+        $.ajax({
+            url: url + case_param(),
+            type: "GET",
+            data: data,
+            dataType: 'json',
+            success: function (response) {
+                if (response.status == 'success' && response.data != null) {
+                    callback({
+                        draw: response.data.draw,
+                        recordsTotal: response.data.recordsTotal,
+                        recordsFiltered: response.data.recordsFiltered,
+                        data: response.data[data_key]
+                    });
+                    if (on_load) {
+                        on_load(response.data);
+                    }
+                } else {
+                    callback({draw: data.draw, recordsTotal: 0, recordsFiltered: 0, data: []});
+                    swal("Oh no !", response.message, "error");
+                }
+            },
+            error: function (error) {
+                callback({draw: data.draw, recordsTotal: 0, recordsFiltered: 0, data: []});
+                swal("Oh no !", error.statusText, "error");
+            }
+        });
+    };
+}
+
+/* Export source of a datatable using serverSideAjax. The rows matching the current filters and sorting
+   are fetched page by page from the list endpoint, then on_done is called with them */
+function serverSideFetchAll(url, data_key) {
+    return function (dt, on_done) {
+        var params = $.extend(true, {}, dt.ajax.params());
+        var page_length = 1000;
+        var rows = [];
+
+        function fetch_page(start) {
+            params.start = start;
+            params.length = page_length;
+            $.ajax({
+                url: url + case_param(),
+                type: "GET",
+                data: params,
+                dataType: 'json',
+                success: function (response) {
+                    if (response.status != 'success' || response.data == null) {
+                        swal("Oh no !", response.message, "error");
+                        return;
+                    }
+                    var page = response.data[data_key] || [];
+                    rows = rows.concat(page);
+                    if (page.length == page_length && rows.length < response.data.recordsFiltered) {
+                        fetch_page(start + page_length);
+                    } else {
+                        on_done(rows);
+                    }
+                },
+                error: function (error) {
+                    swal("Oh no !", error.statusText, "error");
+                }
+            });
+        }
+
+        fetch_page(0);
+    };
+}
+
+/* Format rows of a datatable as CSV (separator ',') or as tab separated text, from the data of its columns */
+function serverSideExportText(dt, rows, separator) {
+    var columns = dt.settings()[0].aoColumns.filter(function (column) {
+        return typeof column.mData === 'string';
+    });
+
+    function format_value(value) {
+        if (value === null || value === undefined) {
+            value = '';
+        } else if (typeof value === 'object') {
+            value = JSON.stringify(value);
+        }
+        value = String(value);
+        if (separator == ',') {
+            return '"' + value.replace(/"/g, '""') + '"';
+        }
+        return value.replace(/[\t\r\n]+/g, ' ');
+    }
+
+    var lines = [columns.map(function (column) {
+        return format_value($('<div>').html(column.sTitle).text());
+    }).join(separator)];
+
+    rows.forEach(function (row) {
+        lines.push(columns.map(function (column) {
+            return format_value(row[column.mData]);
+        }).join(separator));
+    });
+
+    return lines.join('\n');
+}
+
+/* CSV and copy buttons of a datatable in server-side processing mode. The table only holds the current page,
+   so the buttons export all the rows matching the current filters, read by fetch_all(dt, on_done) */
+function serverSideExportButtons(fetch_all, filename, csv_button, copy_button) {
+    return [
+        $.extend({}, csv_button, {
+            action: function (e, dt) {
+                fetch_all(dt, function (rows) {
+                    download_file(filename + '.csv', 'text/csv', serverSideExportText(dt, rows, ','));
+                });
+            }
+        }),
+        $.extend({}, copy_button, {
+            action: function (e, dt) {
+                fetch_all(dt, function (rows) {
+                    navigator.clipboard.writeText(serverSideExportText(dt, rows, '\t')).then(function () {
+                        notify_success(rows.length + ' rows copied');
+                    }, function (err) {
+                        notify_error('Unable to copy the rows');
+                    });
+                });
+            }
+        })
+    ];
+}
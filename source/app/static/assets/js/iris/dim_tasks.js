@@ -5,7 +5,12 @@ $.each($.find("table"), function(index, element){
 
 Table = $("#activities_table").DataTable({
     dom: 'Blfrtip',
-    aaData: [],
+    serverSide: true,
+    deferLoading: 0,
+    ajax: serverSideAjax('/dim/tasks/list', 'tasks', function (data) {
+        $('#feed_last_updated').text("Last updated: " + new Date().toLocaleTimeString());
+        hide_loader();
+    }),
     bSort: false,
     aoColumns: [
 
@@ -56,36 +61,16 @@ Table = $("#activities_table").DataTable({
     initComplete: function () {
         tableFiltering(this.api());
     },
-    buttons: [
-    { "extend": 'csvHtml5', "text":'Export',"className": 'btn btn-primary btn-border btn-round btn-sm float-left mr-4 mt-2' },
-    { "extend": 'copyHtml5', "text":'Copy',"className": 'btn btn-primary btn-border btn-round btn-sm float-left mr-4 mt-2' },
-    ]
+    buttons: serverSideExportButtons(serverSideFetchAll('/dim/tasks/list', 'tasks'), 'tasks',
+        { "text":'Export',"className": 'btn btn-primary btn-border btn-round btn-sm float-left mr-4 mt-2' },
+        { "text":'Copy',"className": 'btn btn-primary btn-border btn-round btn-sm float-left mr-4 mt-2' }
+    )
 });
 $("#activities_table").css("font-size", 12);
 
 
 function get_activities () {
-    $.ajax({
-        url: '/dim/tasks/list' + case_param(),
-        type: "GET",
-        dataType: "json",
-        success: function (data) {
-            jsdata = data;
-            if (jsdata.status == "success") {
-                content = jsdata.data;
-                Table.clear();
-                Table.rows.add(content);
-                Table.columns.adjust().draw();
-                $('#feed_last_updated').text("Last updated: " + new Date().toLocaleTimeString());
-                hide_loader();
-            } else {
-                $('#modal_customer_message').text(jsdata.message);
-            }
-        },
-        error: function (error) {
-            notify_error(error);
-        }
-    });
+    Table.ajax.reload(null, false);
 }
 
 
@@ -9,9 +9,26 @@ $('#search_value').keypress(function(event){
 });
 
 
+var ioc_search = null;
+var global_search = null;
+
+/* Maximum number of results of each type in a global search */
+var SEARCH_PER_TYPE_LIMIT = 100;
+
+var search_object_labels = {
+    'ioc': 'IOC', 'asset': 'Asset', 'event': 'Event', 'task': 'Task', 'evidence': 'Evidence', 'note': 'Note'
+};
+
+/* Case pages listing each type of object */
+var search_object_pages = {
+    'ioc': 'ioc', 'asset': 'assets', 'event': 'timeline', 'task': 'tasks', 'evidence': 'evidences', 'note': 'notes'
+};
+
 Table_1 = $("#file_search_table_1").DataTable({
     dom: 'Bfrtip',
-    aaData: [],
+    serverSide: true,
+    deferLoading: 0,
+    ajax: search_iocs_page,
     aoColumns: [
       { "data": "ioc_name",
        "render": function (data, type, row, meta) {
@@ -67,18 +84,76 @@ Table_1 = $("#file_search_table_1").DataTable({
         }
       }
     ],
-    filter: true,
+    filter: false,
     info: true,
-    ordering: true,
+    ordering: false,
     processing: true,
     retrieve: true,
-    buttons: [
-    { "extend": 'csvHtml5', "text":'Export',"className": 'btn btn-primary btn-border btn-round btn-sm float-left mr-4 mt-2' },
-    { "extend": 'copyHtml5', "text":'Copy',"className": 'btn btn-primary btn-border btn-round btn-sm float-left mr-4 mt-2' },
-    ]
+    buttons: serverSideExportButtons(search_fetch_all(function () { return ioc_search; }), 'iocs_search',
+        { "text":'Export',"className": 'btn btn-primary btn-border btn-round btn-sm float-left mr-4 mt-2' },
+        { "text":'Copy',"className": 'btn btn-primary btn-border btn-round btn-sm float-left mr-4 mt-2' }
+    )
 });
 $("#file_search_table_1").css("font-size", 12);
 
+Table_3 = $("#file_search_table_3").DataTable({
+    dom: 'Bfrtip',
+    serverSide: true,
+    deferLoading: 0,
+    ajax: search_objects_page,
+    aoColumns: [
+      { "data": "object_type",
+        "render": function (data, type, row, meta) {
+            if (type === 'display') {
+                data = '<span class="badge badge-light">' + sanitizeHTML(search_object_labels[data] || data) + '</span>';
+            }
+            return data;
+          }
+      },
+      { "data": "document_title",
+        "render": function (data, type, row, meta) {
+            if (type === 'display') {
+                data = sanitizeHTML(data);
+                if (row['object_type'] == 'note') {
+                    data = '<span style="cursor:pointer" title="Click to open note" onclick="note_detail(' + row['object_id'] + ');">' + data + '</span>';
+                }
+            }
+            return data;
+          }
+      },
+      { "data": "document_headline",
+        "render": function (data, type, row, meta) {
+            if (type === 'display') { data = '<small>' + sanitizeHeadline(data) + '</small>';}
+            return data;
+          }
+      },
+      { "data": "case_name",
+        "render": function (data, type, row, meta) {
+            if (type === 'display') {
+                data = '<a href="/case/' + search_object_pages[row['object_type']] + '?cid=' + row['case_id'] + '">' + sanitizeHTML(data) + '</a>';
+            }
+            return data;
+          }
+      },
+      { "data": "client_name",
+        "render": function (data, type, row, meta) {
+            if (type === 'display') { data = sanitizeHTML(data);}
+            return data;
+          }
+      }
+    ],
+    filter: false,
+    info: true,
+    ordering: false,
+    processing: true,
+    retrieve: true,
+    buttons: serverSideExportButtons(search_fetch_all(function () { return global_search; }), 'search',
+        { "text":'Export',"className": 'btn btn-primary btn-border btn-round btn-sm float-left mr-4 mt-2' },
+        { "text":'Copy',"className": 'btn btn-primary btn-border btn-round btn-sm float-left mr-4 mt-2' }
+    )
+});
+$("#file_search_table_3").css("font-size", 12);
+
 
 
 $('#submit_search').click(function () {
@@ -86,10 +161,194 @@ $('#submit_search').click(function () {
 });
 
 
+/* Export source of the search tables. All the results of the current search are fetched page by page */
+function search_fetch_all(get_search) {
+    return function (dt, on_done) {
+        var search = get_search();
+        var per_page = 500;
+        var rows = [];
+        if (search == null) {
+            on_done(rows);
+            return;
+        }
+
+        function fetch_page(page) {
+            var data_sent = Object.assign({}, search);
+            data_sent['page'] = page;
+            data_sent['per_page'] = per_page;
+            $.ajax({
+                url: '/search' + case_param(),
+                type: "POST",
+                data: JSON.stringify(data_sent),
+                contentType: "application/json;charset=UTF-8",
+                dataType: "json",
+                success: function (data_resp) {
+                    if (data_resp.status != "success") {
+                        notify_error(data_resp.message);
+                        return;
+                    }
+                    rows = rows.concat(data_resp.data.results);
+                    if (data_resp.data.results.length == per_page && rows.length < data_resp.data.total) {
+                        fetch_page(page + 1);
+                    } else {
+                        on_done(rows);
+                    }
+                },
+                error: function (error) {
+                    notify_error(error.responseJSON.message);
+                }
+            });
+        }
+
+        fetch_page(1);
+    };
+}
+
+/* Fetch a page of IOC results. Paging is done server side */
+function search_iocs_page(data, callback, settings) {
+    if (ioc_search == null) {
+        callback({draw: data.draw, recordsTotal: 0, recordsFiltered: 0, data: []});
+        return;
+    }
+
+    var data_sent = Object.assign({}, ioc_search);
+    data_sent['page'] = Math.floor(data.start / data.length) + 1;
+    data_sent['per_page'] = data.length;
+
+    $.ajax({
+        url: '/search' + case_param(),
+        type: "POST",
+        data: JSON.stringify(data_sent),
+        contentType: "application/json;charset=UTF-8",
+        dataType: "json",
+        beforeSend: function () {
+            $('#submit_search').text("Searching...");
+        },
+        complete: function () {
+            $('#submit_search').text("Search");
+        },
+        success: function (data_resp) {
+            if (data_resp.status == "success") {
+                callback({
+                    draw: data.draw,
+                    recordsTotal: data_resp.data.total,
+                    recordsFiltered: data_resp.data.total,
+                    data: data_resp.data.results
+                });
+                $('#search_table_wrapper_1').show();
+            } else {
+                callback({draw: data.draw, recordsTotal: 0, recordsFiltered: 0, data: []});
+            }
+        },
+        error: function (error) {
+            callback({draw: data.draw, recordsTotal: 0, recordsFiltered: 0, data: []});
+            notify_error(error.responseJSON.message);
+        }
+    });
+}
+
+/* Fetch a page of global search results, ranked across all the types of objects */
+function search_objects_page(data, callback, settings) {
+    if (global_search == null) {
+        callback({draw: data.draw, recordsTotal: 0, recordsFiltered: 0, data: []});
+        return;
+    }
+
+    var data_sent = Object.assign({}, global_search);
+    data_sent['page'] = Math.floor(data.start / data.length) + 1;
+    data_sent['per_page'] = data.length;
+
+    $.ajax({
+        url: '/search' + case_param(),
+        type: "POST",
+        data: JSON.stringify(data_sent),
+        contentType: "application/json;charset=UTF-8",
+        dataType: "json",
+        beforeSend: function () {
+            $('#submit_search').text("Searching...");
+        },
+        complete: function () {
+            $('#submit_search').text("Search");
+        },
+        success: function (data_resp) {
+            if (data_resp.status == "success") {
+                callback({
+                    draw: data.draw,
+                    recordsTotal: data_resp.data.total,
+                    recordsFiltered: data_resp.data.total,
+                    data: data_resp.data.results
+                });
+                render_search_facets(data_resp.data.facets);
+                $('#search_table_wrapper_3').show();
+            } else {
+                callback({draw: data.draw, recordsTotal: 0, recordsFiltered: 0, data: []});
+            }
+        },
+        error: function (error) {
+            callback({draw: data.draw, recordsTotal: 0, recordsFiltered: 0, data: []});
+            notify_error(error.responseJSON.message);
+        }
+    });
+}
+
+/* Number of matches per type. Clicking a type restricts the results to the selected types */
+function render_search_facets(facets) {
+    var selected = global_search['object_types'] || [];
+    $('#search_facets').empty();
+
+    for (var object_type in facets) {
+        var badge = selected.includes(object_type) ? 'badge-primary' : 'badge-light';
+        $('#search_facets').append(
+            '<span class="badge ' + badge + ' mr-2" style="cursor:pointer" onclick="toggle_search_facet(\'' + object_type + '\');">'
+            + sanitizeHTML(search_object_labels[object_type] || object_type) + ' <b>' + facets[object_type] + '</b></span>'
+        );
+    }
+}
+
+function toggle_search_facet(object_type) {
+    var selected = global_search['object_types'] || [];
+    var index = selected.indexOf(object_type);
+
+    if (index >= 0) {
+        selected.splice(index, 1);
+    } else {
+        selected.push(object_type);
+    }
+
+    global_search['object_types'] = selected.length ? selected : null;
+    Table_3.ajax.reload();
+}
+
+$('#search_table_wrapper_1').on('click', function(e){
+    if($('.popover').length>1)
+        $('.popover').popover('hide');
+        $(e.target).popover('toggle');
+});
+
 function search() {
     var data_sent = $('form#form_search').serializeObject();
     data_sent['csrf_token'] = $('#csrf_token').val();
 
+    if (data_sent['search_type'] == "all") {
+        $('#notes_msearch_list').empty();
+        $('#search_table_wrapper_1').hide();
+        $('#search_table_wrapper_2').hide();
+        data_sent['per_type_limit'] = SEARCH_PER_TYPE_LIMIT;
+        global_search = data_sent;
+        Table_3.ajax.reload();
+        return;
+    }
+
+    $('#search_table_wrapper_3').hide();
+
+    if (data_sent['search_type'] == "ioc") {
+        $('#notes_msearch_list').empty();
+        $('#search_table_wrapper_2').hide();
+        ioc_search = data_sent;
+        Table_1.ajax.reload();
+        return;
+    }
+
     $.ajax({
         url: '/search' + case_param(),
         type: "POST",
@@ -110,21 +369,12 @@ function search() {
                   $('#search_table_wrapper_1').hide();
                   $('#search_table_wrapper_2').hide();
                 val = $("input[type='radio']:checked").val();
-                if (val == "ioc") {
-                    Table_1.rows.add(data.data);
-                    Table_1.columns.adjust().draw();
-                    $('#search_table_wrapper_1').show();
-
-                    $('#search_table_wrapper_1').on('click', function(e){
-                        if($('.popover').length>1)
-                            $('.popover').popover('hide');
-                            $(e.target).popover('toggle');
-                    });
-                }
-                else if (val == "notes") {
-                    for (e in data.data) {
+                if (val == "notes") {
+                    notes = data.data.results;
+                    for (e in notes) {
                         li = `<li class="list-group-item">
-                        <span class="name" style="cursor:pointer" title="Click to open note" onclick="note_detail(`+ data.data[e]['note_id'] +`);">`+ sanitizeHTML(data.data[e]['note_title']) + ` - ` + sanitizeHTML(data.data[e]['case_name']) + ` - ` + sanitizeHTML(data.data[e]['client_name']) +`</span>
+                        <span class="name" style="cursor:pointer" title="Click to open note" onclick="note_detail(`+ notes[e]['note_id'] +`);">`+ sanitizeHTML(notes[e]['note_title']) + ` - ` + sanitizeHTML(notes[e]['case_name']) + ` - ` + sanitizeHTML(notes[e]['client_name']) +`</span>
+                        <br/><small class="text-muted">`+ sanitizeHeadline(notes[e]['note_headline']) +`</small>
                         </li>`
                         $('#notes_msearch_list').append(li);
                     }
@@ -20,6 +20,7 @@
 
 import datetime
 import decimal
+import hashlib
 import pickle
 import random
 import shutil
@@ -43,6 +44,7 @@ from app import app, db, TEMPLATE_PATH
 
 # build a Json response
 from app.datamgmt.case.case_db import get_case
+from app.datamgmt.states import get_object_states
 from app.models import Cases
 
 
@@ -341,6 +343,49 @@ def api_admin_required(f):
     return wrap
 
 
+def state_etag(*object_names, extra_keys=()):
+    """
+    Answer conditional GET requests of a case list endpoint from the states of the listed objects.
+    The ETag is built from the case ID, the states of object_names, the extra keys, the user and the query
+    string. If the client already holds it, a 304 is returned without running the endpoint.
+    Needs to be placed below api_login_required, which provides the case ID.
+    :param object_names: Names of the objects states the content of the endpoint depends on
+    :param extra_keys: Callables taking the case ID and returning a key of the other data the content of the
+                       endpoint depends on, such as the states of other cases
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrap(*args, **kwargs):
+            caseid = kwargs.get('caseid')
+            states = get_object_states(object_names, caseid=caseid)
+
+            etag_base = "{}|{}|{}|{}|{}".format(
+                caseid,
+                current_user.id,
+                ",".join("{}={}".format(name, states.get(name)) for name in object_names),
+                ",".join(str(extra_key(caseid)) for extra_key in extra_keys),
+                request.query_string.decode('utf-8', errors='replace')
+            )
+            etag = hashlib.sha1(etag_base.encode('utf-8')).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                rsp = app.response_class(status=304)
+
+            else:
+                rsp = f(*args, **kwargs)
+                if rsp.status_code != 200:
+                    return rsp
+
+            rsp.set_etag(etag)
+            rsp.headers['Cache-Control'] = 'private, no-cache'
+
+            return rsp
+
+        return wrap
+
+    return decorator
+
+
 def decompress_7z(filename: Path, output_dir):
     """
     Decompress a 7z file in specified output directory
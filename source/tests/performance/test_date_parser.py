@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from app.iris_engine.utils.date_parser import DATE_FORMATS, convert_date, format_parsed_date
+
+
+def bruteforce_convert_date(date_value):
+    """
+    Previous implementation of the date conversion, kept as the benchmark baseline
+    """
+    date_value = date_value.strip()
+
+    if len(date_value) == 10 and date_value.isdigit():
+        return format_parsed_date(datetime.fromtimestamp(int(date_value)))
+
+    if len(date_value) == 13 and date_value.isdigit():
+        return format_parsed_date(datetime.fromtimestamp(int(date_value) / 1000))
+
+    for fmt in DATE_FORMATS:
+        try:
+            return format_parsed_date(datetime.strptime(date_value, fmt))
+        except ValueError:
+            pass
+
+    return None
+
+
+class TestDateParser(TestCase):
+    SAMPLE_FORMATS = ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S%z', '%b %d %H:%M:%S', '%d/%m/%Y %H:%M:%S',
+                      '%a, %d %b %Y %H:%M:%S', '%d %b %y %H:%M', '%A %B %d %Y', '%Y-%d-%m %H:%M')
+
+    @classmethod
+    def _build_samples(cls, count):
+        random.seed(42)
+        start = datetime(2015, 1, 1)
+        samples = []
+        for _ in range(count):
+            date = start + timedelta(seconds=random.randrange(10 ** 9), microseconds=random.randrange(10 ** 6))
+            fmt = random.choice(cls.SAMPLE_FORMATS)
+            samples.append(date.strftime(fmt.replace('%z', '+0200')))
+
+        samples.extend(['1650000000', '1650000000123', 'not a date', '2021-13-01', '2021-01-13'])
+        return samples
+
+    def test_same_results_as_bruteforce(self):
+        samples = self._build_samples(2000)
+        for value in samples:
+            self.assertEqual(convert_date(value), bruteforce_convert_date(value), value)
+
+    def test_throughput(self):
+        samples = self._build_samples(20000)
+
+        start = time.perf_counter()
+        baseline = [bruteforce_convert_date(value) for value in samples]
+        baseline_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [convert_date(value) for value in samples]
+        engine_time = time.perf_counter() - start
+
+        logging.info(f"Bruteforce: {len(samples) / baseline_time:.0f} dates/s - "
+                     f"Shape cache: {len(samples) / engine_time:.0f} dates/s")
+
+        self.assertEqual(results, baseline)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from app.iris_engine.utils.evidence_hasher import hash_evidence_file, hash_evidence_files
+from app.iris_engine.utils.evidence_registration import match_registered_hash
+
+
+def sequential_hash(path):
+    """
+    One read of the file per algorithm. Kept as the benchmark baseline
+    """
+    result = {}
+    for name in ('md5', 'sha1', 'sha256'):
+        digest = hashlib.new(name)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+
+        result[name] = digest.hexdigest()
+
+    result['size'] = os.path.getsize(path)
+    return result
+
+
+class TestEvidenceHasher(TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for index, size in enumerate((0, 1, 3 * 1024 * 1024 + 17, 32 * 1024 * 1024)):
+            path = os.path.join(self._dir.name, f'evidence_{index}.bin')
+            with open(path, 'wb') as f:
+                f.write(os.urandom(size))
+
+            self.paths.append(path)
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def test_same_hashes_as_hashlib(self):
+        for path in self.paths:
+            self.assertEqual(hash_evidence_file(path, chunk_size=1024 * 1024), sequential_hash(path))
+            self.assertEqual(hash_evidence_file(path, threaded=False), sequential_hash(path))
+
+    def test_pool(self):
+        missing = os.path.join(self._dir.name, 'missing.bin')
+        results = hash_evidence_files(self.paths + [missing], processes=2)
+
+        self.assertEqual([path for path, _, _ in results], self.paths + [missing])
+        for path, hashes, error in results[:-1]:
+            self.assertIsNone(error)
+            self.assertEqual(hashes, sequential_hash(path))
+
+        self.assertIsNone(results[-1][1])
+        self.assertIsNotNone(results[-1][2])
+
+    def test_registered_hash_match(self):
+        hashes = hash_evidence_file(self.paths[2])
+
+        for name in ('md5', 'sha1', 'sha256'):
+            self.assertTrue(match_registered_hash(hashes[name], hashes))
+            self.assertTrue(match_registered_hash(f' {hashes[name].upper()} ', hashes))
+
+        self.assertTrue(match_registered_hash('', hashes))
+        self.assertTrue(match_registered_hash(None, hashes))
+        self.assertFalse(match_registered_hash(hash_evidence_file(self.paths[1])['sha256'], hashes))
+
+    def test_throughput(self):
+        path = self.paths[-1]
+
+        start = time.perf_counter()
+        baseline = sequential_hash(path)
+        baseline_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hashes = hash_evidence_file(path)
+        hasher_time = time.perf_counter() - start
+
+        logging.info(f"One read per algorithm: {baseline_time:.3f}s - Single pass: {hasher_time:.3f}s")
+
+        self.assertEqual(hashes, baseline)
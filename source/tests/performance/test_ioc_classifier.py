@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import logging
+import random
+import re
+import time
+from unittest import TestCase
+
+from app.iris_engine.utils.ioc_classifier import IOC_TYPE_PATTERNS, IocTypeClassifier
+
+TYPES_MAP = {type_name.lower(): type_id for type_id, (type_name, _) in enumerate(IOC_TYPE_PATTERNS, start=1)}
+
+
+def sequential_detect(value):
+    """
+    One regex per type, tried in order. Kept as the benchmark baseline
+    """
+    for type_name, pattern in IOC_TYPE_PATTERNS:
+        if re.fullmatch(pattern, value.strip(), re.IGNORECASE | re.MULTILINE):
+            return type_name, TYPES_MAP[type_name.lower()]
+
+    return None
+
+
+class TestIocClassifier(TestCase):
+    SAMPLES = {
+        '8.8.8.8': 'ip-any',
+        '2001:db8::1': 'ip-any',
+        '10.0.0.1:445': 'ip-dst|port',
+        '300.0.0.1': None,
+        'd41d8cd98f00b204e9800998ecf8427e': 'md5',
+        'DA39A3EE5E6B4B0D3255BFEF95601890AFD80709': 'sha1',
+        'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855': 'sha256',
+        'wannacry.exe': 'filename',
+        'evil.example.com': 'domain',
+        'evil.example.com:8443': 'hostname|port',
+        'john.doe@evil.com': 'email',
+        'https://evil.com/payload?id=1': 'url',
+        'HKLM\\Software\\Microsoft\\Windows\\CurrentVersion\\Run': 'regkey',
+        'C:\\Users\\Public\\a.exe': 'file-path',
+        'CVE-2021-44228': 'vulnerability',
+        '00:1a:2b:3c:4d:5e': 'mac-address',
+        'rule test { condition: true }': 'yara',
+        'just some text': None
+    }
+
+    def test_samples(self):
+        classifier = IocTypeClassifier(TYPES_MAP)
+        for value, expected in self.SAMPLES.items():
+            detected = classifier.detect(value)
+            self.assertEqual(detected[0] if detected else None, expected, value)
+
+    def test_unknown_types_are_skipped(self):
+        types_map = dict(TYPES_MAP)
+        del types_map['md5']
+
+        self.assertIsNone(IocTypeClassifier(types_map).detect('d41d8cd98f00b204e9800998ecf8427e'))
+
+    def test_throughput(self):
+        random.seed(42)
+        values = [f'{random.choice(list(self.SAMPLES))}{random.randrange(3)}' for _ in range(20000)]
+        values += list(self.SAMPLES)
+
+        start = time.perf_counter()
+        baseline = [sequential_detect(value) for value in values]
+        baseline_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = IocTypeClassifier(TYPES_MAP).classify(values)
+        classifier_time = time.perf_counter() - start
+
+        logging.info(f"Sequential: {len(values) / baseline_time:.0f} values/s - "
+                     f"Combined: {len(values) / classifier_time:.0f} values/s")
+
+        self.assertEqual(results, baseline)
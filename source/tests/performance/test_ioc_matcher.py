@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import logging
+import random
+import re
+import time
+from unittest import TestCase
+
+from app.iris_engine.utils.ioc_matcher import IocMatcher
+
+
+def regex_find(iocs, text):
+    """
+    One regex per IOC, as the timeline used to do in the browser. Kept as the benchmark baseline
+    """
+    counts = {}
+    text = text.lower()
+    for ioc_id, ioc_value in iocs:
+        pattern = re.compile(r'(?<![\w])' + re.escape(ioc_value.lower()) + r'(?![\w])')
+        count = len(pattern.findall(text))
+        if count:
+            counts[ioc_id] = count
+
+    return counts
+
+
+class TestIocMatcher(TestCase):
+    @staticmethod
+    def _build_iocs(count):
+        random.seed(42)
+        iocs = []
+        for ioc_id in range(count):
+            kind = ioc_id % 3
+            if kind == 0:
+                value = '.'.join(str(random.randrange(256)) for _ in range(4))
+            elif kind == 1:
+                value = ''.join(random.choice('0123456789abcdef') for _ in range(32))
+            else:
+                value = ''.join(random.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(8)) + '.com'
+
+            iocs.append((ioc_id, value))
+
+        return iocs
+
+    @staticmethod
+    def _build_text(iocs, words):
+        mentioned = random.sample(iocs, 50)
+        parts = []
+        for index in range(words):
+            if index % 100 == 0:
+                parts.append(random.choice(mentioned)[1].upper())
+            else:
+                parts.append(random.choice(('connection', 'from', 'to', 'user', 'process', 'file', '10.0.0.1')))
+
+        return ' '.join(parts)
+
+    def test_word_boundaries(self):
+        matcher = IocMatcher([(1, '1.2.3.4'), (2, 'evil.com'), (3, 'ab'), (4, 'abcd'), (5, 'bcd')])
+
+        self.assertEqual(matcher.find('seen 1.2.3.4, 11.2.3.45 and 1.2.3.40'), {1: 1})
+        self.assertEqual(matcher.find('http://EVIL.com/x notevil.com evil.com_'), {2: 1})
+        self.assertEqual(matcher.find('ab abcd bcd'), {4: 1, 5: 1})
+        self.assertEqual(matcher.find(''), {})
+        self.assertEqual(matcher.find(None), {})
+
+    def test_same_results_as_regex(self):
+        iocs = self._build_iocs(300)
+        text = self._build_text(iocs, 5000)
+
+        self.assertEqual(IocMatcher(iocs).find(text), regex_find(iocs, text))
+
+    def test_throughput(self):
+        iocs = self._build_iocs(1000)
+        text = self._build_text(iocs, 10000)
+
+        start = time.perf_counter()
+        baseline = regex_find(iocs, text)
+        baseline_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = IocMatcher(iocs).find(text)
+        matcher_time = time.perf_counter() - start
+
+        logging.info(f"Regex per IOC: {baseline_time:.3f}s - Aho-Corasick: {matcher_time:.3f}s")
+
+        self.assertEqual(results, baseline)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+
+import logging
+import random
+import time
+from unittest import TestCase
+
+from app.iris_engine.utils.note_patch import NotePatchError, apply_note_patch, diff_note_content, \
+    reverse_note_patch, validate_note_patch
+
+
+class TestNotePatch(TestCase):
+    def test_apply_and_reverse(self):
+        base = 'Lateral movement from 10.0.0.1 🙂 to the DC'
+        patch = [{'offset': 22, 'delete': 8, 'insert': '10.0.0.2'}, {'offset': 32, 'delete': 0, 'insert': '!'}]
+
+        operations = validate_note_patch(patch, len(base))
+        patched = apply_note_patch(base, operations)
+        self.assertEqual(patched, 'Lateral movement from 10.0.0.2 🙂! to the DC')
+
+        deleted = [base[offset:offset + delete] for offset, delete, _ in operations]
+        reverse = validate_note_patch(reverse_note_patch(operations, deleted), len(patched))
+        self.assertEqual(apply_note_patch(patched, reverse), base)
+
+    def test_invalid_patches(self):
+        for patch in ({'offset': 0}, [{'offset': 5, 'delete': 1}, {'offset': 2, 'delete': 1}],
+                      [{'offset': 8, 'delete': 5}], [{'offset': -1}], [{'offset': True}], ['x']):
+            with self.assertRaises(NotePatchError):
+                validate_note_patch(patch, 10)
+
+    def test_diff(self):
+        random.seed(42)
+        for _ in range(2000):
+            old = ''.join(random.choice('ab🙂') for _ in range(random.randrange(8)))
+            new = ''.join(random.choice('ab🙂') for _ in range(random.randrange(8)))
+
+            operations = validate_note_patch(diff_note_content(old, new), len(old))
+            self.assertEqual(apply_note_patch(old, operations), new)
+
+    def test_patch_size(self):
+        base = 'x' * 5_000_000
+        new = base[:2_500_000] + 'edited' + base[2_500_000:]
+
+        start = time.perf_counter()
+        patch = diff_note_content(base, new)
+        elapsed = time.perf_counter() - start
+
+        logging.info(f"Diff of a {len(base)} characters note: {elapsed:.3f}s")
+
+        self.assertEqual(patch, [{'offset': 2_500_000, 'delete': 0, 'insert': 'edited'}])
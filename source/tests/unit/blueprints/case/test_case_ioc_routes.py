@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import re
+from unittest import TestCase
+
+from app import app
+from app.models.models import IocType, Tlp
+from tests.test_helper import TestHelper
+
+app.testing = True
+
+
+class TestCaseIocRoutes(TestCase):
+    def setUp(self) -> None:
+        self._test_helper = TestHelper()
+
+    def test_case_list_ioc_should_return_304_if_etag_matches(self):
+        with app.test_client() as test_app:
+            self._test_helper.log_in(test_app)
+
+            result = test_app.get('/case/ioc/list?cid=1')
+            self.assertEqual(200, result.status_code)
+            self.assertIsNotNone(result.headers.get('ETag'))
+
+            result2 = test_app.get('/case/ioc/list?cid=1', headers={'If-None-Match': result.headers.get('ETag')})
+            self.assertEqual(304, result2.status_code)
+
+    def test_case_update_ioc_should_refuse_the_value_and_type_of_an_existing_ioc(self):
+        with app.test_client() as test_app:
+            self._test_helper.log_in(test_app)
+
+            page = test_app.get('/case/ioc?cid=1')
+            csrf_token = re.search(r'id="csrf_token" name="csrf_token" type="hidden" value="(.*?)"',
+                                   str(page.data)).group(1)
+
+            with app.app_context():
+                ioc_type_id = IocType.query.filter(IocType.type_name == 'domain').first().type_id
+                ioc_tlp_id = Tlp.query.filter(Tlp.tlp_name == 'amber').first().tlp_id
+
+            ioc_ids = []
+            for ioc_value in ['duplicate-target.example.com', 'duplicate-source.example.com']:
+                result = test_app.post('/case/ioc/add?cid=1', json={
+                    'csrf_token': csrf_token,
+                    'ioc_value': ioc_value,
+                    'ioc_type_id': ioc_type_id,
+                    'ioc_tlp_id': ioc_tlp_id,
+                    'ioc_description': '',
+                    'ioc_tags': ''
+                })
+                self.assertEqual(200, result.status_code)
+                ioc_ids.append(result.json['data']['ioc_id'])
+
+            result = test_app.post(f'/case/ioc/update/{ioc_ids[1]}?cid=1', json={
+                'csrf_token': csrf_token,
+                'ioc_value': 'duplicate-target.example.com',
+                'ioc_type_id': ioc_type_id,
+                'ioc_tlp_id': ioc_tlp_id,
+                'ioc_description': '',
+                'ioc_tags': ''
+            })
+            self.assertEqual(400, result.status_code)
+            self.assertEqual('An IOC with this value and type already exists', result.json['message'])
+
+            result = test_app.get(f'/case/ioc/{ioc_ids[1]}?cid=1')
+            self.assertEqual('duplicate-source.example.com', result.json['data']['ioc_value'])
+
+            for ioc_id in ioc_ids:
+                test_app.get(f'/case/ioc/delete/{ioc_id}?cid=1')
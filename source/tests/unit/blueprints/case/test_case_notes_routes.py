@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import re
+from unittest import TestCase
+
+from app import app
+from tests.test_helper import TestHelper
+
+app.testing = True
+
+
+class TestCaseNotesRoutes(TestCase):
+    def setUp(self) -> None:
+        self._test_helper = TestHelper()
+
+    def test_case_list_notes_groups_should_change_etag_when_a_note_is_updated(self):
+        with app.test_client() as test_app:
+            self._test_helper.log_in(test_app)
+
+            page = test_app.get('/case/notes?cid=1')
+            csrf_token = re.search(r'id="csrf_token" name="csrf_token" type="hidden" value="(.*?)"',
+                                   str(page.data)).group(1)
+
+            result = test_app.post('/case/notes/groups/add?cid=1', json={'csrf_token': csrf_token,
+                                                                          'group_title': 'ETag group'})
+            group_id = result.json['data']['group_id']
+
+            result = test_app.post('/case/notes/add?cid=1', json={
+                'csrf_token': csrf_token,
+                'note_title': 'Before rename',
+                'note_content': 'content',
+                'group_id': group_id
+            })
+            note = result.json['data']
+
+            result = test_app.get('/case/notes/groups/list?cid=1')
+            self.assertEqual(200, result.status_code)
+            etag = result.headers.get('ETag')
+
+            result = test_app.post(f"/case/notes/update/{note['note_id']}?cid=1", json={
+                'csrf_token': csrf_token,
+                'note_title': 'After rename',
+                'note_content': 'content',
+                'note_version': note['note_version']
+            })
+            self.assertEqual(200, result.status_code)
+
+            result = test_app.get('/case/notes/groups/list?cid=1', headers={'If-None-Match': etag})
+            self.assertEqual(200, result.status_code)
+            titles = [n['note_title'] for group in result.json['data']['groups'] for n in group['notes']]
+            self.assertIn('After rename', titles)
+
+            test_app.get(f'/case/notes/groups/delete/{group_id}?cid=1')
@@ -19,6 +19,7 @@
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 
+import re
 from unittest import TestCase
 
 from app import app
@@ -36,3 +37,39 @@ class TestCaseRfilesRoutes(TestCase):
             'case_rfiles.case_rfile',
             'You should be redirected automatically to target URL: <a href="/case/evidences?cid=1">/case/evidences?cid=1</a>'
         )
+
+    def test_case_list_rfiles_should_return_a_page_in_server_side_mode(self):
+        with app.test_client() as test_app:
+            self._test_helper.log_in(test_app)
+
+            result = test_app.get('/case/evidences/list?cid=1&draw=2&start=0&length=5&search[value]=a')
+            self.assertEqual(200, result.status_code)
+
+            data = result.json['data']
+            self.assertEqual(2, data['draw'])
+            self.assertLessEqual(len(data['evidences']), 5)
+            self.assertLessEqual(data['recordsFiltered'], data['recordsTotal'])
+
+    def test_case_add_rfile_should_accept_files_larger_than_2_gib(self):
+        with app.test_client() as test_app:
+            self._test_helper.log_in(test_app)
+
+            page = test_app.get('/case/evidences?cid=1')
+            csrf_token = re.search(r'id="csrf_token" name="csrf_token" type="hidden" value="(.*?)"',
+                                   str(page.data)).group(1)
+
+            file_size = 2 ** 31 + 4096
+            result = test_app.post('/case/evidences/add?cid=1', json={
+                'csrf_token': csrf_token,
+                'filename': 'disk_image.E01',
+                'file_size': file_size,
+                'file_hash': '',
+                'file_description': ''
+            })
+            self.assertEqual(200, result.status_code)
+            self.assertEqual(file_size, result.json['data']['file_size'])
+
+            result = test_app.get(f"/case/evidences/{result.json['data']['id']}?cid=1")
+            self.assertEqual(file_size, result.json['data']['file_size'])
+
+            test_app.get(f"/case/evidences/delete/{result.json['data']['id']}?cid=1")
@@ -36,3 +36,14 @@ class TestCaseTasksRoutes(TestCase):
             'case_tasks.case_tasks',
             'You should be redirected automatically to target URL: <a href="/case/tasks?cid=1">/case/tasks?cid=1</a>'
         )
+
+    def test_case_list_tasks_should_return_304_if_etag_matches(self):
+        with app.test_client() as test_app:
+            self._test_helper.log_in(test_app)
+
+            result = test_app.get('/case/tasks/list?cid=1')
+            self.assertEqual(200, result.status_code)
+            self.assertIsNotNone(result.headers.get('ETag'))
+
+            result2 = test_app.get('/case/tasks/list?cid=1', headers={'If-None-Match': result.headers.get('ETag')})
+            self.assertEqual(304, result2.status_code)
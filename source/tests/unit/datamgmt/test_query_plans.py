@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+#
+#  IRIS Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from sqlalchemy import event
+
+from app import app, db
+from app.datamgmt.activities.activities_db import get_auto_activities
+from app.datamgmt.case.case_assets_db import get_assets, get_similar_assets_key
+from app.datamgmt.case.case_events_db import get_case_timeline_projection
+from app.datamgmt.case.case_iocs_db import get_detailed_iocs, get_ioc_links, get_case_iocs_links, get_iocs_links_key
+from app.datamgmt.case.case_notes_db import get_groups_detail
+from app.datamgmt.dim.dim_tasks_db import get_dim_tasks
+from app.datamgmt.search.search_db import search_iocs, search_notes, search_objects
+from app.datamgmt.search.search_index_db import SEARCH_DOCUMENT_SOURCES, refresh_search_documents
+from app.datamgmt.states import get_object_state
+from app.models import CaseAssets, CasesEvent, CaseEventsAssets, CeleryTaskIndex, Ioc, IocLink, Notes, NotesGroup, \
+    NotesGroupLink, UserActivity
+
+# Tables every case page filters on. A sequential scan on them means a case page reads the whole table
+INDEXED_TABLES = {'cases_events', 'case_events_assets', 'ioc', 'ioc_link', 'case_assets', 'notes', 'notes_group_link',
+                  'user_activity', 'object_state', 'search_document', 'celery_task_index'}
+
+CASE_ID = 1
+
+
+class TestQueryPlans(TestCase):
+    """
+    Run EXPLAIN on the main case queries and fail if any of them scans a whole case table.
+    Sequential scans are disabled for the session so the planner picks an index whenever one
+    matches, regardless of the size of the seeded data. The seeded data is rolled back at the end.
+    """
+    def setUp(self) -> None:
+        self._ctx = app.app_context()
+        self._ctx.push()
+        self._seed(CASE_ID)
+        db.session.execute('ANALYZE')
+        db.session.execute('SET LOCAL enable_seqscan = off')
+
+    def tearDown(self) -> None:
+        db.session.rollback()
+        self._ctx.pop()
+
+    @staticmethod
+    def _seed(caseid, count=200):
+        now = datetime.utcnow()
+        assets = [CaseAssets(asset_name=f'asset_{i}', asset_type_id=1, case_id=caseid, user_id=1,
+                             analysis_status_id=1, date_added=now) for i in range(count)]
+        db.session.add_all(assets)
+
+        events = [CasesEvent(case_id=caseid, user_id=1, event_title=f'event_{i}', event_content='',
+                             event_date=now + timedelta(minutes=i), event_date_wtz=now + timedelta(minutes=i),
+                             event_in_summary=(i % 2 == 0), event_in_graph=True) for i in range(count)]
+        db.session.add_all(events)
+
+        iocs = [Ioc(ioc_value=f'ioc_{now.timestamp()}_{i}', ioc_type_id=1, ioc_tlp_id=1, user_id=1)
+                for i in range(count)]
+        db.session.add_all(iocs)
+
+        group = NotesGroup(group_title='group', group_case_id=caseid, group_user=1, group_creationdate=now)
+        db.session.add(group)
+        notes = [Notes(note_title=f'note_{i}', note_content='', note_user=1, note_case_id=caseid,
+                       note_creationdate=now, note_lastupdate=now) for i in range(count)]
+        db.session.add_all(notes)
+        db.session.flush()
+
+        db.session.add_all([CaseEventsAssets(event_id=e.event_id, asset_id=a.asset_id, case_id=caseid)
+                            for e, a in zip(events, assets)])
+        db.session.add_all([IocLink(ioc_id=ioc.ioc_id, case_id=caseid) for ioc in iocs])
+        db.session.add_all([NotesGroupLink(group_id=group.group_id, note_id=note.note_id, case_id=caseid)
+                            for note in notes])
+        db.session.add_all([UserActivity(user_id=1, case_id=caseid, activity_date=now, activity_desc=f'activity {i}',
+                                         user_input=False) for i in range(count)])
+        db.session.add_all([CeleryTaskIndex(task_id=f'task_{now.timestamp()}_{i}', task_name='task_hook_wrapper',
+                                            task_module='iris_module', task_hook='on_manual_trigger_ioc',
+                                            task_user='admin', task_case_id=caseid, task_status='SUCCESS',
+                                            task_success=True, task_date=now + timedelta(seconds=i))
+                            for i in range(count)])
+        db.session.flush()
+
+        # Documents are refreshed on commit, which never happens here
+        for object_type in SEARCH_DOCUMENT_SOURCES:
+            refresh_search_documents(object_type, caseid=caseid)
+
+    def _explain(self, func, *args, **kwargs):
+        """
+        Run func and return the plans of the SELECT statements it emitted
+        """
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            func(*args, **kwargs)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+        self.assertTrue(statements, f'{func.__name__} did not run any query')
+
+        plans = []
+        for statement, parameters in statements:
+            row = db.session.connection().exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters).first()
+            plans.append((statement, row[0][0]['Plan']))
+
+        return plans
+
+    @classmethod
+    def _seq_scans(cls, plan):
+        scans = []
+        if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in INDEXED_TABLES:
+            scans.append(plan['Relation Name'])
+
+        for sub_plan in plan.get('Plans', []):
+            scans.extend(cls._seq_scans(sub_plan))
+
+        return scans
+
+    def _assert_no_seq_scan(self, func, *args, **kwargs):
+        for statement, plan in self._explain(func, *args, **kwargs):
+            self.assertEqual([], self._seq_scans(plan), f'Sequential scan in {func.__name__}:\n{statement}')
+
+    def test_timeline_projection_should_use_indexes(self):
+        self._assert_no_seq_scan(get_case_timeline_projection, caseid=CASE_ID)
+
+    def test_timeline_summary_should_use_indexes(self):
+        self._assert_no_seq_scan(get_case_timeline_projection, caseid=CASE_ID, in_summary=True)
+
+    def test_assets_list_should_use_indexes(self):
+        self._assert_no_seq_scan(get_assets, CASE_ID)
+
+    def test_iocs_list_should_use_indexes(self):
+        self._assert_no_seq_scan(get_detailed_iocs, CASE_ID)
+
+    def test_ioc_links_should_use_indexes(self):
+        ioc_id = IocLink.query.filter(IocLink.case_id == CASE_ID).first().ioc_id
+        self._assert_no_seq_scan(get_ioc_links, ioc_id, CASE_ID)
+
+    def test_case_iocs_links_should_use_indexes(self):
+        self._assert_no_seq_scan(get_case_iocs_links, CASE_ID)
+
+    def test_iocs_links_key_should_use_indexes(self):
+        self._assert_no_seq_scan(get_iocs_links_key, CASE_ID)
+
+    def test_similar_assets_key_should_use_indexes(self):
+        self._assert_no_seq_scan(get_similar_assets_key, CASE_ID)
+
+    def test_ioc_exact_search_should_use_indexes(self):
+        self._assert_no_seq_scan(search_iocs, 'ioc_1', search_mode='exact')
+
+    def test_ioc_prefix_search_should_use_indexes(self):
+        self._assert_no_seq_scan(search_iocs, 'ioc_%', search_mode='prefix')
+
+    def test_ioc_wildcard_search_should_use_indexes(self):
+        self._assert_no_seq_scan(search_iocs, '%c_1%', search_mode='wildcard')
+
+    def test_notes_search_should_use_indexes(self):
+        self._assert_no_seq_scan(search_notes, 'note')
+
+    def test_case_notes_search_should_use_indexes(self):
+        self._assert_no_seq_scan(search_notes, 'note', caseid=CASE_ID)
+
+    def test_global_search_should_use_indexes(self):
+        self._assert_no_seq_scan(search_objects, 'note_1')
+
+    def test_global_search_per_type_should_use_indexes(self):
+        self._assert_no_seq_scan(search_objects, 'event_1 OR asset_1', object_types=['event', 'asset'],
+                                 caseid=CASE_ID, per_type_limit=10)
+
+    def test_large_notes_search_should_use_indexes(self):
+        # Words all different, so the tsvector of the whole content would be well over the 1 MB limit
+        content = ' '.join(f'line{i}' for i in range(300000))
+        db.session.add(Notes(note_title='large note', note_content=content, note_user=1, note_case_id=CASE_ID,
+                             note_creationdate=datetime.utcnow(), note_lastupdate=datetime.utcnow()))
+        db.session.flush()
+
+        self._assert_no_seq_scan(search_notes, 'large', caseid=CASE_ID)
+
+    def test_notes_groups_should_use_indexes(self):
+        self._assert_no_seq_scan(get_groups_detail, CASE_ID)
+
+    def test_activities_should_use_indexes(self):
+        self._assert_no_seq_scan(get_auto_activities, CASE_ID)
+
+    def test_dim_tasks_should_use_indexes(self):
+        self._assert_no_seq_scan(get_dim_tasks, limit=40)
+
+    def test_case_dim_tasks_should_use_indexes(self):
+        self._assert_no_seq_scan(get_dim_tasks, limit=40, caseid=CASE_ID)
+
+    def test_object_state_should_use_indexes(self):
+        self._assert_no_seq_scan(get_object_state, 'timeline', CASE_ID)